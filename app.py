@@ -2,13 +2,14 @@
 Application d'analyse GTFS - Interface principale
 """
 
-import os
-import tempfile
 import pandas as pd
 import streamlit as st
 
-from src.utils import charger_gtfs, obtenir_service_ids_pour_date
+from src.instrumentation import collecter_etapes
+from src.utils import obtenir_service_ids_pour_date
+from views.cache import calculer_empreinte_upload, obtenir_feed
 from views.home import home_page
+from views.mesures import panneau_mesures
 from views.arrets import arrets_page
 from views.troncons import troncons_page
 
@@ -62,16 +63,20 @@ date_selected = st.sidebar.date_input("Sélectionner une date")
 # Variables globales pour stocker les résultats
 if "feed" not in st.session_state:
     st.session_state.feed = None
+if "empreinte_feed" not in st.session_state:
+    st.session_state.empreinte_feed = None
 if "active_service_ids" not in st.session_state:
     st.session_state.active_service_ids = None
 if "date_str" not in st.session_state:
     st.session_state.date_str = None
 if "indicateurs_arrets" not in st.session_state:
     st.session_state.indicateurs_arrets = None
-if "indicateurs_bus" not in st.session_state:
-    st.session_state.indicateurs_bus = None
-if "indicateurs_tram" not in st.session_state:
-    st.session_state.indicateurs_tram = None
+if "indicateurs_troncons" not in st.session_state:
+    st.session_state.indicateurs_troncons = None
+if "profil_horaire_arrets" not in st.session_state:
+    st.session_state.profil_horaire_arrets = None
+if "profil_horaire_troncons" not in st.session_state:
+    st.session_state.profil_horaire_troncons = None
 if "modes_disponibles" not in st.session_state:
     st.session_state.modes_disponibles = None
 if "last_date_str" not in st.session_state:
@@ -84,61 +89,68 @@ def check_date_change():
     if st.session_state.last_date_str != current_date_str:
         # La date a changé, remettre à zéro tous les indicateurs
         st.session_state.indicateurs_arrets = None
-        st.session_state.indicateurs_bus = None
-        st.session_state.indicateurs_tram = None
+        st.session_state.indicateurs_troncons = None
+        st.session_state.profil_horaire_arrets = None
+        st.session_state.profil_horaire_troncons = None
         st.session_state.modes_disponibles = None
         st.session_state.last_date_str = current_date_str
 
 
 # Fonction pour charger les données
 def charger_donnees_gtfs():
+    """
+    Associe à la session le feed du fichier uploadé. Le feed est lu une seule
+    fois par contenu de fichier (voir views.cache) : les reruns et les
+    changements de page réutilisent le feed et les indicateurs déjà calculés.
+    """
     if uploaded_file is not None and date_selected is not None:
         date_str = date_selected.strftime("%Y%m%d")
-
-        # Sauvegarder temporairement le fichier
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            zip_path = tmp_file.name
+        empreinte = calculer_empreinte_upload(uploaded_file)
 
         try:
-            # Charger le GTFS
+            # Charger le GTFS (une seule fois par fichier, toutes sessions confondues)
             with st.spinner("Chargement du fichier GTFS..."):
-                feed = charger_gtfs(zip_path)
+                feed = obtenir_feed(empreinte, uploaded_file)
 
-            # Obtenir les services actifs
-            active_service_ids = obtenir_service_ids_pour_date(feed, date_str)
+            if st.session_state.empreinte_feed != empreinte:
+                # Nouveau fichier : réinitialiser les indicateurs de la session
+                st.session_state.empreinte_feed = empreinte
+                st.session_state.indicateurs_arrets = None
+                st.session_state.indicateurs_troncons = None
+                st.session_state.profil_horaire_arrets = None
+                st.session_state.profil_horaire_troncons = None
+                st.session_state.modes_disponibles = None
 
             # Stocker dans session_state
             st.session_state.feed = feed
-            st.session_state.active_service_ids = active_service_ids
+            st.session_state.active_service_ids = obtenir_service_ids_pour_date(
+                feed, date_str
+            )
             st.session_state.date_str = date_str
-            st.session_state.indicateurs_arrets = None  # Réinitialiser les indicateurs
-            st.session_state.indicateurs_bus = None
-            st.session_state.indicateurs_tram = None
-            st.session_state.modes_disponibles = None
-
-            # Nettoyer le fichier temporaire
-            os.unlink(zip_path)
 
             return True
 
         except Exception as e:
             st.error(f"Erreur lors du chargement : {e}")
-            os.unlink(zip_path)
             return False
     return False
 
 
-# Charger les données automatiquement si nécessaire
-charger_donnees_gtfs()
+# Mesurer les étapes de calcul exécutées pendant ce passage du script
+with collecter_etapes() as collecte:
+    # Charger les données automatiquement si nécessaire
+    charger_donnees_gtfs()
+
+    # Vérifier si la date a changé et remettre à zéro les indicateurs si nécessaire
+    check_date_change()
 
-# Vérifier si la date a changé et remettre à zéro les indicateurs si nécessaire
-check_date_change()
+    # Navigation entre les pages
+    if st.session_state.selected_page == "Accueil":
+        home_page()
+    elif st.session_state.selected_page == "Arrêts":
+        arrets_page()
+    elif st.session_state.selected_page == "Tronçons":
+        troncons_page()
 
-# Navigation entre les pages
-if st.session_state.selected_page == "Accueil":
-    home_page()
-elif st.session_state.selected_page == "Arrêts":
-    arrets_page()
-elif st.session_state.selected_page == "Tronçons":
-    troncons_page()
+# Panneau des temps de calcul dans la barre latérale
+panneau_mesures(collecte)
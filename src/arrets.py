@@ -3,10 +3,177 @@ POC - Analyse GTFS : Indicateurs par arrêt pour un jour donné
 Calcule pour chaque arrêt : nombre de passages, premier et dernier départ
 """
 
+import numpy as np
 import pandas as pd
 
+from src.calendrier import obtenir_index_calendrier
+from src.instrumentation import etape
+from src.parcours import obtenir_index_parcours
+from src.tranches import (
+    affecter_tranches,
+    compter_par_tranche,
+    definir_tranches,
+    pivoter_tranches,
+)
+from src.utils import formater_secondes_en_temps
 
-def calculer_indicateurs_arrets(feed, active_service_ids: list[str], date_str: str):
+
+# Plage horaire du calcul des temps d'attente (comme gtfs_kit : 07:00 - 19:00)
+DEBUT_PLAGE_ATTENTE_S = 7 * 3600
+FIN_PLAGE_ATTENTE_S = 19 * 3600
+
+
+def calculer_temps_attente(
+    stop_times, debut_s=DEBUT_PLAGE_ATTENTE_S, fin_s=FIN_PLAGE_ATTENTE_S
+):
+    """
+    Calcule les temps d'attente (intervalles entre départs successifs) à chaque
+    arrêt, en une seule passe : un tri par (arrêt, heure de départ), puis une
+    différence entre départs consécutifs d'un même arrêt.
+    Seuls les départs compris dans la plage [debut_s, fin_s] sont retenus.
+
+    Args:
+        stop_times (pd.DataFrame): stop_times déjà filtrés (stop_id, departure_s)
+        debut_s (int): Début de la plage horaire, en secondes
+        fin_s (int): Fin de la plage horaire, en secondes
+
+    Returns:
+        pd.DataFrame: Une ligne par arrêt ayant au moins deux départs dans la
+        plage : stop_id, temps_attente_moyen, temps_attente_min,
+        temps_attente_max (en minutes) et cv_temps_attente (écart-type /
+        moyenne des intervalles, mesure de la régularité)
+    """
+    departs = stop_times["departure_s"].to_numpy(dtype="float64", na_value=np.nan)
+    dans_plage = (departs >= debut_s) & (departs <= fin_s)
+    codes_arrets, arrets = pd.factorize(stop_times["stop_id"].to_numpy()[dans_plage])
+    departs = departs[dans_plage]
+
+    # Tri par arrêt puis heure de départ, intervalles entre départs consécutifs
+    ordre = np.lexsort((departs, codes_arrets))
+    codes_arrets, departs = codes_arrets[ordre], departs[ordre]
+    meme_arret = codes_arrets[1:] == codes_arrets[:-1]
+    intervalles = np.diff(departs)[meme_arret]
+    arret_intervalle = codes_arrets[1:][meme_arret]
+
+    # Statistiques par arrêt
+    nombre = np.bincount(arret_intervalle, minlength=len(arrets))
+    somme = np.bincount(arret_intervalle, weights=intervalles, minlength=len(arrets))
+    somme_carres = np.bincount(
+        arret_intervalle, weights=intervalles**2, minlength=len(arrets)
+    )
+    minimum = np.full(len(arrets), np.inf)
+    maximum = np.full(len(arrets), -np.inf)
+    np.minimum.at(minimum, arret_intervalle, intervalles)
+    np.maximum.at(maximum, arret_intervalle, intervalles)
+
+    avec_intervalles = nombre > 0
+    nombre, somme, somme_carres = (
+        nombre[avec_intervalles],
+        somme[avec_intervalles],
+        somme_carres[avec_intervalles],
+    )
+    moyenne = somme / nombre
+    ecart_type = np.sqrt(np.maximum(somme_carres / nombre - moyenne**2, 0))
+
+    return pd.DataFrame(
+        {
+            "stop_id": arrets[avec_intervalles],
+            "temps_attente_moyen": moyenne / 60,
+            "temps_attente_min": minimum[avec_intervalles] / 60,
+            "temps_attente_max": maximum[avec_intervalles] / 60,
+            "cv_temps_attente": np.divide(
+                ecart_type,
+                moyenne,
+                out=np.full(len(moyenne), np.nan),
+                where=moyenne > 0,
+            ),
+        }
+    )
+
+
+def formater_amplitude(premier_depart_s, dernier_depart_s):
+    """
+    Amplitude horaire entre premier et dernier départ, au format d'un
+    Timedelta sans le "0 days" (ex: '17:45:00', '1 days 02:00:00', 'NaT')
+    """
+    amplitude_s = (
+        pd.Series(dernier_depart_s) - pd.Series(premier_depart_s)
+    ).astype("Int64")
+    jours = amplitude_s // 86400
+    amplitude = formater_secondes_en_temps(amplitude_s % 86400)
+    amplitude = amplitude.mask(jours > 0, jours.astype("string") + " days " + amplitude)
+    return amplitude.fillna("NaT")
+
+
+def calculer_passages_par_tranche(
+    stop_times, stops, tranches, format_tranches="long"
+):
+    """
+    Calcule le nombre de passages à chaque arrêt par tranche horaire, en une
+    seule passe de comptage (np.bincount) sur les heures de départ.
+
+    Args:
+        stop_times (pd.DataFrame): stop_times déjà filtrés (stop_id, departure_s)
+        stops (pd.DataFrame): Table des arrêts du feed
+        tranches (str | int | dict): Découpage de la journée ("horaire",
+            "15min", "pointe"...), voir src.tranches.definir_tranches
+        format_tranches (str): "long" (une ligne par arrêt et par tranche)
+            ou "large" (une ligne par arrêt, une colonne par tranche)
+
+    Returns:
+        pd.DataFrame: Par arrêt et par tranche : nombre_passages,
+        passages_par_heure et intervalle_moyen (minutes entre deux passages)
+    """
+    definition = definir_tranches(tranches)
+    nb_tranches = len(definition)
+
+    codes_arrets, arrets = pd.factorize(stop_times["stop_id"].to_numpy())
+    tranche = affecter_tranches(
+        stop_times["departure_s"].to_numpy(dtype="float64", na_value=np.nan),
+        definition,
+    )
+    passages = compter_par_tranche(codes_arrets, tranche, len(arrets), nb_tranches)
+
+    duree_h = ((definition["fin_s"] - definition["debut_s"]) / 3600).to_numpy()
+    indicateurs = pd.DataFrame(
+        {
+            "stop_id": np.repeat(np.asarray(arrets, dtype=object), nb_tranches),
+            "tranche": np.tile(definition["tranche"].to_numpy(), len(arrets)),
+            "debut": np.tile(definition["debut"].to_numpy(), len(arrets)),
+            "fin": np.tile(definition["fin"].to_numpy(), len(arrets)),
+            "nombre_passages": passages.ravel().astype("int64"),
+        }
+    )
+    indicateurs["passages_par_heure"] = indicateurs["nombre_passages"] / np.tile(
+        duree_h, len(arrets)
+    )
+    frequence = indicateurs["passages_par_heure"]
+    indicateurs["intervalle_moyen"] = 60 / frequence.where(frequence > 0)
+
+    infos_arrets = stops[["stop_id", "stop_name", "stop_lat", "stop_lon"]].astype(
+        {"stop_id": object}
+    )
+    indicateurs = infos_arrets.merge(indicateurs, on="stop_id", how="right")
+
+    if format_tranches == "large":
+        large = pivoter_tranches(
+            indicateurs, ["stop_id"], ["nombre_passages", "passages_par_heure"]
+        )
+        indicateurs = infos_arrets.merge(large, on="stop_id", how="right")
+
+    print(f"✓ Passages comptés pour {len(arrets)} arrêts et {nb_tranches} tranche(s)")
+
+    return indicateurs
+
+
+def calculer_indicateurs_arrets(
+    feed,
+    active_service_ids: list[str],
+    date_str: str,
+    tranches=None,
+    format_tranches="long",
+    index=None,
+):
     """
     Calcule les indicateurs pour chaque arrêt :
     - Nombre de lignes desservies
@@ -14,10 +181,23 @@ def calculer_indicateurs_arrets(feed, active_service_ids: list[str], date_str: s
     - Heure du premier départ
     - Heure du dernier départ
     - Amplitude horaire
-    - Temps d'attente moyen, min et max
+    - Temps d'attente moyen, min et max, et leur coefficient de variation
+
+    Les temps d'attente sont calculés entre 07:00 et 19:00 à partir des
+    mêmes stop_times que les passages (voir calculer_temps_attente) ;
+    date_str n'est conservé que pour compatibilité.
+
+    Si tranches est renseigné ("horaire", "15min", "pointe" ou dict de
+    tranches nommées), renvoie les passages par arrêt et par tranche
+    horaire (voir calculer_passages_par_tranche).
+
+    Les stop_times sont lus sur l'index des parcours du feed (voir
+    src.parcours.IndexParcours), passé en argument ou construit une seule
+    fois par feed.
 
     Returns:
-        Panda Dataframe avec une ligne d'indicateurs par arrêt.
+        Panda Dataframe avec une ligne d'indicateurs par arrêt
+        (par arrêt et par tranche si tranches est renseigné).
     """
     print(f"\nCalcul des indicateurs aux arrêts...")
 
@@ -25,57 +205,89 @@ def calculer_indicateurs_arrets(feed, active_service_ids: list[str], date_str: s
         print("⚠ Aucun service actif pour cette date")
         return None
 
-    # Filtrer les trips actifs ce jour-là
-    trips_actifs = feed.trips[feed.trips["service_id"].isin(active_service_ids)]
-    print(f"✓ {len(trips_actifs)} trips actifs")
+    # stop_times des trips actifs ce jour-là, lus sur l'index du feed
+    # (déjà triés et codés : ni tri ni jointure avec trips)
+    if index is None:
+        index = obtenir_index_parcours(feed)
+    with etape("filtre_trips", lignes_entree=len(index.trip_ids)) as mesure:
+        selection = index.selectionner_trips(service_ids=active_service_ids)
+        print(f"✓ {selection.sum()} trips actifs")
 
-    # Joindre avec stop_times
-    stop_times_actifs = feed.stop_times.merge(
-        trips_actifs[["trip_id", "service_id"]], on="trip_id"
-    )
+        lignes, trips = index.lignes_selectionnees(selection)
+        codes_stop = index.codes_stop[lignes]
+        departs = index.departs[lignes]
+        connu = codes_stop >= 0
+        codes_stop, departs, trips = codes_stop[connu], departs[connu], trips[connu]
 
-    # Calculer les indicateurs par arrêt
-    indicateurs = (
-        stop_times_actifs.groupby("stop_id")
-        .agg(
-            nombre_passages=("trip_id", "count"),
-            premier_depart=("departure_time", "min"),
-            dernier_depart=("departure_time", "max"),
+        stop_times_actifs = pd.DataFrame(
+            {"stop_id": index.stop_ids[codes_stop], "departure_s": departs}
         )
-        .reset_index()
-    )
+        mesure.lignes_sortie = len(stop_times_actifs)
 
-    # Utilisation de gtfs_kit pour calculer les stats de headway
-    indic_gk = feed.compute_stop_stats([date_str])
-    indicateurs = indicateurs.merge(
-        indic_gk[["stop_id", "mean_headway", "max_headway", "num_routes"]],
-        on="stop_id",
-        how="left",
-    )
-    indicateurs.rename(
-        columns={
-            "num_routes": "nb_lignes",
-            "mean_headway": "temps_attente_moyen",
-            "max_headway": "temps_attente_max",
-        },
-        inplace=True,
-    )
+    if tranches is not None:
+        with etape("agregation", lignes_entree=len(stop_times_actifs)) as mesure:
+            passages = calculer_passages_par_tranche(
+                stop_times_actifs, feed.stops, tranches, format_tranches
+            )
+            mesure.lignes_sortie = len(passages)
+        return passages
 
-    # Joindre avec les informations des arrêts
-    indicateurs = indicateurs.merge(
-        feed.stops[["stop_id", "stop_name", "stop_lat", "stop_lon"]],
-        on="stop_id",
-        how="left",
-    )
+    with etape("agregation", lignes_entree=len(stop_times_actifs)) as mesure:
+        # Calculer les indicateurs par arrêt, en une passe sur les codes d'arrêt
+        nb_stops = len(index.stop_ids)
+        nombre_passages = np.bincount(codes_stop, minlength=nb_stops)
+        premier_depart_s = np.full(nb_stops, np.inf)
+        dernier_depart_s = np.full(nb_stops, -np.inf)
+        np.fmin.at(premier_depart_s, codes_stop, departs)
+        np.fmax.at(dernier_depart_s, codes_stop, departs)
 
-    # Calculer l'amplitude horaire
-    indicateurs["amplitude_horaire"] = pd.to_timedelta(
-        indicateurs["dernier_depart"]
-    ) - pd.to_timedelta(indicateurs["premier_depart"])
-    # nettoyer pour retirer le 0 days
-    indicateurs["amplitude_horaire"] = indicateurs["amplitude_horaire"].apply(
-        lambda x: str(x).replace("0 days ", " ").strip()
-    )
+        # Lignes distinctes par arrêt : couples (arrêt, ligne) dédupliqués
+        nb_routes = max(len(index.route_ids), 1)
+        couples = np.unique(codes_stop * nb_routes + index.route_trip[trips])
+        nb_lignes = np.bincount(couples // nb_routes, minlength=nb_stops)
+
+        desservi = nombre_passages > 0
+        indicateurs = pd.DataFrame(
+            {
+                "stop_id": index.stop_ids[desservi],
+                "nb_lignes": nb_lignes[desservi],
+                "nombre_passages": nombre_passages[desservi],
+                "premier_depart_s": premier_depart_s[desservi],
+                "dernier_depart_s": dernier_depart_s[desservi],
+            }
+        )
+        indicateurs[["premier_depart_s", "dernier_depart_s"]] = indicateurs[
+            ["premier_depart_s", "dernier_depart_s"]
+        ].replace([np.inf, -np.inf], np.nan)
+        indicateurs["stop_id"] = indicateurs["stop_id"].astype(
+            feed.stop_times["stop_id"].dtype
+        )
+        indicateurs["premier_depart"] = formater_secondes_en_temps(
+            indicateurs["premier_depart_s"]
+        )
+        indicateurs["dernier_depart"] = formater_secondes_en_temps(
+            indicateurs["dernier_depart_s"]
+        )
+
+        # Temps d'attente, calculés sur les mêmes stop_times
+        indicateurs = indicateurs.merge(
+            calculer_temps_attente(stop_times_actifs), on="stop_id", how="left"
+        )
+        mesure.lignes_sortie = len(indicateurs)
+
+    with etape("enrichissement", lignes_entree=len(indicateurs)) as mesure:
+        # Joindre avec les informations des arrêts
+        indicateurs = indicateurs.merge(
+            feed.stops[["stop_id", "stop_name", "stop_lat", "stop_lon"]],
+            on="stop_id",
+            how="left",
+        )
+
+        # Calculer l'amplitude horaire
+        indicateurs["amplitude_horaire"] = formater_amplitude(
+            indicateurs["premier_depart_s"], indicateurs["dernier_depart_s"]
+        )
+        mesure.lignes_sortie = len(indicateurs)
 
     # Réorganiser les colonnes
     indicateurs = indicateurs[
@@ -90,7 +302,9 @@ def calculer_indicateurs_arrets(feed, active_service_ids: list[str], date_str: s
             "dernier_depart",
             "amplitude_horaire",
             "temps_attente_moyen",
+            "temps_attente_min",
             "temps_attente_max",
+            "cv_temps_attente",
         ]
     ]
 
@@ -102,6 +316,60 @@ def calculer_indicateurs_arrets(feed, active_service_ids: list[str], date_str: s
     return indicateurs
 
 
+def calculer_indicateurs_arrets_periode(feed, dates: list[str]):
+    """
+    Calcule les indicateurs par arrêt (voir calculer_indicateurs_arrets)
+    pour chacune des dates demandées.
+
+    Les dates ayant exactement les mêmes services actifs (ex: tous les jours
+    ouvrés hors vacances) ont les mêmes indicateurs : le calcul n'est fait
+    qu'une fois par combinaison de services, puis recopié pour chaque date.
+
+    Args:
+        feed: gtfs_kit Feed object
+        dates (list[str]): Dates au format 'YYYYMMDD' (voir src.calendrier.lister_dates)
+
+    Returns:
+        Panda Dataframe au format long : une ligne par date et par arrêt.
+    """
+    index = obtenir_index_calendrier(feed)
+
+    # Regrouper les dates par combinaison de services actifs
+    dates_par_services = {}
+    for date_str in dates:
+        services = tuple(index.services_actifs(date_str))
+        dates_par_services.setdefault(services, []).append(date_str)
+
+    print(
+        f"\n{len(dates)} date(s) analysée(s), "
+        f"{len(dates_par_services)} combinaison(s) de services distincte(s)"
+    )
+
+    indicateurs_par_date = {}
+    for services, dates_groupe in dates_par_services.items():
+        indicateurs = calculer_indicateurs_arrets(feed, list(services), dates_groupe[0])
+        if indicateurs is None:
+            continue
+        for date_str in dates_groupe:
+            indicateurs_par_date[date_str] = indicateurs
+
+    if not indicateurs_par_date:
+        return None
+
+    resultat = pd.concat(
+        [
+            indicateurs_par_date[date_str].assign(date=date_str)
+            for date_str in dates
+            if date_str in indicateurs_par_date
+        ],
+        ignore_index=True,
+    )
+    # Placer la date en première colonne
+    resultat = resultat[["date"] + [c for c in resultat.columns if c != "date"]]
+
+    return resultat
+
+
 def afficher_statistiques(df):
     """
     Affiche des statistiques résumées à partir d'un dataframe
@@ -0,0 +1,424 @@
+"""
+Mesures de performance des points d'entrée publics
+Chaque étape (chargement, calendrier, indicateurs, tronçons, cartes) est
+chronométrée sur des feeds synthétiques de taille configurable (voir
+src.synthetique), avec ou sans tracés (--traces : découpage des tronçons
+dans shapes.txt). Les résultats sont enregistrés en JSON, avec le commit et
+les versions des bibliothèques, pour comparer hors ligne deux exécutions et
+repérer les régressions.
+
+Exemples :
+    uv run -m src.benchmark --taille moyen --repetitions 3
+    uv run -m src.benchmark --taille moyen --traces
+    uv run -m src.benchmark --comparer reference.json nouveau.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.arrets import calculer_indicateurs_arrets
+from src.cartographie import create_carte_arrets, creer_carte_troncons
+from src.create_troncons_uniques import (
+    creer_troncons_uniques,
+    creer_troncons_uniques_multimodal,
+)
+from src.indicateurs_troncons import (
+    compute_indicateurs_troncons,
+    compute_indicateurs_troncons_multimodal,
+)
+from src.synthetique import TAILLES_FEEDS, generer_gtfs_taille
+from src.traces import a_des_traces
+from src.utils import charger_gtfs, obtenir_service_ids_pour_date
+
+
+# Dossier des résultats JSON
+DOSSIER_BENCHMARKS = "output/benchmarks"
+
+# Format des fichiers de résultats (à incrémenter si leur structure change)
+VERSION_BENCHMARK = 1
+
+# Date analysée dans les feeds synthétiques (un mardi de leur période)
+DATE_BENCHMARK = "20250304"
+
+# Ratio de durée au-delà duquel une étape est signalée comme régression
+SEUIL_REGRESSION = 1.2
+
+
+def mesurer(fonction, *args, repetitions=3, **kwargs):
+    """
+    Chronomètre plusieurs appels d'une fonction
+    Args:
+        fonction (callable): Fonction à mesurer
+        *args, **kwargs: Arguments de la fonction
+        repetitions (int): Nombre d'appels
+    Returns:
+        tuple: (résultat du dernier appel, liste des durées en secondes)
+    """
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction(*args, **kwargs)
+        durees.append(time.perf_counter() - debut)
+    return resultat, durees
+
+
+def _resumer(durees):
+    """
+    Statistiques d'une série de durées : le premier appel (à froid, index
+    du feed compris) est distingué des suivants
+    """
+    return {
+        "durees_s": [round(d, 6) for d in durees],
+        "premier_s": round(durees[0], 6),
+        "min_s": round(min(durees), 6),
+        "mediane_s": round(float(np.median(durees)), 6),
+    }
+
+
+def _commit_courant():
+    """
+    Commit git du dépôt (None hors d'un dépôt git)
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environnement():
+    """
+    Versions de Python et des bibliothèques de calcul, machine
+    """
+    import geopandas
+    import shapely
+
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "geopandas": geopandas.__version__,
+        "shapely": shapely.__version__,
+        "machine": platform.machine(),
+        "systeme": platform.system(),
+        "nb_cpu": os.cpu_count(),
+    }
+
+
+def executer_benchmark(
+    zip_path, date_str=DATE_BENCHMARK, repetitions=3, compact=False
+):
+    """
+    Chronomètre les points d'entrée publics sur un feed GTFS
+
+    Parameters:
+    -----------
+    zip_path : str
+        Chemin du zip GTFS (synthétique ou réel)
+    date_str : str
+        Date analysée, au format 'YYYYMMDD'
+    repetitions : int
+        Nombre d'appels de chaque étape
+    compact : bool
+        Chargement compact du feed (voir charger_gtfs)
+
+    Returns:
+    --------
+    dict : Par étape, durées de chaque appel, premier appel, minimum et
+    médiane (en secondes), et taille du feed analysé
+    """
+    mesures = {}
+
+    # Chargement sans cache disque : le zip est relu à chaque appel
+    feed, durees = mesurer(
+        charger_gtfs, zip_path, compact=compact, cache=False, repetitions=repetitions
+    )
+    mesures["charger_gtfs"] = durees
+
+    service_ids, mesures["obtenir_service_ids_pour_date"] = mesurer(
+        obtenir_service_ids_pour_date, feed, date_str, repetitions=repetitions
+    )
+
+    indicateurs_arrets, mesures["calculer_indicateurs_arrets"] = mesurer(
+        calculer_indicateurs_arrets,
+        feed,
+        service_ids,
+        date_str,
+        repetitions=repetitions,
+    )
+
+    # Tous modes en une passe, comme l'application et le traitement par lot.
+    # Mesuré avant les modes isolés : les découpes des tracés, conservées
+    # sur le feed, sont ainsi comptées dans le premier appel
+    troncons, mesures["creer_troncons_uniques_multimodal"] = mesurer(
+        creer_troncons_uniques_multimodal, feed, repetitions=repetitions
+    )
+    _, mesures["compute_indicateurs_troncons_multimodal"] = mesurer(
+        compute_indicateurs_troncons_multimodal,
+        feed,
+        service_ids,
+        troncons,
+        repetitions=repetitions,
+    )
+
+    def creer_troncons_bus_tram():
+        return creer_troncons_uniques(feed, 3), creer_troncons_uniques(feed, 0)
+
+    (troncons_bus, troncons_tram), mesures["creer_troncons_uniques"] = mesurer(
+        creer_troncons_bus_tram, repetitions=repetitions
+    )
+
+    (indicateurs_bus, indicateurs_tram), mesures["compute_indicateurs_troncons"] = (
+        mesurer(
+            compute_indicateurs_troncons,
+            feed,
+            service_ids,
+            troncons_bus,
+            troncons_tram,
+            repetitions=repetitions,
+        )
+    )
+
+    # Les cartes Folium sont construites à l'export : le HTML est généré
+    def carte_troncons():
+        return creer_carte_troncons(indicateurs_bus, indicateurs_tram)._repr_html_()
+
+    def carte_arrets():
+        return create_carte_arrets(indicateurs_arrets)._repr_html_()
+
+    _, mesures["creer_carte_troncons"] = mesurer(
+        carte_troncons, repetitions=repetitions
+    )
+    _, mesures["create_carte_arrets"] = mesurer(
+        carte_arrets, repetitions=repetitions
+    )
+
+    return {
+        "feed": {
+            "nb_stops": len(feed.stops),
+            "nb_routes": len(feed.routes),
+            "nb_trips": len(feed.trips),
+            "nb_stop_times": len(feed.stop_times),
+            "nb_services_actifs": len(service_ids),
+            "nb_troncons": len(troncons_bus) + len(troncons_tram),
+            "nb_troncons_tous_modes": len(troncons),
+            "nb_points_traces": len(feed.shapes) if a_des_traces(feed) else 0,
+        },
+        "etapes": {etape: _resumer(durees) for etape, durees in mesures.items()},
+    }
+
+
+def executer_suite(
+    tailles=("petit", "moyen"),
+    repetitions=3,
+    compact=False,
+    avec_traces=False,
+    graine=0,
+    dossier=DOSSIER_BENCHMARKS,
+    **parametres,
+):
+    """
+    Exécute le benchmark sur des feeds synthétiques de plusieurs tailles
+    et enregistre les résultats en JSON
+
+    Parameters:
+    -----------
+    tailles : list[str]
+        Tailles de feeds à générer (voir src.synthetique.TAILLES_FEEDS)
+    repetitions : int
+        Nombre d'appels de chaque étape
+    compact : bool
+        Chargement compact des feeds
+    avec_traces : bool
+        Générer les tracés des lignes (shapes.txt) : les tronçons sont
+        alors découpés dans les tracés
+    graine : int
+        Graine du générateur : une même graine donne les mêmes feeds
+    dossier : str
+        Dossier des résultats
+    **parametres :
+        Paramètres du générateur remplaçant ceux des tailles prédéfinies
+        (nb_lignes, nb_arrets, trips_par_ligne, nb_exceptions...)
+
+    Returns:
+    --------
+    str : Chemin du fichier JSON écrit
+    """
+    commit = _commit_courant()
+    resultats = {
+        "version": VERSION_BENCHMARK,
+        "date": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "environnement": _environnement(),
+        "repetitions": repetitions,
+        "compact": compact,
+        "avec_traces": avec_traces,
+        "graine": graine,
+        "tailles": {},
+    }
+
+    with tempfile.TemporaryDirectory() as dossier_feeds:
+        for taille in tailles:
+            print(f"\n=== Benchmark : feed {taille} ===")
+            zip_path = os.path.join(dossier_feeds, f"gtfs_{taille}.zip")
+            debut = time.perf_counter()
+            generer_gtfs_taille(
+                zip_path, taille, graine=graine, avec_traces=avec_traces, **parametres
+            )
+            duree_generation = time.perf_counter() - debut
+
+            mesure = executer_benchmark(
+                zip_path, repetitions=repetitions, compact=compact
+            )
+            mesure["parametres"] = {**TAILLES_FEEDS[taille], **parametres}
+            mesure["generation_s"] = round(duree_generation, 6)
+            resultats["tailles"][taille] = mesure
+
+    os.makedirs(dossier, exist_ok=True)
+    horodatage = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+    chemin = os.path.join(
+        dossier, f"benchmark_{horodatage}_{commit or 'sans_commit'}.json"
+    )
+    with open(chemin, "w", encoding="utf-8") as fichier:
+        json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+
+    print(f"\n✓ Résultats enregistrés : {chemin}")
+    afficher_resultats(resultats)
+
+    return chemin
+
+
+def _tableau_durees(resultats, statistique="mediane_s"):
+    """
+    Durées d'un fichier de résultats au format long : taille, etape, duree_s
+    """
+    return pd.DataFrame(
+        [
+            {"taille": taille, "etape": etape, "duree_s": stats[statistique]}
+            for taille, mesure in resultats["tailles"].items()
+            for etape, stats in mesure["etapes"].items()
+        ],
+        columns=["taille", "etape", "duree_s"],
+    )
+
+
+def afficher_resultats(resultats):
+    """
+    Affiche dans le terminal les durées médianes de chaque étape, par taille
+    """
+    durees = _tableau_durees(resultats)
+    tableau = durees.pivot(index="etape", columns="taille", values="duree_s")
+    tableau = tableau.reindex(
+        index=list(dict.fromkeys(durees["etape"])), columns=list(resultats["tailles"])
+    )
+    print("\nDurées médianes (s) :")
+    print(tableau.round(3).to_string())
+
+
+def comparer_benchmarks(
+    chemin_reference, chemin_nouveau, statistique="mediane_s", seuil=SEUIL_REGRESSION
+):
+    """
+    Compare deux fichiers de résultats, étape par étape et taille par taille
+
+    Parameters:
+    -----------
+    chemin_reference : str
+        Résultats de référence (ex: commit précédent)
+    chemin_nouveau : str
+        Résultats à comparer
+    statistique : str
+        Statistique comparée : "mediane_s", "min_s" ou "premier_s"
+    seuil : float
+        Ratio nouveau / référence au-delà duquel l'étape est une régression
+
+    Returns:
+    --------
+    DataFrame : taille, etape, reference_s, nouveau_s, ratio et regression
+    """
+    with open(chemin_reference, encoding="utf-8") as fichier:
+        reference = json.load(fichier)
+    with open(chemin_nouveau, encoding="utf-8") as fichier:
+        nouveau = json.load(fichier)
+
+    comparaison = _tableau_durees(reference, statistique).merge(
+        _tableau_durees(nouveau, statistique),
+        on=["taille", "etape"],
+        how="outer",
+        suffixes=("_reference", "_nouveau"),
+    )
+    comparaison = comparaison.rename(
+        columns={"duree_s_reference": "reference_s", "duree_s_nouveau": "nouveau_s"}
+    )
+    comparaison["ratio"] = comparaison["nouveau_s"] / comparaison["reference_s"]
+    comparaison["regression"] = comparaison["ratio"] > seuil
+
+    print(
+        f"\nComparaison {reference.get('commit')} → {nouveau.get('commit')} "
+        f"({statistique}, seuil x{seuil})"
+    )
+    print(comparaison.round(3).to_string(index=False))
+    nb_regressions = int(comparaison["regression"].sum())
+    if nb_regressions:
+        print(f"⚠ {nb_regressions} étape(s) en régression")
+    else:
+        print("✓ Aucune régression")
+
+    return comparaison
+
+
+# =============================================================================
+# EXEMPLE D'UTILISATION
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mesure des performances sur des feeds GTFS synthétiques"
+    )
+    parser.add_argument(
+        "--taille",
+        nargs="+",
+        default=["petit", "moyen"],
+        choices=list(TAILLES_FEEDS),
+        help="Taille(s) des feeds générés",
+    )
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument(
+        "--traces",
+        action="store_true",
+        help="Générer shapes.txt (découpage des tronçons dans les tracés)",
+    )
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--dossier", default=DOSSIER_BENCHMARKS)
+    parser.add_argument(
+        "--comparer",
+        nargs=2,
+        metavar=("REFERENCE", "NOUVEAU"),
+        help="Compare deux fichiers de résultats au lieu de mesurer",
+    )
+    arguments = parser.parse_args()
+
+    if arguments.comparer:
+        comparer_benchmarks(*arguments.comparer)
+    else:
+        executer_suite(
+            arguments.taille,
+            repetitions=arguments.repetitions,
+            compact=arguments.compact,
+            avec_traces=arguments.traces,
+            graine=arguments.graine,
+            dossier=arguments.dossier,
+        )
@@ -0,0 +1,211 @@
+"""
+Cache disque des feeds GTFS déjà chargés
+Les tables typées sont stockées en Parquet, dans un dossier nommé
+d'après l'empreinte (SHA-256) du zip : un zip modifié a une autre empreinte,
+l'ancienne entrée n'est plus lue et finit évincée (LRU, taille plafonnée).
+
+Les résultats calculés sur un feed chargé (index, empreintes...) sont
+conservés en mémoire sur le feed lui-même (voir conserver_sur_le_feed).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+
+# Configuration
+DOSSIER_CACHE = ".cache/gtfs"
+TAILLE_MAX_CACHE_MO = 2048
+VERSION_CACHE = 2  # À incrémenter si le format des tables en cache change
+
+FICHIER_META = "meta.json"
+
+
+def calculer_empreinte_zip(zip_path, taille_bloc=1024 * 1024):
+    """
+    Calcule l'empreinte SHA-256 du contenu d'un zip GTFS
+    Args:
+        zip_path (str): Chemin du zip GTFS
+        taille_bloc (int): Taille des blocs lus (octets)
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    empreinte = hashlib.sha256()
+    with open(zip_path, "rb") as fichier:
+        for bloc in iter(lambda: fichier.read(taille_bloc), b""):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def _dossier_entree(empreinte, mode, dossier_cache):
+    return Path(dossier_cache) / f"{empreinte}_{mode}_v{VERSION_CACHE}"
+
+
+def lire_tables_du_cache(empreinte, mode, dossier_cache=DOSSIER_CACHE):
+    """
+    Relit les tables d'un feed depuis le cache et marque l'entrée comme
+    récemment utilisée. Les fichiers Parquet sont lus par mappage mémoire,
+    mais la conversion en DataFrame copie les données : chaque appel (donc
+    chaque processus) obtient sa propre copie des tables.
+    Args:
+        empreinte (str): Empreinte du zip GTFS
+        mode (str): Mode de chargement ("complet" ou "compact")
+        dossier_cache (str): Dossier racine du cache
+    Returns:
+        tuple (dict[str, DataFrame], dict) : tables et métadonnées,
+        ou None si le feed n'est pas en cache
+    """
+    dossier = _dossier_entree(empreinte, mode, dossier_cache)
+    chemin_meta = dossier / FICHIER_META
+    if not chemin_meta.exists():
+        return None
+
+    meta = json.loads(chemin_meta.read_text(encoding="utf-8"))
+    tables = {
+        nom_table: pq.read_table(dossier / f"{nom_table}.parquet", memory_map=True)
+        .to_pandas()
+        for nom_table in meta["tables"]
+    }
+
+    # Date d'accès utilisée pour l'éviction LRU
+    os.utime(chemin_meta)
+
+    return tables, meta
+
+
+def ecrire_tables_dans_cache(
+    tables,
+    meta,
+    empreinte,
+    mode,
+    dossier_cache=DOSSIER_CACHE,
+    taille_max_mo=TAILLE_MAX_CACHE_MO,
+):
+    """
+    Écrit les tables d'un feed dans le cache, puis évince les entrées
+    les moins récemment utilisées si la taille maximale est dépassée.
+    Args:
+        tables (dict[str, DataFrame]): Tables du feed
+        meta (dict): Métadonnées à conserver (ex: dist_units)
+        empreinte (str): Empreinte du zip GTFS
+        mode (str): Mode de chargement ("complet" ou "compact")
+        dossier_cache (str): Dossier racine du cache
+        taille_max_mo (float): Taille maximale du cache, en Mo
+    """
+    dossier = _dossier_entree(empreinte, mode, dossier_cache)
+    dossier_tmp = dossier.with_name(f"{dossier.name}.tmp{os.getpid()}")
+    shutil.rmtree(dossier_tmp, ignore_errors=True)
+    dossier_tmp.mkdir(parents=True)
+
+    for nom_table, df in tables.items():
+        df.to_parquet(dossier_tmp / f"{nom_table}.parquet", index=False)
+
+    meta = {**meta, "tables": list(tables), "cree_le": time.time()}
+    (dossier_tmp / FICHIER_META).write_text(json.dumps(meta), encoding="utf-8")
+
+    # Publication atomique de l'entrée (un lecteur ne voit jamais d'entrée partielle)
+    try:
+        os.replace(dossier_tmp, dossier)
+    except OSError:
+        # Entrée déjà écrite entre-temps par un autre processus
+        shutil.rmtree(dossier_tmp, ignore_errors=True)
+
+    evincer_cache(dossier_cache, taille_max_mo, a_conserver=dossier)
+
+
+def evincer_cache(
+    dossier_cache=DOSSIER_CACHE, taille_max_mo=TAILLE_MAX_CACHE_MO, a_conserver=None
+):
+    """
+    Supprime les entrées les moins récemment utilisées du cache
+    jusqu'à repasser sous la taille maximale.
+    Args:
+        dossier_cache (str): Dossier racine du cache
+        taille_max_mo (float): Taille maximale du cache, en Mo
+        a_conserver (Path): Entrée à ne jamais évincer (ex: celle qui vient d'être écrite)
+    Returns:
+        list[str]: Noms des entrées supprimées
+    """
+    racine = Path(dossier_cache)
+    if not racine.exists():
+        return []
+
+    entrees = []
+    for dossier in racine.iterdir():
+        chemin_meta = dossier / FICHIER_META
+        if not chemin_meta.exists():
+            continue
+        taille = sum(f.stat().st_size for f in dossier.iterdir())
+        entrees.append((chemin_meta.stat().st_mtime, taille, dossier))
+
+    taille_totale = sum(taille for _, taille, _ in entrees)
+    supprimees = []
+    for _, taille, dossier in sorted(entrees, key=lambda e: e[0]):
+        if taille_totale <= taille_max_mo * 1024**2:
+            break
+        if a_conserver is not None and dossier == Path(a_conserver):
+            continue
+        shutil.rmtree(dossier, ignore_errors=True)
+        taille_totale -= taille
+        supprimees.append(dossier.name)
+
+    if supprimees:
+        print(f"✓ Cache : {len(supprimees)} entrée(s) évincée(s)")
+    return supprimees
+
+
+def vider_cache(dossier_cache=DOSSIER_CACHE):
+    """
+    Supprime entièrement le cache des feeds GTFS
+    """
+    shutil.rmtree(dossier_cache, ignore_errors=True)
+    print(f"✓ Cache vidé : {dossier_cache}")
+
+
+def lire_resultat_du_feed(feed, attribut, tables, cle=None):
+    """
+    Retourne un résultat conservé sur le feed (voir conserver_sur_le_feed),
+    s'il a été calculé à partir des mêmes tables et pour la même clé.
+    Les tables sont comparées par identité avec les références conservées :
+    une table remplacée invalide le résultat, même si la nouvelle occupe
+    l'adresse mémoire de l'ancienne.
+    Args:
+        feed: gtfs_kit Feed object
+        attribut (str): Attribut du feed qui porte le résultat
+        tables (list): Tables dont dépend le résultat (None si absente)
+        cle: Paramètres éventuels du calcul (comparés par égalité)
+    Returns:
+        Le résultat conservé, ou None s'il est absent ou périmé
+    """
+    conserve = getattr(feed, attribut, None)
+    if conserve is None:
+        return None
+    tables_conservees, cle_conservee, resultat = conserve
+    tables = list(tables)
+    if len(tables) != len(tables_conservees) or cle_conservee != cle:
+        return None
+    if any(table is not ancienne for table, ancienne in zip(tables, tables_conservees)):
+        return None
+    return resultat
+
+
+def conserver_sur_le_feed(feed, attribut, tables, resultat, cle=None):
+    """
+    Conserve un résultat sur le feed, avec une référence aux tables dont il
+    dépend (voir lire_resultat_du_feed)
+    Args:
+        feed: gtfs_kit Feed object
+        attribut (str): Attribut du feed qui porte le résultat
+        tables (list): Tables dont dépend le résultat (None si absente)
+        resultat: Résultat à conserver
+        cle: Paramètres éventuels du calcul
+    Returns:
+        Le résultat
+    """
+    setattr(feed, attribut, (list(tables), cle, resultat))
+    return resultat
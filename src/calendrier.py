@@ -0,0 +1,252 @@
+"""
+Index des services GTFS actifs par jour
+Résout calendar et calendar_dates une seule fois par feed, sous la forme
+d'une matrice booléenne services x jours sur la période de validité du feed
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.cache import conserver_sur_le_feed, lire_resultat_du_feed
+
+
+JOURS_SEMAINE = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def _vers_jour(date):
+    """Convertit une date ('YYYYMMDD', date ou datetime) en numpy datetime64[D]"""
+    if isinstance(date, str):
+        date = pd.to_datetime(date, format="%Y%m%d")
+    return np.datetime64(pd.Timestamp(date).date(), "D")
+
+
+class IndexCalendrier:
+    """
+    Matrice booléenne des services actifs (lignes) pour chaque jour (colonnes)
+    de la période couverte par calendar et calendar_dates.
+
+    Une fois l'index construit, la recherche des services actifs pour une
+    date, une période ou un jour de la semaine se résume à une sélection
+    dans la matrice.
+
+    Attributes:
+        service_ids (np.ndarray): Identifiants des services (lignes)
+        jours (np.ndarray): Jours de la période, en datetime64[D] (colonnes)
+        matrice (np.ndarray): Matrice booléenne (services x jours)
+    """
+
+    def __init__(self, feed):
+        calendar = getattr(feed, "calendar", None)
+        calendar_dates = getattr(feed, "calendar_dates", None)
+        if calendar is None:
+            calendar = pd.DataFrame(
+                columns=["service_id", "start_date", "end_date"] + JOURS_SEMAINE
+            )
+        if calendar_dates is None:
+            calendar_dates = pd.DataFrame(
+                columns=["service_id", "date", "exception_type"]
+            )
+
+        # Dates converties une seule fois
+        debuts = pd.to_datetime(
+            calendar["start_date"].astype("string"), format="%Y%m%d"
+        ).to_numpy(dtype="datetime64[D]")
+        fins = pd.to_datetime(
+            calendar["end_date"].astype("string"), format="%Y%m%d"
+        ).to_numpy(dtype="datetime64[D]")
+        dates_exceptions = pd.to_datetime(
+            calendar_dates["date"].astype("string"), format="%Y%m%d"
+        ).to_numpy(dtype="datetime64[D]")
+
+        # Lignes : tous les services connus de calendar et calendar_dates
+        self.service_ids = np.array(
+            sorted(
+                set(calendar["service_id"].astype("string").dropna())
+                | set(calendar_dates["service_id"].astype("string").dropna())
+            ),
+            dtype=object,
+        )
+
+        # Colonnes : tous les jours de la période de validité
+        bornes = np.concatenate([debuts, fins, dates_exceptions])
+        if len(bornes) == 0:
+            self.jours = np.array([], dtype="datetime64[D]")
+        else:
+            self.jours = np.arange(
+                bornes.min(), bornes.max() + 1, dtype="datetime64[D]"
+            )
+        self.premier_jour = self.jours[0] if len(self.jours) else None
+
+        self.matrice = np.zeros((len(self.service_ids), len(self.jours)), dtype=bool)
+        if len(self.jours) == 0:
+            return
+
+        # 1. calendar.txt : jours de la semaine actifs entre start_date et end_date
+        if len(calendar) > 0:
+            lignes = np.searchsorted(
+                self.service_ids, calendar["service_id"].astype("string").to_numpy()
+            )
+            # Jour de la semaine de chaque colonne (0 = lundi)
+            jour_semaine = (self.jours.astype("int64") - 4) % 7
+            drapeaux = (
+                calendar[JOURS_SEMAINE]
+                .apply(pd.to_numeric, errors="coerce")
+                .fillna(0)
+                .to_numpy()
+                == 1
+            )
+            actifs = (
+                drapeaux[:, jour_semaine]
+                & (self.jours[None, :] >= debuts[:, None])
+                & (self.jours[None, :] <= fins[:, None])
+            )
+            np.logical_or.at(self.matrice, lignes, actifs)
+
+        # 2. calendar_dates.txt : exceptions (1 = service ajouté, 2 = service retiré)
+        if len(calendar_dates) > 0:
+            lignes = np.searchsorted(
+                self.service_ids,
+                calendar_dates["service_id"].astype("string").to_numpy(),
+            )
+            colonnes = (dates_exceptions - self.premier_jour).astype("int64")
+            types = pd.to_numeric(calendar_dates["exception_type"], errors="coerce")
+            for type_exception, valeur in [(1, True), (2, False)]:
+                masque = (types == type_exception).to_numpy()
+                self.matrice[lignes[masque], colonnes[masque]] = valeur
+
+    def colonne(self, date):
+        """
+        Retourne l'indice de colonne d'une date, ou None si elle est hors période
+        """
+        if self.premier_jour is None:
+            return None
+        indice = int((_vers_jour(date) - self.premier_jour).astype("int64"))
+        if 0 <= indice < len(self.jours):
+            return indice
+        return None
+
+    def services_actifs(self, date):
+        """
+        Identifie les service_id actifs pour une date donnée
+        Args:
+            date (str): Date au format 'YYYYMMDD' (ou date/datetime)
+        Returns:
+            list[str]: Liste des service_id actifs
+        """
+        indice = self.colonne(date)
+        if indice is None:
+            return []
+        return self.service_ids[self.matrice[:, indice]].tolist()
+
+    def matrice_periode(self, debut, fin):
+        """
+        Extrait la sous-matrice des services actifs sur une période (bornes incluses)
+        Args:
+            debut (str): Date de début au format 'YYYYMMDD'
+            fin (str): Date de fin au format 'YYYYMMDD'
+        Returns:
+            tuple (np.ndarray, np.ndarray) : jours de la période (datetime64[D])
+            et matrice booléenne services x jours correspondante
+        """
+        if self.premier_jour is None:
+            return self.jours, self.matrice
+        i_debut = int((_vers_jour(debut) - self.premier_jour).astype("int64"))
+        i_fin = int((_vers_jour(fin) - self.premier_jour).astype("int64")) + 1
+        i_debut, i_fin = max(i_debut, 0), max(i_fin, 0)
+        return self.jours[i_debut:i_fin], self.matrice[:, i_debut:i_fin]
+
+    def dates_jour_semaine(self, jour, debut=None, fin=None):
+        """
+        Liste les dates de la période correspondant à un jour de la semaine
+        Args:
+            jour (str): Jour de la semaine en anglais ('tuesday', etc.)
+            debut (str): Date de début (défaut : début de validité du feed)
+            fin (str): Date de fin (défaut : fin de validité du feed)
+        Returns:
+            list[str]: Dates au format 'YYYYMMDD'
+        """
+        if len(self.jours) == 0:
+            return []
+        jours, _ = self.matrice_periode(
+            debut if debut is not None else self.jours[0],
+            fin if fin is not None else self.jours[-1],
+        )
+        jours = jours[(jours.astype("int64") - 4) % 7 == JOURS_SEMAINE.index(jour)]
+        return [str(j).replace("-", "") for j in jours]
+
+    def services_actifs_periode(self, debut, fin):
+        """
+        Identifie les service_id actifs pour chaque jour d'une période
+        Args:
+            debut (str): Date de début au format 'YYYYMMDD'
+            fin (str): Date de fin au format 'YYYYMMDD'
+        Returns:
+            dict[str, list[str]]: service_id actifs par date 'YYYYMMDD'
+        """
+        jours, matrice = self.matrice_periode(debut, fin)
+        return {
+            str(jour).replace("-", ""): self.service_ids[matrice[:, i]].tolist()
+            for i, jour in enumerate(jours)
+        }
+
+    def table_services_actifs(self, dates):
+        """
+        Table des service_id actifs pour chacune des dates demandées
+        Args:
+            dates (list[str]): Dates au format 'YYYYMMDD'
+        Returns:
+            pd.DataFrame: Format long, colonnes date et service_id
+        """
+        tables = [
+            pd.DataFrame({"date": date, "service_id": self.services_actifs(date)})
+            for date in dates
+        ]
+        if not tables:
+            return pd.DataFrame(columns=["date", "service_id"])
+        return pd.concat(tables, ignore_index=True)
+
+
+def lister_dates(debut, fin):
+    """
+    Liste les dates d'une période (bornes incluses)
+    Args:
+        debut (str): Date de début au format 'YYYYMMDD'
+        fin (str): Date de fin au format 'YYYYMMDD'
+    Returns:
+        list[str]: Dates au format 'YYYYMMDD'
+    """
+    return (
+        pd.date_range(
+            pd.to_datetime(debut, format="%Y%m%d"),
+            pd.to_datetime(fin, format="%Y%m%d"),
+        )
+        .strftime("%Y%m%d")
+        .tolist()
+    )
+
+
+def obtenir_index_calendrier(feed):
+    """
+    Retourne l'index calendrier du feed, construit au premier appel puis
+    conservé sur le feed. L'index est reconstruit si calendar ou
+    calendar_dates ont été remplacés entre-temps.
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        IndexCalendrier
+    """
+    tables = [getattr(feed, "calendar", None), getattr(feed, "calendar_dates", None)]
+    index = lire_resultat_du_feed(feed, "_index_calendrier", tables)
+    if index is None:
+        index = conserver_sur_le_feed(
+            feed, "_index_calendrier", tables, IndexCalendrier(feed)
+        )
+    return index
@@ -1,52 +1,181 @@
+import time
+
 import folium
+from branca.element import MacroElement
 from folium import plugins
+from jinja2 import Template
+import geopandas as gpd
 import numpy as np
+import shapely
 import branca.colormap as cm
 
+from src.instrumentation import mesurer_etape
+from src.utils import FAMILLES_MODES_ETENDUS, MODES_GTFS, decrire_mode
+
+
+# Classes de couleur des arrêts : aucun passage, puis par quartile de passages
+COULEURS_CLASSES_ARRETS = ["gray", "green", "yellow", "orange", "red"]
 
-def create_carte_arrets(df):
+# Rendu agrégé des arrêts : en dessous de SEUIL_ZOOM_ARRETS, les arrêts sont
+# regroupés dans une grille de TAILLE_MAILLE_DEG degrés (≈ 500 m)
+SEUIL_ZOOM_ARRETS = 14
+TAILLE_MAILLE_DEG = 0.005
+
+
+def _classes_passages(passages):
     """
-    Crée une carte Folium interactive des indicateurs par arrêt.
-    Args:
-        df (pd.DataFrame): Dataframe contenant les indicateurs par arrêt.
-    Returns:
-        folium.Map: Carte Folium interactive.
+    Classe de couleur de chaque valeur (indice dans COULEURS_CLASSES_ARRETS) :
+    0 sans passage, puis 1 à 4 selon les quartiles des passages
     """
+    passages = np.asarray(passages, dtype="float64")
+    quartiles = np.percentile(passages, [25, 50, 75]) if len(passages) else []
+    return np.where(
+        passages == 0, 0, 1 + np.searchsorted(quartiles, passages, side="left")
+    )
 
-    # Carte des arrêts avec leur nombre de passages
 
-    # Définir les seuils pour les couleurs
-    passages_values = df["nombre_passages"].values
-    bins = np.percentile(passages_values, [0, 25, 50, 75, 100])
-    bins = [0] + list(bins[1:])  # Assurer que le minimum est 0
+class _VisibiliteSelonZoom(MacroElement):
+    """
+    Affiche une couche en dessous d'un seuil de zoom et une autre au-dessus
+    (bascule faite par le navigateur à chaque changement de zoom)
+    """
 
-    def get_color(passages):
-        if passages == 0:
-            return "gray"
-        elif passages <= bins[1]:
-            return "green"
-        elif passages <= bins[2]:
-            return "yellow"
-        elif passages <= bins[3]:
-            return "orange"
-        else:
-            return "red"
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        (function() {
+            var carte = {{ this._parent.get_name() }};
+            function basculer() {
+                var detail = carte.getZoom() >= {{ this.seuil }};
+                carte.removeLayer(detail ? {{ this.bas }} : {{ this.haut }});
+                carte.addLayer(detail ? {{ this.haut }} : {{ this.bas }});
+            }
+            carte.on("zoomend", basculer);
+            basculer();
+        })();
+        {% endmacro %}
+        """
+    )
 
-    m = folium.Map(
-        location=[df["stop_lat"].mean(), df["stop_lon"].mean()],
-        zoom_start=12,
-        width="100%",
-        height="500px",
+    def __init__(self, couche_bas, couche_haut, seuil):
+        super().__init__()
+        self._name = "VisibiliteSelonZoom"
+        self.bas = couche_bas.get_name()
+        self.haut = couche_haut.get_name()
+        self.seuil = int(seuil)
+
+
+def _couche_points(df, proprietes, rayons, classes, **kwargs):
+    """
+    Couche GeoJSON de points (cercles) stylés par le navigateur à partir des
+    propriétés de chaque point
+    """
+    couleurs = np.array(COULEURS_CLASSES_ARRETS, dtype=object)[classes]
+    proprietes = dict(proprietes)
+    proprietes["style"] = [
+        {"color": couleur, "fillColor": couleur, "radius": float(rayon)}
+        for couleur, rayon in zip(couleurs, rayons)
+    ]
+    geometries = shapely.points(
+        np.round(df["lon"].to_numpy(dtype="float64"), PRECISION_COORDONNEES),
+        np.round(df["lat"].to_numpy(dtype="float64"), PRECISION_COORDONNEES),
+    )
+    geojson = gpd.GeoDataFrame(proprietes, geometry=geometries).to_json(
+        drop_id=True
+    )
+    return folium.GeoJson(
+        geojson,
+        marker=folium.CircleMarker(radius=2, fill=True, fill_opacity=0.7, weight=1),
+        control=False,
+        **kwargs,
     )
 
-    for _, row in df.iterrows():
-        stop_id = row["stop_id"]
-        lat = row["stop_lat"]
-        lon = row["stop_lon"]
-        passages = row["nombre_passages"]
 
-        color = get_color(passages)
+def _ajouter_arrets_agreges(m, df):
+    """
+    Ajoute les arrêts en deux couches GeoJSON selon le zoom : grille agrégée
+    (nombre d'arrêts et passages par maille) en vue d'ensemble, un point par
+    arrêt au-delà de SEUIL_ZOOM_ARRETS. Retourne le nombre de mailles
+    """
+    arrets = df[["stop_id", "stop_lat", "stop_lon", "nombre_passages"]].copy()
+    arrets = arrets.dropna(subset=["stop_lat", "stop_lon"])
+    if arrets.empty:
+        # Aucun arrêt localisé : carte sans couche d'arrêts
+        return 0
+    arrets = arrets.rename(columns={"stop_lat": "lat", "stop_lon": "lon"})
+    passages = arrets["nombre_passages"].fillna(0).to_numpy(dtype="int64")
+
+    # Vue détaillée : un point par arrêt
+    noms = (
+        df.loc[arrets.index, "stop_name"].astype(str).to_numpy()
+        if "stop_name" in df.columns
+        else arrets["stop_id"].astype(str).to_numpy()
+    )
+    couche_arrets = _couche_points(
+        arrets,
+        {
+            "stop_id": arrets["stop_id"].astype(str).to_numpy(),
+            "stop_name": noms,
+            "nombre_passages": passages,
+        },
+        rayons=np.full(len(arrets), 2),
+        classes=_classes_passages(passages),
+        name="Arrêts",
+        tooltip=folium.GeoJsonTooltip(fields=["stop_name"], labels=False),
+        popup=folium.GeoJsonPopup(
+            fields=["stop_id", "nombre_passages"], aliases=["Arrêt ID", "Passages"]
+        ),
+    )
+
+    # Vue d'ensemble : grille régulière en degrés
+    arrets["maille_x"] = np.floor(arrets["lon"] / TAILLE_MAILLE_DEG).astype("int64")
+    arrets["maille_y"] = np.floor(arrets["lat"] / TAILLE_MAILLE_DEG).astype("int64")
+    mailles = (
+        arrets.assign(nombre_passages=passages)
+        .groupby(["maille_x", "maille_y"], sort=False)
+        .agg(
+            nombre_arrets=("stop_id", "size"),
+            nombre_passages=("nombre_passages", "sum"),
+            lat=("lat", "mean"),
+            lon=("lon", "mean"),
+        )
+        .reset_index(drop=True)
+    )
+    nombre_arrets = mailles["nombre_arrets"].to_numpy()
+    couche_mailles = _couche_points(
+        mailles,
+        {
+            "nombre_arrets": nombre_arrets,
+            "nombre_passages": mailles["nombre_passages"].to_numpy(),
+        },
+        rayons=np.round(4 + 10 * np.sqrt(nombre_arrets / nombre_arrets.max()), 1),
+        classes=_classes_passages(mailles["nombre_passages"]),
+        name="Arrêts (grille)",
+        tooltip=folium.GeoJsonTooltip(
+            fields=["nombre_arrets", "nombre_passages"],
+            aliases=["Arrêts", "Passages"],
+        ),
+    )
 
+    couche_mailles.add_to(m)
+    couche_arrets.add_to(m)
+    _VisibiliteSelonZoom(couche_mailles, couche_arrets, SEUIL_ZOOM_ARRETS).add_to(m)
+
+    return len(mailles)
+
+
+def _ajouter_arrets_marqueurs(m, df):
+    """
+    Ajoute un CircleMarker Folium par arrêt (rendu historique, adapté aux
+    petits réseaux)
+    """
+    df = df.dropna(subset=["stop_lat", "stop_lon"])
+    couleurs = np.array(COULEURS_CLASSES_ARRETS, dtype=object)[
+        _classes_passages(df["nombre_passages"])
+    ]
+    for stop_id, lat, lon, passages, color in zip(
+        df["stop_id"], df["stop_lat"], df["stop_lon"], df["nombre_passages"], couleurs
+    ):
         folium.CircleMarker(
             location=[lat, lon],
             radius=2,
@@ -56,48 +185,113 @@ def create_carte_arrets(df):
             fill_color=color,
         ).add_to(m)
 
+
+@mesurer_etape("carte")
+def create_carte_arrets(df, rendu="agrege", mesurer_taille=False):
+    """
+    Crée une carte Folium interactive des indicateurs par arrêt.
+    Les arrêts sont colorés par quartile de passages (gris sans passage).
+    Args:
+        df (pd.DataFrame): Dataframe contenant les indicateurs par arrêt.
+        rendu (str): "agrege" (défaut) : grille agrégée en vue d'ensemble puis
+            une couche GeoJSON de points au-delà du zoom SEUIL_ZOOM_ARRETS ;
+            "marqueurs" : un CircleMarker par arrêt
+        mesurer_taille (bool): Afficher la taille du HTML de la carte (demande
+            un rendu complet, en plus de celui de l'appelant)
+    Returns:
+        folium.Map: Carte Folium interactive.
+    """
+    if rendu not in ("agrege", "marqueurs"):
+        raise ValueError(f"Rendu inconnu : {rendu!r} (attendu : agrege, marqueurs)")
+
+    debut = time.perf_counter()
+
+    # Centrée sur les arrêts localisés (vue par défaut s'il n'y en a aucun)
+    centre = [df["stop_lat"].mean(), df["stop_lon"].mean()]
+    m = folium.Map(
+        location=None if np.isnan(centre).any() else centre,
+        zoom_start=12,
+        width="100%",
+        height="500px",
+    )
+
+    if rendu == "agrege":
+        detail = f"{_ajouter_arrets_agreges(m, df)} mailles, "
+    else:
+        _ajouter_arrets_marqueurs(m, df)
+        detail = ""
+    duree_construction = time.perf_counter() - debut
+
+    message = (
+        f"✓ Carte des arrêts ({rendu}) : {len(df)} arrêts, {detail}"
+        f"construite en {duree_construction:.2f} s"
+    )
+    if mesurer_taille:
+        # Taille du HTML envoyé au navigateur
+        taille = len(m.get_root().render().encode("utf-8"))
+        message += f", {taille / 1e6:.2f} Mo de HTML"
+    print(message)
+
     return m
 
 
-def creer_carte_troncons(gdf_bus, gdf_tram, colonne_frequence="nombre_passages"):
-    """
-    Crée une carte Folium interactive avec les tronçons bus et tram.
-    Les tronçons sont colorés selon la fréquence et peuvent être activés/désactivés.
+# Palettes de couleurs des tronçons, par route_type de base
+PALETTES_MODES = {
+    3: ["#fee5d9", "#fcae91", "#fb6a4a", "#de2d26", "#a50f15"],  # Bus
+    0: ["#edf8e9", "#bae4b3", "#74c476", "#31a354", "#006d2c"],  # Tram
+    1: ["#eff3ff", "#bdd7e7", "#6baed6", "#3182bd", "#08519c"],  # Métro
+    2: ["#f2f0f7", "#cbc9e2", "#9e9ac8", "#756bb1", "#54278f"],  # Train
+    4: ["#f1eef6", "#bdc9e1", "#74a9cf", "#2b8cbe", "#045a8d"],  # Ferry
+}
+PALETTE_DEFAUT = ["#feedde", "#fdbe85", "#fd8d3c", "#e6550d", "#a63603"]
 
-    Parameters:
-    -----------
-    gdf_bus : GeoDataFrame
-        GeoDataFrame des tronçons bus avec indicateurs
-    gdf_tram : GeoDataFrame
-        GeoDataFrame des tronçons tram avec indicateurs
-    colonne_frequence : str
-        Nom de la colonne contenant la fréquence (défaut: 'nombre_passages')
+# Couleurs des titres de popup, par route_type de base
+COULEURS_TITRES_MODES = {3: "#d63447", 0: "#28a745"}
 
-    Returns:
-    --------
-    folium.Map
-        Carte Folium interactive
+# Rendu GeoJSON : décimales conservées sur les coordonnées (5 ≈ 1 m)
+# et nombre de teintes échantillonnées dans la palette de chaque mode
+PRECISION_COORDONNEES = 5
+NB_TEINTES = 256
+
+
+def _route_type_de_base(route_type):
     """
+    Retourne le route_type de base d'un type étendu (ex: 715 -> 3)
+    """
+    route_type = int(route_type)
+    if route_type in MODES_GTFS:
+        return route_type
+    return FAMILLES_MODES_ETENDUS.get(route_type // 100 * 100, route_type)
+
 
-    # Déterminer le centre de la carte (moyenne des coordonnées)
+def _centre_troncons(gdfs):
+    """
+    Détermine le centre de la carte (moyenne des coordonnées des tronçons)
+    """
     all_coords = []
-    for gdf in [gdf_bus, gdf_tram]:
+    for gdf in gdfs:
         if len(gdf) > 0:
             all_coords.extend(gdf["lat_depart_parent"].dropna().tolist())
             all_coords.extend(gdf["lat_arrivee_parent"].dropna().tolist())
 
     if not all_coords:
-        center_lat, center_lon = 45.75, 4.85  # Lyon par défaut
-    else:
-        center_lat = np.mean(all_coords)
-        all_lons = []
-        for gdf in [gdf_bus, gdf_tram]:
-            if len(gdf) > 0:
-                all_lons.extend(gdf["lon_depart_parent"].dropna().tolist())
-                all_lons.extend(gdf["lon_arrivee_parent"].dropna().tolist())
-        center_lon = np.mean(all_lons)
-
-    # Créer la carte de base
+        return 45.75, 4.85  # Lyon par défaut
+
+    center_lat = np.mean(all_coords)
+    all_lons = []
+    for gdf in gdfs:
+        if len(gdf) > 0:
+            all_lons.extend(gdf["lon_depart_parent"].dropna().tolist())
+            all_lons.extend(gdf["lon_arrivee_parent"].dropna().tolist())
+    center_lon = np.mean(all_lons)
+
+    return center_lat, center_lon
+
+
+def _creer_carte_base(center_lat, center_lon):
+    """
+    Crée la carte de base avec les fonds de carte alternatifs
+    """
     m = folium.Map(
         location=[center_lat, center_lon], zoom_start=12, tiles="OpenStreetMap"
     )
@@ -106,122 +300,13 @@ def creer_carte_troncons(gdf_bus, gdf_tram, colonne_frequence="nombre_passages")
     folium.TileLayer("cartodbpositron", name="Carto Positron").add_to(m)
     folium.TileLayer("cartodbdark_matter", name="Carto Dark").add_to(m)
 
-    # ===== TRONÇONS BUS =====
-    if len(gdf_bus) > 0 and colonne_frequence in gdf_bus.columns:
-        # Filtrer les tronçons avec passages
-        gdf_bus_actif = gdf_bus[gdf_bus[colonne_frequence] > 0].copy()
-
-        if len(gdf_bus_actif) > 0:
-            # Créer la palette de couleurs pour les bus
-            vmin_bus = gdf_bus_actif[colonne_frequence].min()
-            vmax_bus = gdf_bus_actif[colonne_frequence].max()
-
-            colormap_bus = cm.LinearColormap(
-                colors=["#fee5d9", "#fcae91", "#fb6a4a", "#de2d26", "#a50f15"],
-                vmin=vmin_bus,
-                vmax=vmax_bus,
-                caption=f"Nombre de passages Bus",
-            )
-
-            # Créer un groupe de features pour les bus
-            feature_group_bus = folium.FeatureGroup(name="🚌 Bus", show=True)
-
-            # Ajouter chaque tronçon bus
-            for idx, row in gdf_bus_actif.iterrows():
-                freq = row[colonne_frequence]
-                color = colormap_bus(freq)
-
-                # Extraire les coordonnées de la géométrie
-                coords = [(coord[1], coord[0]) for coord in row["geometry"].coords]
-
-                # Créer le popup avec les informations
-                popup_html = f"""
-                <div style="font-family: Arial; font-size: 12px; width: 250px;">
-                    <b style="color: #d63447;">🚌 TRONÇON BUS</b><br>
-                    <hr style="margin: 5px 0;">
-                    <b>ID:</b> {row.get('troncon_unique_id', 'N/A')}<br>
-                    <b>De:</b> {row.get('stop_depart_name', 'N/A')}<br>
-                    <b>À:</b> {row.get('stop_arrivee_name', 'N/A')}<br>
-                    <hr style="margin: 5px 0;">
-                    <b>Passages:</b> {int(freq)}<br>
-                    <b>Vitesse moy.:</b> {row.get('vitesse_moyenne_kmh', 0):.1f} km/h<br>
-                    <b>Distance:</b> {row.get('distance_km', 0):.2f} km
-                </div>
-                """
-
-                # Épaisseur proportionnelle à la fréquence
-                weight = 2 + (freq - vmin_bus) / (vmax_bus - vmin_bus) * 6
-
-                folium.PolyLine(
-                    coords,
-                    color=color,
-                    weight=weight,
-                    opacity=0.8,
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=f"{row.get('stop_depart_name', '')} → {row.get('stop_arrivee_name', '')}: {int(freq)} passages",
-                ).add_to(feature_group_bus)
-
-            feature_group_bus.add_to(m)
-            colormap_bus.add_to(m)
+    return m
 
-    # ===== TRONÇONS TRAM =====
-    if len(gdf_tram) > 0 and colonne_frequence in gdf_tram.columns:
-        # Filtrer les tronçons avec passages
-        gdf_tram_actif = gdf_tram[gdf_tram[colonne_frequence] > 0].copy()
-
-        if len(gdf_tram_actif) > 0:
-            # Créer la palette de couleurs pour les trams
-            vmin_tram = gdf_tram_actif[colonne_frequence].min()
-            vmax_tram = gdf_tram_actif[colonne_frequence].max()
-
-            colormap_tram = cm.LinearColormap(
-                colors=["#edf8e9", "#bae4b3", "#74c476", "#31a354", "#006d2c"],
-                vmin=vmin_tram,
-                vmax=vmax_tram,
-                caption=f"Nombre de passages Tram",
-            )
-
-            # Créer un groupe de features pour les trams
-            feature_group_tram = folium.FeatureGroup(name="🚊 Tram", show=True)
-
-            # Ajouter chaque tronçon tram
-            for idx, row in gdf_tram_actif.iterrows():
-                freq = row[colonne_frequence]
-                color = colormap_tram(freq)
-
-                # Extraire les coordonnées de la géométrie
-                coords = [(coord[1], coord[0]) for coord in row["geometry"].coords]
-
-                # Créer le popup avec les informations
-                popup_html = f"""
-                <div style="font-family: Arial; font-size: 12px; width: 250px;">
-                    <b style="color: #28a745;">🚊 TRONÇON TRAM</b><br>
-                    <hr style="margin: 5px 0;">
-                    <b>ID:</b> {row.get('troncon_unique_id', 'N/A')}<br>
-                    <b>De:</b> {row.get('stop_depart_name', 'N/A')}<br>
-                    <b>À:</b> {row.get('stop_arrivee_name', 'N/A')}<br>
-                    <hr style="margin: 5px 0;">
-                    <b>Passages:</b> {int(freq)}<br>
-                    <b>Vitesse moy.:</b> {row.get('vitesse_moyenne_kmh', 0):.1f} km/h<br>
-                    <b>Distance:</b> {row.get('distance_km', 0):.2f} km
-                </div>
-                """
-
-                # Épaisseur proportionnelle à la fréquence
-                weight = 2 + (freq - vmin_tram) / (vmax_tram - vmin_tram) * 6
-
-                folium.PolyLine(
-                    coords,
-                    color=color,
-                    weight=weight,
-                    opacity=0.8,
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=f"{row.get('stop_depart_name', '')} → {row.get('stop_arrivee_name', '')}: {int(freq)} passages",
-                ).add_to(feature_group_tram)
-
-            feature_group_tram.add_to(m)
-            colormap_tram.add_to(m)
 
+def _ajouter_controles(m):
+    """
+    Ajoute le contrôle des couches, le plein écran et la mesure de distance
+    """
     # Ajouter le contrôle des couches (cases à cocher)
     folium.LayerControl(collapsed=False).add_to(m)
 
@@ -240,4 +325,268 @@ def creer_carte_troncons(gdf_bus, gdf_tram, colonne_frequence="nombre_passages")
         secondary_length_unit="meters",
     ).add_to(m)
 
+
+def _palette_troncons_mode(gdf_actif, route_type, colonne_frequence):
+    """
+    Crée la palette de couleurs d'un mode, de la fréquence min à la fréquence max
+    """
+    mode = decrire_mode(route_type)
+    vmin = gdf_actif[colonne_frequence].min()
+    vmax = gdf_actif[colonne_frequence].max()
+
+    return cm.LinearColormap(
+        colors=PALETTES_MODES.get(_route_type_de_base(route_type), PALETTE_DEFAUT),
+        vmin=vmin,
+        vmax=vmax,
+        caption=f"Nombre de passages {mode['nom']}",
+    )
+
+
+def _ajouter_troncons_mode(m, gdf, route_type, colonne_frequence):
+    """
+    Ajoute à la carte les tronçons actifs d'un mode, dans leur propre couche,
+    colorés et épaissis selon la fréquence
+    """
+    if len(gdf) == 0 or colonne_frequence not in gdf.columns:
+        return
+
+    # Filtrer les tronçons avec passages
+    gdf_actif = gdf[gdf[colonne_frequence] > 0].copy()
+    if len(gdf_actif) == 0:
+        return
+
+    mode = decrire_mode(route_type)
+    route_type_base = _route_type_de_base(route_type)
+    couleur_titre = COULEURS_TITRES_MODES.get(route_type_base, "#333333")
+
+    # Créer la palette de couleurs du mode
+    colormap = _palette_troncons_mode(gdf_actif, route_type, colonne_frequence)
+    vmin, vmax = colormap.vmin, colormap.vmax
+
+    # Créer un groupe de features pour le mode
+    feature_group = folium.FeatureGroup(
+        name=f"{mode['emoji']} {mode['nom']}", show=True
+    )
+
+    # Ajouter chaque tronçon
+    for idx, row in gdf_actif.iterrows():
+        freq = row[colonne_frequence]
+        color = colormap(freq)
+
+        # Extraire les coordonnées de la géométrie
+        coords = [(coord[1], coord[0]) for coord in row["geometry"].coords]
+
+        # Créer le popup avec les informations
+        popup_html = f"""
+        <div style="font-family: Arial; font-size: 12px; width: 250px;">
+            <b style="color: {couleur_titre};">{mode['emoji']} TRONÇON {mode['nom'].upper()}</b><br>
+            <hr style="margin: 5px 0;">
+            <b>ID:</b> {row.get('troncon_unique_id', 'N/A')}<br>
+            <b>De:</b> {row.get('stop_depart_name', 'N/A')}<br>
+            <b>À:</b> {row.get('stop_arrivee_name', 'N/A')}<br>
+            <hr style="margin: 5px 0;">
+            <b>Passages:</b> {int(freq)}<br>
+            <b>Vitesse moy.:</b> {row.get('vitesse_moyenne_kmh', 0):.1f} km/h<br>
+            <b>Distance:</b> {row.get('distance_km', 0):.2f} km
+        </div>
+        """
+
+        # Épaisseur proportionnelle à la fréquence
+        weight = 2 + (freq - vmin) / (vmax - vmin) * 6 if vmax > vmin else 2
+
+        folium.PolyLine(
+            coords,
+            color=color,
+            weight=weight,
+            opacity=0.8,
+            popup=folium.Popup(popup_html, max_width=300),
+            tooltip=f"{row.get('stop_depart_name', '')} → {row.get('stop_arrivee_name', '')}: {int(freq)} passages",
+        ).add_to(feature_group)
+
+    feature_group.add_to(m)
+    colormap.add_to(m)
+
+
+def _ajouter_troncons_mode_geojson(
+    m, gdf, route_type, colonne_frequence, precision=PRECISION_COORDONNEES
+):
+    """
+    Ajoute à la carte les tronçons actifs d'un mode en une seule couche GeoJSON.
+    Couleur, épaisseur, infobulle et popup sont calculées en colonnes
+    (vectorisées) et appliquées par le navigateur à partir des propriétés
+    de chaque tronçon ; les coordonnées sont arrondies à `precision` décimales.
+    """
+    if len(gdf) == 0 or colonne_frequence not in gdf.columns:
+        return
+
+    # Filtrer les tronçons avec passages et géométrie
+    gdf_actif = gdf[(gdf[colonne_frequence] > 0) & gdf.geometry.notna()]
+    if len(gdf_actif) == 0:
+        return
+
+    mode = decrire_mode(route_type)
+    colormap = _palette_troncons_mode(gdf_actif, route_type, colonne_frequence)
+    vmin, vmax = colormap.vmin, colormap.vmax
+
+    # Position de chaque tronçon dans la palette (0 à 1)
+    freq = gdf_actif[colonne_frequence].to_numpy(dtype="float64")
+    position = (freq - vmin) / (vmax - vmin) if vmax > vmin else np.zeros(len(freq))
+
+    # Couleurs échantillonnées dans la palette, épaisseur proportionnelle
+    teintes = np.array(
+        [colormap(v) for v in np.linspace(vmin, vmax, NB_TEINTES)], dtype=object
+    )
+    couleurs = teintes[np.rint(position * (NB_TEINTES - 1)).astype("int64")]
+    epaisseurs = np.round(2 + position * 6, 1) if vmax > vmin else np.full(len(freq), 2)
+
+    def colonne_texte(colonne, defaut="N/A"):
+        if colonne not in gdf_actif.columns:
+            return defaut
+        return gdf_actif[colonne].astype(str).to_numpy()
+
+    def colonne_nombre(colonne, decimales, unite):
+        if colonne not in gdf_actif.columns:
+            valeurs = np.zeros(len(gdf_actif))
+        else:
+            valeurs = gdf_actif[colonne].fillna(0).to_numpy(dtype="float64")
+        return np.char.add(
+            np.char.mod(f"%.{decimales}f", valeurs), f" {unite}"
+        ).astype(object)
+
+    passages = freq.astype("int64").astype(str).astype(object)
+    depart = colonne_texte("stop_depart_name", "")
+    arrivee = colonne_texte("stop_arrivee_name", "")
+    proprietes = {
+        "mode": f"{mode['emoji']} Tronçon {mode['nom']}",
+        "troncon_unique_id": colonne_texte("troncon_unique_id"),
+        "stop_depart_name": colonne_texte("stop_depart_name"),
+        "stop_arrivee_name": colonne_texte("stop_arrivee_name"),
+        "passages": passages,
+        "vitesse": colonne_nombre("vitesse_moyenne_kmh", 1, "km/h"),
+        "distance": colonne_nombre("distance_km", 2, "km"),
+        "infobulle": depart + " → " + arrivee + ": " + passages + " passages",
+        # Style lu par Leaflet dans les propriétés de chaque tronçon
+        "style": [
+            {"color": couleur, "weight": float(epaisseur), "opacity": 0.8}
+            for couleur, epaisseur in zip(couleurs, epaisseurs)
+        ],
+    }
+
+    # Coordonnées arrondies (GeoJSON plus léger)
+    geometries = shapely.transform(
+        gdf_actif.geometry.to_numpy(), lambda coords: np.round(coords, precision)
+    )
+    geojson = gpd.GeoDataFrame(
+        proprietes, geometry=geometries, crs=gdf_actif.crs
+    ).to_json(drop_id=True)
+
+    folium.GeoJson(
+        geojson,
+        name=f"{mode['emoji']} {mode['nom']}",
+        show=True,
+        tooltip=folium.GeoJsonTooltip(fields=["infobulle"], labels=False),
+        popup=folium.GeoJsonPopup(
+            fields=[
+                "mode",
+                "troncon_unique_id",
+                "stop_depart_name",
+                "stop_arrivee_name",
+                "passages",
+                "vitesse",
+                "distance",
+            ],
+            aliases=["", "ID", "De", "À", "Passages", "Vitesse moy.", "Distance"],
+            max_width=300,
+        ),
+    ).add_to(m)
+    colormap.add_to(m)
+
+
+def _fonction_rendu(rendu):
+    """
+    Retourne la fonction d'ajout des tronçons d'un mode selon le rendu demandé
+    """
+    fonctions = {
+        "geojson": _ajouter_troncons_mode_geojson,
+        "polylignes": _ajouter_troncons_mode,
+    }
+    if rendu not in fonctions:
+        raise ValueError(
+            f"Rendu inconnu : {rendu!r} (attendu : {', '.join(fonctions)})"
+        )
+    return fonctions[rendu]
+
+
+@mesurer_etape("carte")
+def creer_carte_troncons(
+    gdf_bus, gdf_tram, colonne_frequence="nombre_passages", rendu="geojson"
+):
+    """
+    Crée une carte Folium interactive avec les tronçons bus et tram.
+    Les tronçons sont colorés selon la fréquence et peuvent être activés/désactivés.
+
+    Parameters:
+    -----------
+    gdf_bus : GeoDataFrame
+        GeoDataFrame des tronçons bus avec indicateurs
+    gdf_tram : GeoDataFrame
+        GeoDataFrame des tronçons tram avec indicateurs
+    colonne_frequence : str
+        Nom de la colonne contenant la fréquence (défaut: 'nombre_passages')
+    rendu : str
+        "geojson" (défaut) : une couche GeoJSON par mode, stylée par le
+        navigateur ; "polylignes" : une PolyLine Folium par tronçon
+
+    Returns:
+    --------
+    folium.Map
+        Carte Folium interactive
+    """
+    m = _creer_carte_base(*_centre_troncons([gdf_bus, gdf_tram]))
+
+    ajouter_troncons = _fonction_rendu(rendu)
+
+    # ===== TRONÇONS BUS =====
+    ajouter_troncons(m, gdf_bus, 3, colonne_frequence)
+
+    # ===== TRONÇONS TRAM =====
+    ajouter_troncons(m, gdf_tram, 0, colonne_frequence)
+
+    _ajouter_controles(m)
+
+    return m
+
+
+@mesurer_etape("carte")
+def creer_carte_troncons_multimodale(
+    gdf_troncons, colonne_frequence="nombre_passages", rendu="geojson"
+):
+    """
+    Crée une carte Folium interactive avec les tronçons de tous les modes.
+    Chaque mode a sa propre couche (activable/désactivable) et sa palette.
+
+    Parameters:
+    -----------
+    gdf_troncons : GeoDataFrame
+        GeoDataFrame des tronçons avec indicateurs et une colonne route_type
+        (voir compute_indicateurs_troncons_multimodal)
+    colonne_frequence : str
+        Nom de la colonne contenant la fréquence (défaut: 'nombre_passages')
+    rendu : str
+        "geojson" (défaut) : une couche GeoJSON par mode, stylée par le
+        navigateur ; "polylignes" : une PolyLine Folium par tronçon
+
+    Returns:
+    --------
+    folium.Map
+        Carte Folium interactive
+    """
+    m = _creer_carte_base(*_centre_troncons([gdf_troncons]))
+
+    ajouter_troncons = _fonction_rendu(rendu)
+    for route_type, gdf_mode in gdf_troncons.groupby("route_type"):
+        ajouter_troncons(m, gdf_mode, route_type, colonne_frequence)
+
+    _ajouter_controles(m)
+
     return m
@@ -3,12 +3,22 @@ Création optimisée des tronçons uniques GTFS
 Tronçons par mode de transport, deux sens confondus, à la station parent
 """
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely.geometry import LineString
 
+from src.instrumentation import etape
+from src.parcours import obtenir_index_parcours
+from src.traces import a_des_traces, decouper_troncons
+from src.utils import (
+    calculer_distance_haversine,
+    creer_lignes_entre_arrets,
+    decrire_mode,
+    lister_route_types,
+)
 
-def creer_troncons_uniques(feed, route_type):
+
+def creer_troncons_uniques(feed, route_type, index=None):
     """
     Crée un GeoDataFrame des tronçons uniques pour un type de route donné.
 
@@ -20,6 +30,8 @@ def creer_troncons_uniques(feed, route_type):
         Feed GTFS chargé
     route_type : int
         Type de route GTFS (0=tram, 3=bus, etc.)
+    index : IndexParcours
+        Index des parcours du feed (défaut : obtenir_index_parcours(feed))
 
     Returns:
     --------
@@ -27,130 +39,180 @@ def creer_troncons_uniques(feed, route_type):
     """
     print(f"\nCréation des tronçons uniques pour route_type={route_type}...")
 
-    # 1. Préparer le mapping vers les parent_stations
-    stops = feed.stops.copy()
-    stops["parent_station"] = stops["parent_station"].fillna(stops["stop_id"])
-    stops.loc[stops["parent_station"] == "", "parent_station"] = stops["stop_id"]
+    gdf = _construire_troncons_uniques(feed, [route_type], index)
+    gdf = gdf.drop(columns=["route_type", "mode"])
 
-    # Mapping stop_id -> parent_station
-    stop_to_parent = stops.set_index("stop_id")["parent_station"].to_dict()
+    print(f"✓ {len(gdf)} tronçons uniques créés")
 
-    # Infos des parents (coords, noms)
-    parent_info = (
-        stops[stops["stop_id"] == stops["parent_station"]]
-        .set_index("stop_id")[["stop_name", "stop_lat", "stop_lon"]]
-        .to_dict("index")
-    )
+    return gdf
 
-    # 2. Filtrer les trips du bon type de route
-    routes_filtrees = feed.routes[feed.routes["route_type"] == route_type]["route_id"]
-    trips_filtres = feed.trips[feed.trips["route_id"].isin(routes_filtrees)]
 
-    # 3. Joindre stop_times avec les trips filtrés
-    stop_times = feed.stop_times.merge(
-        trips_filtres[["trip_id"]], on="trip_id", how="inner"
-    )
+def creer_troncons_uniques_multimodal(feed, route_types=None, index=None):
+    """
+    Crée en un seul passage les tronçons uniques de tous les modes du feed.
 
-    print(f"  → {len(trips_filtres)} trips, {len(stop_times)} stop_times")
+    Les tronçons sont calculés par mode (un même couple d'arrêts desservi
+    par le bus et le tram donne un tronçon pour chaque mode), avec les mêmes
+    identifiants que creer_troncons_uniques mode par mode.
 
-    # 4. Mapper vers parent_stations
-    stop_times["stop_parent"] = stop_times["stop_id"].map(stop_to_parent)
+    Parameters:
+    -----------
+    feed : gtfs_kit Feed object
+        Feed GTFS chargé
+    route_types : list[int]
+        Types de route à traiter (défaut : tous ceux présents dans feed.routes)
+    index : IndexParcours
+        Index des parcours du feed (défaut : obtenir_index_parcours(feed))
 
-    # 5. Trier par trip et séquence
-    stop_times = stop_times.sort_values(["trip_id", "stop_sequence"])
+    Returns:
+    --------
+    GeoDataFrame avec les tronçons uniques et les colonnes route_type et mode
+    """
+    if route_types is None:
+        route_types = lister_route_types(feed)
 
-    # 6. Créer les paires d'arrêts consécutifs
-    print("  → Création des paires d'arrêts consécutifs...")
+    print(f"\nCréation des tronçons uniques pour route_type={list(route_types)}...")
+
+    gdf = _construire_troncons_uniques(feed, route_types, index)
+
+    print(f"✓ {len(gdf)} tronçons uniques créés")
+
+    return gdf
+
+
+def prefixe_troncon(route_type):
+    """
+    Préfixe des identifiants de tronçons d'un mode (TU_<prefixe>_000000)
+    """
+    return "TRAM" if route_type == 0 else "BUS" if route_type == 3 else f"RT{route_type}"
 
-    # Décalage pour obtenir l'arrêt suivant
-    stop_times["stop_parent_suivant"] = stop_times.groupby("trip_id")[
-        "stop_parent"
-    ].shift(-1)
 
-    # Supprimer les derniers arrêts de chaque trip (pas de suivant)
-    paires = stop_times.dropna(subset=["stop_parent_suivant"]).copy()
+def _construire_troncons_uniques(feed, route_types, index=None):
+    """
+    Moteur commun de création des tronçons uniques : les paires d'arrêts
+    sont lues sur les parcours distincts (voir src.parcours) de tous les
+    modes demandés, puis dédupliquées par mode.
+    """
+    route_types = [int(rt) for rt in route_types]
 
-    # 7. Créer une clé unique pour chaque paire (tous sens confondus)
-    print("  → Normalisation des paires (tous sens confondus)...")
+    # 1. Parcours des trips (suites de stations parent), extraits une fois par feed
+    if index is None:
+        index = obtenir_index_parcours(feed)
 
-    paires["stop_pair"] = paires.apply(
-        lambda row: tuple(sorted([row["stop_parent"], row["stop_parent_suivant"]])),
-        axis=1,
+    # 2. Infos des parents (coords, noms), d'après le mapping de l'index
+    est_parent = np.asarray(feed.stops["stop_id"], dtype=object) == np.asarray(
+        index.station_parent, dtype=object
+    )
+    parent_info = feed.stops[est_parent].set_index("stop_id")[
+        ["stop_name", "stop_lat", "stop_lon"]
+    ]
+    selection = index.selectionner_trips(route_types)
+    parcours_retenus = np.isin(
+        np.arange(len(index)), index.parcours_trip[selection]
     )
 
-    # 8. Dédupliquer pour obtenir les tronçons uniques
-    troncons_uniques = paires[["stop_pair"]].drop_duplicates().reset_index(drop=True)
+    print(
+        f"  → {selection.sum()} trips, "
+        f"{parcours_retenus.sum()} parcours distincts"
+    )
+
+    # 3. Segments des parcours retenus (paires d'arrêts consécutifs),
+    # dans l'ordre de première apparition des parcours
+    print("  → Création des paires d'arrêts consécutifs...")
+
+    with etape("appariement", lignes_entree=len(index.segments)) as mesure:
+        segments = index.segments[
+            parcours_retenus[index.segments["parcours"].to_numpy()]
+            & (index.segments["paire"].to_numpy() >= 0)
+        ]
+
+        # 4. Dédupliquer pour obtenir les tronçons uniques de chaque mode
+        # (tous sens confondus, ordre de première apparition au sein du mode)
+        print("  → Normalisation des paires (tous sens confondus)...")
+
+        paires = segments[["route_type", "paire"]].drop_duplicates()
+        paires["route_type"] = pd.Categorical(
+            paires["route_type"], categories=route_types
+        )
+        paires = paires.sort_values("route_type", kind="stable")
+        codes = index.paires.iloc[paires["paire"].to_numpy()]
+        parents = index.parents
+
+        troncons_uniques = pd.DataFrame(
+            {
+                "route_type": paires["route_type"].astype("int64").to_numpy(),
+                "paire": paires["paire"].to_numpy(),
+                "stop_depart_parent_id": parents[codes["code_min"].to_numpy()],
+                "stop_arrivee_parent_id": parents[codes["code_max"].to_numpy()],
+            }
+        )
+        mesure.lignes_sortie = len(troncons_uniques)
 
     print(f"  → {len(troncons_uniques)} tronçons uniques identifiés")
 
-    # 9. Enrichir avec les informations des arrêts
+    # 5. Enrichir avec les informations des arrêts
     print("  → Enrichissement avec coordonnées et noms...")
 
-    def enrichir_troncon(stop_pair):
-        """Enrichit un tronçon avec les infos des deux arrêts"""
-        stop1, stop2 = stop_pair
-
-        # Infos du parent 1
-        info1 = parent_info.get(stop1, {})
-        # Infos du parent 2
-        info2 = parent_info.get(stop2, {})
-
-        return {
-            "stop_depart_parent_id": stop1,
-            "stop_arrivee_parent_id": stop2,
-            "stop_depart_name": info1.get("stop_name", ""),
-            "stop_arrivee_name": info2.get("stop_name", ""),
-            "lat_depart_parent": info1.get("stop_lat", None),
-            "lon_depart_parent": info1.get("stop_lon", None),
-            "lat_arrivee_parent": info2.get("stop_lat", None),
-            "lon_arrivee_parent": info2.get("stop_lon", None),
-        }
-
-    # Appliquer l'enrichissement
-    infos_enrichies = troncons_uniques["stop_pair"].apply(enrichir_troncon)
-    df_enrichi = pd.DataFrame(infos_enrichies.tolist())
-
-    # Combiner avec l'index original
-    troncons_uniques = pd.concat([troncons_uniques, df_enrichi], axis=1)
-
-    # 10. Générer les identifiants et géométries
+    with etape("enrichissement", lignes_entree=len(troncons_uniques)) as mesure:
+        for extremite, colonne_id in [
+            ("depart", "stop_depart_parent_id"),
+            ("arrivee", "stop_arrivee_parent_id"),
+        ]:
+            infos = parent_info.reindex(troncons_uniques[colonne_id].to_numpy())
+            troncons_uniques[f"stop_{extremite}_name"] = (
+                infos["stop_name"].astype(object).fillna("").to_numpy()
+            )
+            troncons_uniques[f"lat_{extremite}_parent"] = infos["stop_lat"].to_numpy()
+            troncons_uniques[f"lon_{extremite}_parent"] = infos["stop_lon"].to_numpy()
+        mesure.lignes_sortie = len(troncons_uniques)
+
+    # 6. Générer les identifiants et géométries
     print("  → Génération des identifiants et géométries...")
 
-    # Identifiants uniques
-    route_type_prefix = (
-        "TRAM" if route_type == 0 else "BUS" if route_type == 3 else f"RT{route_type}"
-    )
+    # Identifiants uniques, numérotés par mode
+    numeros = troncons_uniques.groupby("route_type").cumcount().to_numpy()
     troncons_uniques["troncon_unique_id"] = [
-        f"TU_{route_type_prefix}_{i:06d}" for i in range(len(troncons_uniques))
+        f"TU_{prefixe_troncon(route_type)}_{i:06d}"
+        for route_type, i in zip(troncons_uniques["route_type"], numeros)
+    ]
+    troncons_uniques["mode"] = [
+        decrire_mode(route_type)["nom"] for route_type in troncons_uniques["route_type"]
     ]
 
-    # Géométries LineString
-    troncons_uniques["geometry"] = troncons_uniques.apply(
-        lambda row: (
-            LineString(
-                [
-                    (row["lon_depart_parent"], row["lat_depart_parent"]),
-                    (row["lon_arrivee_parent"], row["lat_arrivee_parent"]),
-                ]
+    with etape("geometrie", lignes_entree=len(troncons_uniques)) as mesure:
+        # Géométries LineString, construites en bloc
+        geometries = creer_lignes_entre_arrets(troncons_uniques)
+        troncons_uniques["geometry"] = geometries
+
+        # Géométries et distances découpées dans les tracés (shapes.txt)
+        # si possible, segments droits entre arrêts sinon
+        colonnes_distance = []
+        if a_des_traces(feed):
+            print("  → Découpage des tracés (shapes.txt)...")
+            geometries_traces, distances = decouper_troncons(
+                feed, index, troncons_uniques
             )
-            if all(
-                pd.notna(
-                    [
-                        row["lon_depart_parent"],
-                        row["lat_depart_parent"],
-                        row["lon_arrivee_parent"],
-                        row["lat_arrivee_parent"],
-                    ]
-                )
+            decoupes = pd.notna(geometries_traces)
+            geometries[decoupes] = geometries_traces[decoupes]
+            troncons_uniques["geometry"] = geometries
+            troncons_uniques["distance_km"] = np.where(
+                decoupes,
+                distances,
+                calculer_distance_haversine(
+                    troncons_uniques["lat_depart_parent"].to_numpy(dtype="float64"),
+                    troncons_uniques["lon_depart_parent"].to_numpy(dtype="float64"),
+                    troncons_uniques["lat_arrivee_parent"].to_numpy(dtype="float64"),
+                    troncons_uniques["lon_arrivee_parent"].to_numpy(dtype="float64"),
+                ),
             )
-            else None
-        ),
-        axis=1,
-    )
+            colonnes_distance = ["distance_km"]
+        mesure.lignes_sortie = pd.notna(geometries).sum()
 
-    # 11. Créer le GeoDataFrame
+    # 7. Créer le GeoDataFrame
     colonnes_finales = [
         "troncon_unique_id",
+        "route_type",
+        "mode",
         "stop_depart_parent_id",
         "stop_arrivee_parent_id",
         "stop_depart_name",
@@ -159,46 +221,40 @@ def creer_troncons_uniques(feed, route_type):
         "lon_depart_parent",
         "lat_arrivee_parent",
         "lon_arrivee_parent",
+        *colonnes_distance,
         "geometry",
     ]
 
-    gdf = gpd.GeoDataFrame(
+    return gpd.GeoDataFrame(
         troncons_uniques[colonnes_finales], geometry="geometry", crs="EPSG:4326"
     )
 
-    # Supprimer la colonne temporaire stop_pair
-    if "stop_pair" in gdf.columns:
-        gdf = gdf.drop(columns=["stop_pair"])
-
-    print(f"✓ {len(gdf)} tronçons uniques créés")
-
-    return gdf
-
 
 # =============================================================================
 # EXEMPLE D'UTILISATION
 # =============================================================================
 
 if __name__ == "__main__":
-    from utils import charger_gtfs, exporter_gdf_to_csv, exporter_geojson
+    from src.exports import exporter_geoparquet
+    from src.utils import charger_gtfs, exporter_gdf_to_csv
 
     # Charger le feed GTFS
     feed = charger_gtfs()
 
-    # Créer les tronçons uniques pour bus et tram
+    # Créer les tronçons uniques de tous les modes du réseau
     print("=" * 70)
     print("CRÉATION DES TRONÇONS UNIQUES")
     print("=" * 70)
 
-    # Bus (route_type = 3)
-    troncons_bus = creer_troncons_uniques(feed, route_type=3)
-    exporter_gdf_to_csv(troncons_bus, "output/troncons_uniques_bus.csv")
-    # exporter_geojson(troncons_bus, 'output/troncons_uniques_bus.geojson')
+    troncons = creer_troncons_uniques_multimodal(feed)
+
+    # Tronçons de référence de tous les modes, relus par charger_troncons
+    exporter_geoparquet(troncons, "output/troncons_uniques.parquet")
 
-    # Tram (route_type = 0)
-    troncons_tram = creer_troncons_uniques(feed, route_type=0)
-    exporter_gdf_to_csv(troncons_tram, "output/troncons_uniques_tram.csv")
-    # exporter_geojson(troncons_tram, 'output/troncons_uniques_tram2.geojson')
+    for route_type, troncons_mode in troncons.groupby("route_type"):
+        code_mode = decrire_mode(route_type)["code"]
+        troncons_mode = troncons_mode.drop(columns=["route_type", "mode"])
+        exporter_gdf_to_csv(troncons_mode, f"output/troncons_uniques_{code_mode}.csv")
 
     print("\n" + "=" * 70)
     print("✓ TRAITEMENT TERMINÉ")
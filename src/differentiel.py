@@ -0,0 +1,859 @@
+"""
+Recalcul différentiel des indicateurs entre deux versions d'un feed GTFS
+Les lignes, trips et parcours des deux versions sont comparés par empreinte
+de leur contenu (horaires, suite des arrêts, services, tracés). Seuls les arrêts et
+tronçons desservis par une ligne modifiée (dans l'une ou l'autre version)
+sont recalculés, sur le sous-ensemble des trips qui les desservent ; leurs
+lignes remplacent celles des indicateurs de la version précédente.
+
+La comparaison des lignes et des arrêts, les sous-feeds et les tronçons de
+référence à recalculer ne dépendent pas de la date : ils sont conservés sur
+le nouveau feed, et les dates suivantes ne recalculent que leurs indicateurs.
+La mise à jour paie toutefois la lecture de la version précédente et les
+empreintes des deux versions, alors que le calcul complet réutilise l'index
+des parcours pour toutes les dates. Durées d'une tâche de src.lot dans un
+processus, pour la première date puis les suivantes, contre calcul complet :
+    - TAM, 335 000 stop_times, 25 % d'entre eux à reparcourir : 1,7 s et
+      0,4 s, contre 0,6 s et 0,2 s ;
+    - réseau synthétique de 1,8 million de stop_times, 3 lignes sur 151
+      modifiées : 3,3 s et 0,56 s, contre 2,5 s et 0,66 s.
+Elle n'est donc intéressante que pour de nombreuses dates d'un grand réseau
+dont peu de lignes changent, ou quand la version précédente est déjà chargée
+(application) ; src.lot fait un calcul complet par défaut (--differentiel).
+
+Exemple :
+    difference = comparer_feeds(ancien, nouveau, "20251021")
+    arrets, troncons = mettre_a_jour_indicateurs(
+        ancien, nouveau, "20251021", arrets_precedents, troncons_precedents
+    )
+"""
+
+import copy
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from src.arrets import calculer_indicateurs_arrets
+from src.cache import conserver_sur_le_feed, lire_resultat_du_feed
+from src.create_troncons_uniques import (
+    creer_troncons_uniques_multimodal,
+    prefixe_troncon,
+)
+from src.indicateurs_troncons import (
+    calculer_frequentation_troncons_multimodal,
+    joindre_indicateurs_troncons,
+    normaliser_paires,
+)
+from src.instrumentation import etape
+from src.parcours import stations_parent
+from src.utils import (
+    ajouter_temps_en_secondes,
+    obtenir_service_ids_pour_date,
+)
+
+
+# Colonnes des arrêts reportées dans les indicateurs (un changement impose
+# de recalculer les arrêts et les tronçons concernés)
+COLONNES_ARRETS = ["stop_name", "stop_lat", "stop_lon", "parent_station"]
+
+# Colonnes de shapes.txt entrant dans l'empreinte d'un tracé
+COLONNES_TRACES = [
+    "shape_pt_lat",
+    "shape_pt_lon",
+    "shape_pt_sequence",
+    "shape_dist_traveled",
+]
+
+# Clés d'un tronçon dans les indicateurs multimodaux
+CLES_TRONCONS = ["route_type", "stop_pair_min", "stop_pair_max"]
+
+
+def _identifiants(valeurs):
+    """
+    Identifiants en chaînes (comparables d'une version à l'autre, quel que
+    soit le mode de chargement : catégories, chaînes ou entiers). Pour une
+    colonne catégorielle, seules les catégories sont converties.
+    """
+    if isinstance(getattr(valeurs, "dtype", None), pd.CategoricalDtype):
+        categories = pd.Categorical(valeurs)
+        libelles = np.asarray(categories.categories, dtype=object).astype(str)
+        # Code -1 (valeur manquante) : dernier libellé, comme str(nan)
+        return np.append(libelles, "nan")[categories.codes]
+    return np.asarray(valeurs, dtype=object).astype(str)
+
+
+def _empreintes_traces(feed):
+    """
+    Empreinte du contenu de chaque tracé (points, rangs et distances),
+    indexée par shape_id (vide sans shapes.txt)
+    """
+    shapes = getattr(feed, "shapes", None)
+    if not isinstance(shapes, pd.DataFrame) or shapes.empty:
+        return pd.Series(dtype="uint64")
+    colonnes = [colonne for colonne in COLONNES_TRACES if colonne in shapes.columns]
+    empreinte_point = pd.util.hash_pandas_object(
+        shapes[colonnes].astype("float64"), index=False
+    ).to_numpy()
+    codes_shape, shape_ids = pd.factorize(_identifiants(shapes["shape_id"]))
+    contenu = np.zeros(len(shape_ids), dtype="uint64")
+    np.add.at(contenu, codes_shape, empreinte_point)
+    return pd.Series(contenu, index=shape_ids)
+
+
+def empreintes_routes(feed):
+    """
+    Empreinte du contenu de chaque ligne du feed
+
+    L'empreinte d'un trip combine son service, son tracé (shape_id et contenu
+    du tracé) et ses stop_times (arrêt, rang, heures d'arrivée et de départ,
+    shape_dist_traveled) : géométries, distances et vitesses des tronçons en
+    dépendent. Celle d'une ligne combine les empreintes de ses trips. Ni les
+    identifiants des trips ni l'ordre des fichiers n'y entrent : une ligne
+    dont ni les horaires ni les tracés n'ont changé garde la même empreinte.
+    Les empreintes sont conservées sur le feed, et recalculées si l'une des
+    tables utilisées (stop_times, trips, routes, shapes) a été remplacée.
+
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        pd.DataFrame: route_id, route_type, nb_trips et empreinte (uint64)
+    """
+    tables = [
+        getattr(feed, table, None)
+        for table in ["stop_times", "trips", "routes", "shapes"]
+    ]
+    routes = lire_resultat_du_feed(feed, "_empreintes_routes", tables)
+    if routes is not None:
+        return routes
+
+    ajouter_temps_en_secondes(feed)
+
+    with etape("empreintes", lignes_entree=len(feed.stop_times)) as mesure:
+        # 1. Empreinte de chaque stop_time, sommée par trip (somme modulo 2^64 :
+        # le rang de l'arrêt fait partie de l'empreinte, l'ordre des lignes non)
+        stop_times = feed.stop_times
+        colonnes = ["stop_id", "stop_sequence", "arrival_s", "departure_s"]
+        if "shape_dist_traveled" in stop_times.columns:
+            colonnes.append("shape_dist_traveled")
+        empreinte_ligne = pd.util.hash_pandas_object(
+            stop_times[colonnes], index=False
+        ).to_numpy()
+        codes_trip, trip_ids = pd.factorize(stop_times["trip_id"])
+        connu = codes_trip >= 0
+        contenu = np.zeros(len(trip_ids), dtype="uint64")
+        np.add.at(contenu, codes_trip[connu], empreinte_ligne[connu])
+
+        # 2. Empreinte de chaque trip : contenu, service et tracé
+        trips = feed.trips
+        position = pd.Index(_identifiants(trip_ids)).get_indexer(
+            _identifiants(trips["trip_id"])
+        )
+        contenu_trip = np.where(position >= 0, contenu[position], 0).astype("uint64")
+        if "shape_id" in trips.columns:
+            shape_ids = _identifiants(trips["shape_id"])
+        else:
+            shape_ids = np.full(len(trips), "", dtype=object)
+        traces = _empreintes_traces(feed)
+        position_trace = traces.index.get_indexer(shape_ids)
+        empreinte_trace = np.zeros(len(trips), dtype="uint64")
+        avec_trace = position_trace >= 0
+        empreinte_trace[avec_trace] = traces.to_numpy()[position_trace[avec_trace]]
+        empreinte_trip = pd.util.hash_pandas_object(
+            pd.DataFrame(
+                {
+                    "contenu": contenu_trip,
+                    "service_id": _identifiants(trips["service_id"]),
+                    "shape_id": shape_ids,
+                    "trace": empreinte_trace,
+                }
+            ),
+            index=False,
+        ).to_numpy()
+
+        # 3. Empreinte de chaque ligne : somme des empreintes de ses trips
+        codes_route, route_ids = pd.factorize(_identifiants(trips["route_id"]))
+        empreinte = np.zeros(len(route_ids), dtype="uint64")
+        np.add.at(empreinte, codes_route, empreinte_trip)
+
+        routes = pd.DataFrame(
+            {
+                "route_id": _identifiants(feed.routes["route_id"]),
+                "route_type": feed.routes["route_type"].to_numpy(dtype="int64"),
+            }
+        )
+        routes = routes.merge(
+            pd.DataFrame(
+                {
+                    "route_id": route_ids,
+                    "nb_trips": np.bincount(codes_route, minlength=len(route_ids)),
+                    "empreinte": empreinte,
+                }
+            ),
+            on="route_id",
+            how="left",
+        )
+        routes["nb_trips"] = routes["nb_trips"].fillna(0).astype("int64")
+        routes["empreinte"] = routes["empreinte"].fillna(0).astype("uint64")
+        mesure.lignes_sortie = len(routes)
+
+    return conserver_sur_le_feed(feed, "_empreintes_routes", tables, routes)
+
+
+def empreintes_arrets(feed):
+    """
+    Empreinte des attributs de chaque arrêt repris dans les indicateurs
+    (nom, coordonnées, station parent)
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        pd.Series: Empreinte (uint64) indexée par stop_id
+    """
+    colonnes = [c for c in COLONNES_ARRETS if c in feed.stops.columns]
+    attributs = feed.stops[colonnes].astype(object)
+    attributs = attributs.where(attributs.notna(), None)
+    empreinte = pd.util.hash_pandas_object(attributs, index=False).to_numpy()
+    return pd.Series(empreinte, index=_identifiants(feed.stops["stop_id"]))
+
+
+class DifferenceFeeds:
+    """
+    Différences entre deux versions d'un feed, pour une date d'analyse
+
+    Attributes:
+        date (str): Date analysée, au format 'YYYYMMDD'
+        routes_ajoutees, routes_supprimees, routes_modifiees (list[str]):
+            Lignes présentes dans une seule version, ou dont l'empreinte
+            (trips, horaires, services, route_type) a changé
+        services_modifies (list[str]): Services actifs à la date dans une
+            seule des deux versions (calendrier modifié)
+        arrets_modifies (list[str]): Arrêts ajoutés, supprimés ou dont le
+            nom, les coordonnées ou la station parent ont changé (et arrêts
+            rattachés à une station parent modifiée)
+        routes_affectees (list[str]): Lignes à recalculer : lignes ajoutées,
+            supprimées ou modifiées, et lignes dont un trip dessert un arrêt
+            modifié ou dépend d'un service modifié
+    """
+
+    def __init__(
+        self,
+        date,
+        routes_ajoutees,
+        routes_supprimees,
+        routes_modifiees,
+        services_modifies,
+        arrets_modifies,
+        routes_affectees,
+    ):
+        self.date = date
+        self.routes_ajoutees = routes_ajoutees
+        self.routes_supprimees = routes_supprimees
+        self.routes_modifiees = routes_modifiees
+        self.services_modifies = services_modifies
+        self.arrets_modifies = arrets_modifies
+        self.routes_affectees = routes_affectees
+
+    def __bool__(self):
+        """Vrai si au moins une ligne est à recalculer"""
+        return bool(self.routes_affectees or self.arrets_modifies)
+
+    def resume(self):
+        """
+        Nombre d'éléments de chaque catégorie de différences
+        """
+        return {
+            "routes_ajoutees": len(self.routes_ajoutees),
+            "routes_supprimees": len(self.routes_supprimees),
+            "routes_modifiees": len(self.routes_modifiees),
+            "services_modifies": len(self.services_modifies),
+            "arrets_modifies": len(self.arrets_modifies),
+            "routes_affectees": len(self.routes_affectees),
+        }
+
+
+def _routes_desservant(feed, stop_ids, service_ids):
+    """
+    Lignes dont un trip dessert l'un des arrêts ou dépend de l'un des services
+    """
+    trips = feed.trips
+    concernes = pd.Index(_identifiants(trips["service_id"])).isin(service_ids)
+    if stop_ids:
+        stop_times = feed.stop_times
+        desservants = stop_times.loc[stop_times["stop_id"].isin(stop_ids), "trip_id"]
+        concernes |= pd.Index(_identifiants(trips["trip_id"])).isin(
+            np.unique(_identifiants(desservants))
+        )
+    return set(_identifiants(trips.loc[concernes, "route_id"]))
+
+
+def _tables_comparees(ancien, nouveau):
+    """
+    Tables des deux versions dont dépendent les résultats conservés sur le
+    nouveau feed (comparaison des lignes et arrêts, périmètre à recalculer)
+    """
+    return [
+        getattr(feed, table, None)
+        for feed in (ancien, nouveau)
+        for table in ["stops", "stop_times", "trips", "routes", "shapes"]
+    ]
+
+
+def _comparer_structures(ancien, nouveau):
+    """
+    Partie de la comparaison qui ne dépend pas de la date : lignes ajoutées,
+    supprimées ou modifiées, arrêts modifiés et lignes qui les desservent.
+    Calculée une fois par couple de versions et conservée sur le nouveau feed
+    (les dates suivantes d'un même lot la réutilisent).
+    """
+    tables = _tables_comparees(ancien, nouveau)
+    resultat = lire_resultat_du_feed(nouveau, "_comparaison_structures", tables)
+    if resultat is not None:
+        return resultat
+
+    # 1. Lignes : présence et empreinte de leur contenu
+    routes = empreintes_routes(ancien).merge(
+        empreintes_routes(nouveau),
+        on="route_id",
+        how="outer",
+        suffixes=("_ancien", "_nouveau"),
+        indicator=True,
+    )
+    presentes = routes["_merge"] == "both"
+    modifiees = presentes & (
+        (routes["empreinte_ancien"] != routes["empreinte_nouveau"])
+        | (routes["route_type_ancien"] != routes["route_type_nouveau"])
+        | (routes["nb_trips_ancien"] != routes["nb_trips_nouveau"])
+    )
+
+    # 2. Arrêts ajoutés, supprimés ou modifiés, et arrêts de leurs stations
+    arrets = pd.concat(
+        [empreintes_arrets(ancien), empreintes_arrets(nouveau)],
+        axis=1,
+        keys=["ancien", "nouveau"],
+    )
+    modifies = set(
+        arrets.index[
+            arrets["ancien"].isna()
+            | arrets["nouveau"].isna()
+            | (arrets["ancien"] != arrets["nouveau"])
+        ]
+    )
+    for feed in (ancien, nouveau):
+        parents = stations_parent(feed.stops)
+        rattaches = pd.Index(_identifiants(parents)).isin(list(modifies))
+        modifies |= set(_identifiants(parents.index[rattaches]))
+    arrets_modifies = sorted(modifies)
+
+    # 3. Lignes qui desservent un arrêt modifié, dans l'une ou l'autre version
+    desservant = set()
+    if arrets_modifies:
+        for feed in (ancien, nouveau):
+            desservant |= _routes_desservant(feed, arrets_modifies, [])
+
+    resultat = (routes, presentes, modifiees, arrets_modifies, desservant)
+    return conserver_sur_le_feed(nouveau, "_comparaison_structures", tables, resultat)
+
+
+def comparer_feeds(ancien, nouveau, date_str):
+    """
+    Compare deux versions d'un feed pour une date d'analyse
+
+    Parameters:
+    -----------
+    ancien : gtfs_kit Feed object
+        Version précédente du feed
+    nouveau : gtfs_kit Feed object
+        Nouvelle version, chargée dans le même mode (complet ou compact)
+    date_str : str
+        Date analysée, au format 'YYYYMMDD'
+
+    Returns:
+    --------
+    DifferenceFeeds
+    """
+    print(f"\nComparaison des deux versions du feed pour le {date_str}...")
+
+    # 1. Lignes et arrêts (indépendants de la date, conservés sur le feed)
+    routes, presentes, modifiees, arrets_modifies, desservant_arrets = (
+        _comparer_structures(ancien, nouveau)
+    )
+
+    # 2. Services actifs à la date dans une seule version
+    services_modifies = sorted(
+        set(_identifiants(obtenir_service_ids_pour_date(ancien, date_str)))
+        ^ set(_identifiants(obtenir_service_ids_pour_date(nouveau, date_str)))
+    )
+
+    # 3. Lignes à recalculer
+    affectees = set(routes.loc[~presentes | modifiees, "route_id"]) | desservant_arrets
+    if services_modifies:
+        for feed in (ancien, nouveau):
+            affectees |= _routes_desservant(feed, [], services_modifies)
+
+    difference = DifferenceFeeds(
+        date=date_str,
+        routes_ajoutees=sorted(
+            routes.loc[routes["_merge"] == "right_only", "route_id"]
+        ),
+        routes_supprimees=sorted(
+            routes.loc[routes["_merge"] == "left_only", "route_id"]
+        ),
+        routes_modifiees=sorted(routes.loc[modifiees, "route_id"]),
+        services_modifies=services_modifies,
+        arrets_modifies=arrets_modifies,
+        routes_affectees=sorted(affectees),
+    )
+
+    resume = difference.resume()
+    print(
+        f"✓ {resume['routes_ajoutees']} ligne(s) ajoutée(s), "
+        f"{resume['routes_supprimees']} supprimée(s), "
+        f"{resume['routes_modifiees']} modifiée(s), "
+        f"{resume['services_modifies']} service(s) et "
+        f"{resume['arrets_modifies']} arrêt(s) modifié(s)"
+    )
+    print(f"✓ {resume['routes_affectees']} ligne(s) à recalculer sur {len(routes)}")
+
+    return difference
+
+
+def elements_desservis(feed, route_ids):
+    """
+    Arrêts et tronçons desservis par les trips de certaines lignes
+    (tous services confondus)
+    Args:
+        feed: gtfs_kit Feed object
+        route_ids (list[str]): Lignes concernées
+    Returns:
+        tuple (set[str], pd.DataFrame): stop_id des arrêts desservis, et
+        tronçons (route_type, stop_pair_min, stop_pair_max) de ces lignes,
+        entre stations parent et tous sens confondus
+    """
+    trips = feed.trips[["trip_id", "route_id"]].merge(
+        feed.routes[["route_id", "route_type"]], on="route_id"
+    )
+    trips = trips[pd.Index(_identifiants(trips["route_id"])).isin(route_ids)]
+    stop_times = feed.stop_times[["trip_id", "stop_id", "stop_sequence"]]
+    stop_times = stop_times[stop_times["trip_id"].isin(trips["trip_id"])]
+    stop_times = stop_times.sort_values(["trip_id", "stop_sequence"], kind="stable")
+
+    stop_ids = _identifiants(stop_times["stop_id"])
+    trip_ids = _identifiants(stop_times["trip_id"])
+    parents = pd.Series(_identifiants(stations_parent(feed.stops))).set_axis(
+        _identifiants(feed.stops["stop_id"])
+    )
+    parent = parents.reindex(stop_ids).to_numpy()
+    route_type = (
+        pd.Series(trips["route_type"].to_numpy(dtype="int64"))
+        .set_axis(_identifiants(trips["trip_id"]))
+        .reindex(trip_ids)
+        .to_numpy()
+    )
+
+    # Paires de stations parent consécutives d'un même trip
+    suivant = np.flatnonzero(trip_ids[1:] == trip_ids[:-1])
+    depart, arrivee = parent[suivant], parent[suivant + 1]
+    connues = pd.notna(depart) & pd.notna(arrivee)
+    stop_pair_min, stop_pair_max = normaliser_paires(
+        depart[connues], arrivee[connues]
+    )
+    troncons = pd.DataFrame(
+        {
+            "route_type": route_type[suivant][connues].astype("int64"),
+            "stop_pair_min": stop_pair_min,
+            "stop_pair_max": stop_pair_max,
+        }
+    ).drop_duplicates(ignore_index=True)
+
+    return set(stop_ids), troncons
+
+
+def trips_parcourant(feed, troncons):
+    """
+    Trips dont deux arrêts consécutifs forment l'un des tronçons donnés
+    (tous services confondus). Seuls les trips qui desservent une extrémité
+    de ces tronçons sont triés ; les identifiants sont codés en entiers.
+    Args:
+        feed: gtfs_kit Feed object
+        troncons (pd.DataFrame): route_type, stop_pair_min, stop_pair_max
+    Returns:
+        np.ndarray: Identifiants des trips
+    """
+    stop_times = feed.stop_times
+    codes_trip, trip_ids = pd.factorize(stop_times["trip_id"])
+    codes_stop, stop_ids = pd.factorize(stop_times["stop_id"])
+
+    # Code de la station parent de chaque stop_time (-1 si inconnue)
+    parents = stations_parent(feed.stops)
+    parent_stop = pd.Series(_identifiants(parents), index=_identifiants(parents.index))
+    codes_parent_stop, parent_ids = pd.factorize(
+        parent_stop.reindex(_identifiants(stop_ids)), sort=True
+    )
+    codes_parent = np.where(codes_stop >= 0, codes_parent_stop[codes_stop], -1)
+
+    # Trips candidats : ceux qui desservent une extrémité d'un tronçon
+    extremites = pd.Index(parent_ids).isin(
+        list(set(troncons["stop_pair_min"]) | set(troncons["stop_pair_max"]))
+    )
+    candidat = np.zeros(len(trip_ids) + 1, dtype=bool)
+    candidat[codes_trip[(codes_parent >= 0) & extremites[codes_parent]]] = True
+    lignes = np.flatnonzero(candidat[codes_trip] & (codes_trip >= 0))
+
+    # Paires consécutives des trips candidats, dans l'ordre de stop_sequence
+    sequence = stop_times["stop_sequence"].to_numpy(dtype="int64")[lignes]
+    lignes = lignes[np.lexsort((sequence, codes_trip[lignes]))]
+    trip, parent = codes_trip[lignes], codes_parent[lignes]
+    suivant = np.flatnonzero(
+        (trip[1:] == trip[:-1]) & (parent[:-1] >= 0) & (parent[1:] >= 0)
+    )
+    code_min = np.minimum(parent[suivant], parent[suivant + 1])
+    code_max = np.maximum(parent[suivant], parent[suivant + 1])
+
+    route_types = feed.trips[["trip_id", "route_id"]].merge(
+        feed.routes[["route_id", "route_type"]], on="route_id"
+    )
+    route_type_trip = (
+        pd.Series(route_types["route_type"].to_numpy(dtype="int64"))
+        .set_axis(_identifiants(route_types["trip_id"]))
+        .reindex(_identifiants(trip_ids))
+        .fillna(-1)
+        .to_numpy(dtype="int64")
+    )
+
+    # Tronçons codés (route_type, code_min, code_max) en un entier
+    nb_parents = max(len(parent_ids), 1)
+    cles = (
+        route_type_trip[trip[suivant]] * nb_parents + code_min
+    ) * nb_parents + code_max
+    code_min_cherche = pd.Index(parent_ids).get_indexer(troncons["stop_pair_min"])
+    code_max_cherche = pd.Index(parent_ids).get_indexer(troncons["stop_pair_max"])
+    connu = (code_min_cherche >= 0) & (code_max_cherche >= 0)
+    cles_cherchees = (
+        troncons["route_type"].to_numpy(dtype="int64")[connu] * nb_parents
+        + code_min_cherche[connu]
+    ) * nb_parents + code_max_cherche[connu]
+
+    parcourant = np.unique(trip[suivant][np.isin(cles, cles_cherchees)])
+    return np.asarray(trip_ids, dtype=object)[parcourant]
+
+
+def extraire_sous_feed(feed, trip_ids, stop_ids=None):
+    """
+    Sous-feed limité à certains trips (et éventuellement à leurs passages
+    à certains arrêts) : les autres tables sont partagées avec le feed
+    d'origine, sans copie
+    Args:
+        feed: gtfs_kit Feed object
+        trip_ids (list[str]): Trips conservés
+        stop_ids (list[str]): Arrêts conservés, None pour tous
+    Returns:
+        feed: gtfs_kit Feed object
+    """
+    stop_times = feed.stop_times
+    conserves = stop_times["trip_id"].isin(trip_ids)
+    if stop_ids is not None:
+        conserves &= stop_times["stop_id"].isin(stop_ids)
+    sous_feed = copy.copy(feed)
+    sous_feed.trips = feed.trips[feed.trips["trip_id"].isin(trip_ids)]
+    sous_feed.stop_times = stop_times[conserves]
+    return sous_feed
+
+
+def _cles_troncons(troncons):
+    """
+    Clés (route_type, paire normalisée) des tronçons d'une table d'indicateurs
+    """
+    stop_pair_min, stop_pair_max = normaliser_paires(
+        _identifiants(troncons["stop_depart_parent_id"]),
+        _identifiants(troncons["stop_arrivee_parent_id"]),
+    )
+    return pd.MultiIndex.from_arrays(
+        [troncons["route_type"].to_numpy(dtype="int64"), stop_pair_min, stop_pair_max],
+        names=CLES_TRONCONS,
+    )
+
+
+def _numeroter_troncons(troncons, precedents):
+    """
+    Reprend l'identifiant des tronçons déjà présents dans les indicateurs
+    précédents ; les nouveaux tronçons sont numérotés à la suite, par mode
+    """
+    identifiants = pd.Series(
+        np.asarray(precedents["troncon_unique_id"], dtype=object),
+        index=_cles_troncons(precedents),
+    )
+    identifiants = identifiants[~identifiants.index.duplicated()]
+    repris = identifiants.reindex(_cles_troncons(troncons)).to_numpy()
+
+    numeros = (
+        pd.Series(identifiants.to_numpy(), dtype=object)
+        .str.rsplit("_", n=1)
+        .str[-1]
+        .astype("int64")
+    )
+    dernier = numeros.groupby(
+        identifiants.index.get_level_values("route_type").to_numpy()
+    ).max()
+
+    nouveaux = pd.isna(repris)
+    route_types = troncons["route_type"].to_numpy(dtype="int64")[nouveaux]
+    rang = pd.Series(route_types).groupby(route_types).cumcount().to_numpy()
+    repris[nouveaux] = [
+        f"TU_{prefixe_troncon(route_type)}_{dernier.get(route_type, -1) + 1 + i:06d}"
+        for route_type, i in zip(route_types, rang)
+    ]
+    troncons = troncons.copy()
+    troncons["troncon_unique_id"] = repris
+    return troncons
+
+
+def _recalculer_troncons(sous_feed, reference, service_ids, precedents):
+    """
+    Indicateurs des tronçons affectés (reference, voir _perimetre_recalcul),
+    calculés sur le sous-feed
+    """
+    reference = _numeroter_troncons(reference, precedents)
+    if reference.empty:
+        return reference
+
+    indicateurs = calculer_frequentation_troncons_multimodal(
+        sous_feed, reference, service_ids
+    )
+    if indicateurs is None:
+        # Aucun passage ce jour-là sur les tronçons affectés
+        sans_passage = pd.DataFrame(
+            {
+                "route_type": pd.Series(dtype="int64"),
+                "stop_pair_min": pd.Series(dtype=object),
+                "stop_pair_max": pd.Series(dtype=object),
+                "nombre_passages": pd.Series(dtype="int64"),
+                "duree_moyenne_secondes": pd.Series(dtype="float64"),
+                "duree_min_secondes": pd.Series(dtype="float64"),
+                "duree_max_secondes": pd.Series(dtype="float64"),
+                "duree_p10_secondes": pd.Series(dtype="float64"),
+                "duree_p50_secondes": pd.Series(dtype="float64"),
+                "duree_p90_secondes": pd.Series(dtype="float64"),
+            }
+        )
+        indicateurs = joindre_indicateurs_troncons(reference, sans_passage)
+    return indicateurs
+
+
+def _perimetre_recalcul(ancien, nouveau, difference):
+    """
+    Arrêts et tronçons affectés par les différences, sous-feeds qui les
+    desservent et tronçons de référence à recalculer. Rien n'y dépend de la
+    date : le périmètre est conservé sur le nouveau feed et réutilisé tant
+    que les lignes affectées et les arrêts modifiés sont les mêmes (avec
+    l'index des parcours de chaque sous-feed).
+    """
+    tables = _tables_comparees(ancien, nouveau)
+    cle = (tuple(difference.routes_affectees), tuple(difference.arrets_modifies))
+    perimetre = lire_resultat_du_feed(nouveau, "_perimetre_recalcul", tables, cle)
+    if perimetre is not None:
+        return perimetre
+
+    # 1. Arrêts et tronçons affectés, dans l'une ou l'autre version
+    arrets_ancien, troncons_ancien = elements_desservis(
+        ancien, difference.routes_affectees
+    )
+    arrets_nouveau, troncons_nouveau = elements_desservis(
+        nouveau, difference.routes_affectees
+    )
+    arrets_affectes = sorted(
+        arrets_ancien | arrets_nouveau | set(difference.arrets_modifies)
+    )
+    troncons_affectes = pd.concat(
+        [troncons_ancien, troncons_nouveau], ignore_index=True
+    ).drop_duplicates(ignore_index=True)
+
+    # 2. Sous-feeds : passages aux arrêts affectés (toutes lignes confondues),
+    # et trips complets qui parcourent un tronçon affecté
+    stop_times = nouveau.stop_times
+    desservants = stop_times.loc[stop_times["stop_id"].isin(arrets_affectes), "trip_id"]
+    sous_feed_arrets = extraire_sous_feed(
+        nouveau, desservants.unique(), stop_ids=arrets_affectes
+    )
+    sous_feed_troncons = extraire_sous_feed(
+        nouveau, trips_parcourant(nouveau, troncons_affectes)
+    )
+
+    # 3. Tronçons de référence du sous-feed qui font partie des affectés
+    reference = None
+    if len(sous_feed_troncons.trips):
+        reference = creer_troncons_uniques_multimodal(
+            sous_feed_troncons,
+            route_types=sorted(
+                int(rt) for rt in troncons_affectes["route_type"].unique()
+            ),
+        )
+        reference = reference[
+            _cles_troncons(reference).isin(
+                pd.MultiIndex.from_frame(troncons_affectes[CLES_TRONCONS])
+            )
+        ]
+
+    perimetre = {
+        "arrets_affectes": arrets_affectes,
+        "troncons_affectes": troncons_affectes,
+        "sous_feed_arrets": sous_feed_arrets,
+        "sous_feed_troncons": sous_feed_troncons,
+        "reference": reference,
+    }
+    return conserver_sur_le_feed(
+        nouveau, "_perimetre_recalcul", tables, perimetre, cle
+    )
+
+
+def _remplacer_lignes(precedents, recalcules, a_remplacer, tri, ascendant):
+    """
+    Remplace les lignes à recalculer des indicateurs précédents par les
+    lignes recalculées, puis trie le résultat comme un calcul complet
+    """
+    colonnes = list(precedents.columns)
+    if isinstance(precedents, gpd.GeoDataFrame) and "geometry" not in recalcules:
+        recalcules = gpd.GeoDataFrame(
+            recalcules,
+            geometry=gpd.points_from_xy(recalcules["stop_lon"], recalcules["stop_lat"]),
+            crs=precedents.crs,
+        )
+    conserves = precedents[~a_remplacer]
+    if not recalcules.empty:
+        recalcules = recalcules.reindex(columns=colonnes)
+        resultat = pd.concat([conserves, recalcules], ignore_index=True)
+    else:
+        resultat = conserves
+    return resultat.sort_values(tri, ascending=ascendant, kind="stable").reset_index(
+        drop=True
+    )
+
+
+def mettre_a_jour_indicateurs(
+    ancien,
+    nouveau,
+    date_str,
+    indicateurs_arrets,
+    indicateurs_troncons,
+    difference=None,
+):
+    """
+    Met à jour les indicateurs d'une date calculés sur la version précédente
+    d'un feed, en ne recalculant que les arrêts et tronçons affectés par les
+    différences entre les deux versions
+
+    Un arrêt est affecté s'il est desservi par une ligne à recalculer (voir
+    DifferenceFeeds) dans l'une des versions, ou si ses attributs ont changé ;
+    un tronçon, s'il est parcouru par une ligne à recalculer. Leurs
+    indicateurs sont recalculés avec les fonctions habituelles, sur les seuls
+    trips qui desservent ces arrêts (toutes lignes confondues) : ils sont
+    identiques à ceux d'un calcul complet. Les tronçons déjà connus gardent
+    leur identifiant, les nouveaux sont numérotés à la suite.
+
+    Parameters:
+    -----------
+    ancien : gtfs_kit Feed object
+        Version précédente du feed
+    nouveau : gtfs_kit Feed object
+        Nouvelle version, chargée dans le même mode (complet ou compact)
+    date_str : str
+        Date analysée, au format 'YYYYMMDD'
+    indicateurs_arrets : DataFrame
+        Indicateurs par arrêt de la version précédente
+        (voir calculer_indicateurs_arrets)
+    indicateurs_troncons : DataFrame
+        Indicateurs multimodaux par tronçon de la version précédente
+        (voir compute_indicateurs_troncons_multimodal)
+    difference : DifferenceFeeds
+        Différences entre les versions (défaut : comparer_feeds)
+
+    Returns:
+    --------
+    Tuple (indicateurs_arrets, indicateurs_troncons) de la nouvelle version
+    """
+    if difference is None:
+        difference = comparer_feeds(ancien, nouveau, date_str)
+    if not difference:
+        print("✓ Aucune différence : indicateurs précédents conservés")
+        return indicateurs_arrets, indicateurs_troncons
+
+    # 1. Arrêts et tronçons affectés, et sous-feeds qui les desservent
+    perimetre = _perimetre_recalcul(ancien, nouveau, difference)
+    arrets_affectes = perimetre["arrets_affectes"]
+    troncons_affectes = perimetre["troncons_affectes"]
+    sous_feed_arrets = perimetre["sous_feed_arrets"]
+    sous_feed_troncons = perimetre["sous_feed_troncons"]
+    print(
+        f"✓ {len(arrets_affectes)} arrêt(s) et {len(troncons_affectes)} tronçon(s) "
+        f"à recalculer, sur {len(sous_feed_arrets.stop_times)} et "
+        f"{len(sous_feed_troncons.stop_times)} stop_times "
+        f"(sur {len(nouveau.stop_times)})"
+    )
+
+    # 2. Recalcul des indicateurs affectés, avec les services du nouveau feed
+    service_ids = obtenir_service_ids_pour_date(nouveau, date_str)
+    arrets = None
+    if len(sous_feed_arrets.trips):
+        arrets = calculer_indicateurs_arrets(sous_feed_arrets, service_ids, date_str)
+    if arrets is None:
+        arrets = indicateurs_arrets.iloc[:0]
+    arrets = arrets[pd.Index(_identifiants(arrets["stop_id"])).isin(arrets_affectes)]
+
+    troncons = indicateurs_troncons.iloc[:0]
+    if perimetre["reference"] is not None:
+        troncons = _recalculer_troncons(
+            sous_feed_troncons,
+            perimetre["reference"],
+            service_ids,
+            indicateurs_troncons,
+        )
+
+    # 3. Remplacement des lignes affectées dans les indicateurs précédents
+    arrets = _remplacer_lignes(
+        indicateurs_arrets,
+        arrets,
+        pd.Index(_identifiants(indicateurs_arrets["stop_id"])).isin(arrets_affectes),
+        tri="nombre_passages",
+        ascendant=False,
+    )
+    troncons = _remplacer_lignes(
+        indicateurs_troncons,
+        troncons,
+        _cles_troncons(indicateurs_troncons).isin(
+            pd.MultiIndex.from_frame(troncons_affectes[CLES_TRONCONS])
+        ),
+        tri=["route_type", "nombre_passages"],
+        ascendant=[True, False],
+    )
+
+    print(
+        f"✓ Indicateurs mis à jour : {len(arrets)} arrêts, "
+        f"{len(troncons)} tronçons"
+    )
+
+    return arrets, troncons
+
+
+# =============================================================================
+# EXEMPLE D'UTILISATION
+# =============================================================================
+
+if __name__ == "__main__":
+    import sys
+
+    from src.indicateurs_troncons import compute_indicateurs_troncons_multimodal
+    from src.utils import charger_gtfs
+
+    # Deux versions d'un même réseau, ex: publication de la semaine précédente
+    zip_ancien, zip_nouveau = sys.argv[1:3]
+    date_calcul = sys.argv[3] if len(sys.argv) > 3 else "20251021"
+
+    ancien = charger_gtfs(zip_ancien, compact=True)
+    nouveau = charger_gtfs(zip_nouveau, compact=True)
+
+    service_ids = obtenir_service_ids_pour_date(ancien, date_calcul)
+    arrets_precedents = calculer_indicateurs_arrets(ancien, service_ids, date_calcul)
+    troncons_precedents = compute_indicateurs_troncons_multimodal(ancien, service_ids)
+
+    arrets, troncons = mettre_a_jour_indicateurs(
+        ancien, nouveau, date_calcul, arrets_precedents, troncons_precedents
+    )
@@ -0,0 +1,219 @@
+"""
+Exécution parallèle des calculs d'indicateurs
+Répartit des tâches (zip GTFS, date, route_type) sur un pool de processus.
+
+Le feed n'est jamais transmis aux processus : chaque processus relit sa
+propre copie depuis le cache Parquet (voir src.cache) et la conserve pour
+les tâches suivantes portant sur le même zip. Le feed n'est donc pas
+sérialisé, mais il occupe la mémoire une fois par processus. Seuls le
+chemin du zip, la date et le route_type transitent, ainsi que les résultats.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.arrets import calculer_indicateurs_arrets
+from src.create_troncons_uniques import creer_troncons_uniques
+from src.indicateurs_troncons import calculer_frequentation_troncons
+from src.utils import (
+    charger_gtfs,
+    lister_route_types,
+    obtenir_service_ids_pour_date,
+)
+
+
+# Nombre maximal de feeds conservés en mémoire par processus
+NB_FEEDS_PAR_PROCESSUS = 2
+
+# Feeds et tronçons de référence déjà chargés dans le processus courant
+_feeds = {}
+_troncons_uniques = {}
+
+
+def obtenir_feed_du_processus(zip_path, compact):
+    """
+    Retourne le feed d'un zip, chargé une seule fois par processus
+    (depuis le cache disque si possible)
+    """
+    cle = (zip_path, compact)
+    if cle not in _feeds:
+        if len(_feeds) >= NB_FEEDS_PAR_PROCESSUS:
+            # Libérer le feed le plus ancien et ses tronçons
+            cle_ancienne = next(iter(_feeds))
+            del _feeds[cle_ancienne]
+            for cle_troncons in [c for c in _troncons_uniques if c[0] == cle_ancienne]:
+                del _troncons_uniques[cle_troncons]
+        _feeds[cle] = charger_gtfs(zip_path, compact=compact)
+    return _feeds[cle]
+
+
+def _obtenir_troncons_uniques(zip_path, compact, route_type):
+    """
+    Retourne les tronçons uniques d'un mode, calculés une seule fois par processus
+    """
+    cle = ((zip_path, compact), route_type)
+    if cle not in _troncons_uniques:
+        feed = obtenir_feed_du_processus(zip_path, compact)
+        _troncons_uniques[cle] = creer_troncons_uniques(feed, route_type)
+    return _troncons_uniques[cle]
+
+
+def executer_tache(tache, compact=True):
+    """
+    Calcule les indicateurs d'une tâche
+
+    Parameters:
+    -----------
+    tache : tuple (zip_path, date_str, route_type)
+        route_type à None pour les indicateurs par arrêt,
+        sinon indicateurs par tronçon du mode correspondant
+    compact : bool
+        Chargement compact du feed (voir charger_gtfs)
+
+    Returns:
+    --------
+    DataFrame des indicateurs (ou None si aucun service actif)
+    """
+    zip_path, date_str, route_type = tache
+    feed = obtenir_feed_du_processus(zip_path, compact)
+    service_ids = obtenir_service_ids_pour_date(feed, date_str)
+
+    if route_type is None:
+        return calculer_indicateurs_arrets(feed, service_ids, date_str)
+
+    troncons_uniques = _obtenir_troncons_uniques(zip_path, compact, route_type)
+    if troncons_uniques.empty or not service_ids:
+        return None
+    return calculer_frequentation_troncons(
+        feed, troncons_uniques, service_ids, route_type
+    )
+
+
+def _executer_tache_compacte(tache):
+    return executer_tache(tache, compact=True)
+
+
+def _executer_tache_complete(tache):
+    return executer_tache(tache, compact=False)
+
+
+def executer_taches(taches, nb_processus=None, compact=True):
+    """
+    Exécute des tâches de calcul d'indicateurs sur un pool de processus
+
+    Parameters:
+    -----------
+    taches : list[tuple]
+        Tâches (zip_path, date_str, route_type), route_type à None
+        pour les indicateurs par arrêt
+    nb_processus : int
+        Nombre de processus (défaut : nombre de cœurs). 1 = exécution
+        séquentielle dans le processus courant
+    compact : bool
+        Chargement compact des feeds (voir charger_gtfs)
+
+    Returns:
+    --------
+    dict {tache: DataFrame}, dans l'ordre des tâches fournies
+    """
+    taches = [tuple(tache) for tache in taches]
+    nb_processus = nb_processus or os.cpu_count() or 1
+
+    # Remplir le cache disque une fois, avant de lancer les processus
+    for zip_path in dict.fromkeys(tache[0] for tache in taches):
+        obtenir_feed_du_processus(zip_path, compact)
+
+    fonction = _executer_tache_compacte if compact else _executer_tache_complete
+
+    if nb_processus == 1:
+        resultats = [fonction(tache) for tache in taches]
+    else:
+        # Tâches regroupées par zip pour qu'un processus réutilise le feed chargé
+        ordre = sorted(range(len(taches)), key=lambda i: str(taches[i][0]))
+        taille_lot = max(1, len(taches) // (nb_processus * 4))
+        with ProcessPoolExecutor(
+            max_workers=nb_processus,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executeur:
+            resultats_tries = list(
+                executeur.map(
+                    fonction, [taches[i] for i in ordre], chunksize=taille_lot
+                )
+            )
+        resultats = [None] * len(taches)
+        for position, i in enumerate(ordre):
+            resultats[i] = resultats_tries[position]
+
+    print(f"✓ {len(taches)} tâche(s) exécutée(s) sur {nb_processus} processus")
+
+    return dict(zip(taches, resultats))
+
+
+def creer_taches(zip_paths, dates, route_types=None, arrets=True, compact=True):
+    """
+    Crée les tâches pour un lot de zips GTFS, de dates et de modes
+
+    Parameters:
+    -----------
+    zip_paths : list[str]
+        Chemins des zips GTFS
+    dates : list[str]
+        Dates au format 'YYYYMMDD'
+    route_types : list[int]
+        Types de route pour lesquels calculer les indicateurs par tronçon
+        (défaut : tous ceux présents dans chaque feed)
+    arrets : bool
+        Ajouter les tâches d'indicateurs par arrêt
+    compact : bool
+        Chargement compact des feeds lus pour lister leurs types de route
+        (voir charger_gtfs)
+
+    Returns:
+    --------
+    list[tuple] : Tâches (zip_path, date_str, route_type)
+    """
+    taches = []
+    for zip_path in zip_paths:
+        types = route_types
+        if types is None:
+            types = lister_route_types(obtenir_feed_du_processus(zip_path, compact))
+        types = ([None] if arrets else []) + list(types)
+        taches.extend(
+            (zip_path, date_str, route_type)
+            for date_str in dates
+            for route_type in types
+        )
+    return taches
+
+
+def fusionner_resultats(resultats):
+    """
+    Fusionne les résultats de executer_taches en tables au format long
+
+    Parameters:
+    -----------
+    resultats : dict {tache: DataFrame}
+        Résultats de executer_taches
+
+    Returns:
+    --------
+    dict {route_type: DataFrame} (None pour les arrêts), chaque table ayant
+    les colonnes zip, date et route_type en tête, dans l'ordre des tâches
+    """
+    tables = {}
+    for (zip_path, date_str, route_type), df in resultats.items():
+        if df is None:
+            continue
+        df = df.copy()
+        df.insert(0, "route_type", route_type)
+        df.insert(0, "date", date_str)
+        df.insert(0, "zip", os.path.basename(str(zip_path)))
+        tables.setdefault(route_type, []).append(df)
+
+    return {
+        route_type: pd.concat(liste, ignore_index=True)
+        for route_type, liste in tables.items()
+    }
@@ -0,0 +1,318 @@
+"""
+Exports des indicateurs (tables et géométries)
+Formats colonnaires (GeoParquet compressé, FlatGeobuf avec index spatial)
+et formats texte (CSV avec géométrie WKT, GeoJSON), compressés en gzip si le
+chemin se termine par .gz. Les formats texte et GeoParquet sont écrits par
+blocs de lignes : aucune chaîne géante ni table WKB complète n'est construite
+en mémoire, même pour des sorties multi-dates de plusieurs millions de lignes.
+FlatGeobuf est écrit en flux par GDAL.
+"""
+
+import gzip
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+from src.instrumentation import mesurer_etape
+
+
+# Nombre de lignes écrites par bloc (formats texte) ou par row group (Parquet)
+TAILLE_BLOC = 50_000
+
+# Décimales conservées sur les coordonnées des formats texte (6 ≈ 10 cm)
+PRECISION_COORDONNEES = 6
+
+# Formats reconnus d'après l'extension du fichier de sortie
+EXTENSIONS_FORMATS = {
+    ".csv": "csv",
+    ".geojson": "geojson",
+    ".json": "geojson",
+    ".parquet": "geoparquet",
+    ".geoparquet": "geoparquet",
+    ".fgb": "flatgeobuf",
+}
+
+
+def _ouvrir_texte(chemin_fichier, encoding="utf-8"):
+    """
+    Ouvre un fichier texte en écriture, compressé en gzip si le chemin
+    se termine par .gz
+    """
+    dossier = os.path.dirname(chemin_fichier)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+    if str(chemin_fichier).endswith(".gz"):
+        return gzip.open(
+            chemin_fichier, "wt", compresslevel=6, encoding=encoding, newline=""
+        )
+    return open(chemin_fichier, "w", encoding=encoding, newline="")
+
+
+def _arrondir_geometries(geometries, precision):
+    """
+    Arrondit les coordonnées d'un tableau de géométries (None conservés)
+    """
+    if precision is None:
+        return np.asarray(geometries, dtype=object)
+    return shapely.transform(
+        np.asarray(geometries, dtype=object), lambda coords: np.round(coords, precision)
+    )
+
+
+def _blocs(df, taille_bloc):
+    for debut in range(0, len(df), taille_bloc):
+        yield df.iloc[debut : debut + taille_bloc]
+
+
+@mesurer_etape("export")
+def exporter_csv(
+    df,
+    chemin_fichier,
+    geometrie="wkt",
+    precision=PRECISION_COORDONNEES,
+    taille_bloc=TAILLE_BLOC,
+):
+    """
+    Exporte un (Geo)DataFrame en CSV, par blocs de lignes
+
+    Parameters:
+    -----------
+    df : DataFrame ou GeoDataFrame
+        Table à exporter
+    chemin_fichier : str
+        Chemin du fichier de sortie (compressé en gzip si .csv.gz)
+    geometrie : str
+        "wkt" : colonne geometry écrite en WKT (relue par
+        charger_csv_avec_geometrie) ; None : colonne geometry supprimée
+    precision : int
+        Décimales conservées sur les coordonnées WKT
+    taille_bloc : int
+        Nombre de lignes converties et écrites à la fois
+    """
+    avec_geometrie = geometrie == "wkt" and "geometry" in df.columns
+    if not avec_geometrie:
+        df = df.drop(columns=["geometry"], errors="ignore")
+
+    with _ouvrir_texte(chemin_fichier, encoding="utf-8-sig") as sortie:
+        for i, bloc in enumerate(_blocs(df, taille_bloc)):
+            if avec_geometrie:
+                bloc = pd.DataFrame(bloc).assign(
+                    geometry=shapely.to_wkt(
+                        np.asarray(bloc["geometry"], dtype=object),
+                        rounding_precision=precision,
+                        trim=True,
+                    )
+                )
+            bloc.to_csv(sortie, index=False, header=i == 0)
+        if len(df) == 0:
+            df.to_csv(sortie, index=False)
+
+    print(f"✓ CSV exporté : {chemin_fichier} ({len(df)} lignes)")
+
+
+@mesurer_etape("export")
+def exporter_geojson_flux(
+    gdf, chemin_fichier, precision=PRECISION_COORDONNEES, taille_bloc=TAILLE_BLOC
+):
+    """
+    Exporte un GeoDataFrame en GeoJSON, par blocs d'entités
+
+    Parameters:
+    -----------
+    gdf : GeoDataFrame
+        Table à exporter (coordonnées en WGS84)
+    chemin_fichier : str
+        Chemin du fichier de sortie (compressé en gzip si .geojson.gz)
+    precision : int
+        Décimales conservées sur les coordonnées (None : pas d'arrondi)
+    taille_bloc : int
+        Nombre d'entités converties et écrites à la fois
+    """
+    colonne_geometrie = gdf.geometry.name
+    with _ouvrir_texte(chemin_fichier) as sortie:
+        sortie.write('{"type": "FeatureCollection", "features": [\n')
+        for i, bloc in enumerate(_blocs(gdf, taille_bloc)):
+            geometries = shapely.to_geojson(
+                _arrondir_geometries(bloc[colonne_geometrie], precision)
+            )
+            geometries = np.where(pd.isna(geometries), "null", geometries)
+            proprietes = (
+                pd.DataFrame(bloc.drop(columns=[colonne_geometrie]))
+                .to_json(
+                    orient="records",
+                    lines=True,
+                    force_ascii=False,
+                    date_format="iso",
+                    double_precision=15,
+                )
+                .splitlines()
+            )
+            entites = [
+                f'{{"type": "Feature", "properties": {p}, "geometry": {g}}}'
+                for p, g in zip(proprietes, geometries)
+            ]
+            if i > 0:
+                sortie.write(",\n")
+            sortie.write(",\n".join(entites))
+        sortie.write("\n]}\n")
+
+    print(f"✓ GeoJSON exporté : {chemin_fichier} ({len(gdf)} entités)")
+
+
+def _metadonnees_geoparquet(gdf):
+    """
+    Métadonnées GeoParquet 1.0 (clé "geo") de la géométrie active : encodage
+    WKB, types de géométries, CRS en PROJJSON et emprise de toute la table
+    """
+    colonne_geometrie = gdf.geometry.name
+    geometries = gdf.geometry[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    colonne = {
+        "encoding": "WKB",
+        "geometry_types": sorted(geometries.geom_type.unique().tolist()),
+    }
+    if gdf.crs is not None:
+        colonne["crs"] = gdf.crs.to_json_dict()
+    if len(geometries):
+        colonne["bbox"] = [float(v) for v in geometries.total_bounds]
+    return {
+        "version": "1.0.0",
+        "primary_column": colonne_geometrie,
+        "columns": {colonne_geometrie: colonne},
+    }
+
+
+@mesurer_etape("export")
+def exporter_geoparquet(
+    gdf, chemin_fichier, compression="zstd", taille_bloc=TAILLE_BLOC
+):
+    """
+    Exporte un (Geo)DataFrame en (Geo)Parquet compressé, par row groups :
+    seules les géométries d'un bloc sont converties en WKB à la fois.
+    Les métadonnées GeoParquet (CRS, emprise) sont calculées sur toute la
+    table avant l'écriture.
+
+    Parameters:
+    -----------
+    gdf : GeoDataFrame ou DataFrame
+        Table à exporter
+    chemin_fichier : str
+        Chemin du fichier de sortie
+    compression : str
+        Codec Parquet ("zstd", "snappy", "gzip", None)
+    taille_bloc : int
+        Nombre de lignes converties et écrites par row group
+    """
+    dossier = os.path.dirname(chemin_fichier)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+
+    # Schéma de toute la table (la géométrie active en WKB), pour que tous
+    # les row groups aient les mêmes types
+    colonne_geometrie = None
+    if isinstance(gdf, gpd.GeoDataFrame):
+        colonne_geometrie = gdf.active_geometry_name
+    attributs = pd.DataFrame(gdf).drop(columns=[colonne_geometrie], errors="ignore")
+    schema = pa.Schema.from_pandas(attributs, preserve_index=False)
+    if colonne_geometrie is not None:
+        schema = schema.insert(
+            gdf.columns.get_loc(colonne_geometrie),
+            pa.field(colonne_geometrie, pa.binary()),
+        ).with_metadata(
+            {
+                **schema.metadata,
+                b"geo": json.dumps(_metadonnees_geoparquet(gdf)).encode("utf-8"),
+            }
+        )
+
+    with pq.ParquetWriter(chemin_fichier, schema, compression=compression) as sortie:
+        for bloc in _blocs(gdf, taille_bloc):
+            bloc = pd.DataFrame(bloc)
+            if colonne_geometrie is not None:
+                bloc[colonne_geometrie] = shapely.to_wkb(
+                    np.asarray(bloc[colonne_geometrie], dtype=object)
+                )
+            sortie.write_table(
+                pa.Table.from_pandas(bloc, schema=schema, preserve_index=False)
+            )
+
+    print(f"✓ GeoParquet exporté : {chemin_fichier} ({len(gdf)} lignes)")
+
+
+@mesurer_etape("export")
+def exporter_flatgeobuf(gdf, chemin_fichier, index_spatial=True):
+    """
+    Exporte un GeoDataFrame en FlatGeobuf (écriture en flux par GDAL),
+    avec un index spatial (arbre R compact) pour les lectures par emprise
+
+    Parameters:
+    -----------
+    gdf : GeoDataFrame
+        Table à exporter
+    chemin_fichier : str
+        Chemin du fichier de sortie
+    index_spatial : bool
+        Écrire l'index spatial (désactivé si des géométries sont nulles,
+        que GDAL ne sait pas indexer : les entités sont toutes conservées)
+    """
+    dossier = os.path.dirname(chemin_fichier)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+    nb_nulles = int(gdf.geometry.isna().sum())
+    if index_spatial and nb_nulles:
+        print(
+            f"⚠ {nb_nulles} géométrie(s) nulle(s) : FlatGeobuf exporté "
+            "sans index spatial"
+        )
+        index_spatial = False
+    gdf.to_file(
+        chemin_fichier,
+        driver="FlatGeobuf",
+        engine="pyogrio",
+        SPATIAL_INDEX="YES" if index_spatial else "NO",
+    )
+    print(f"✓ FlatGeobuf exporté : {chemin_fichier} ({len(gdf)} entités)")
+
+
+def exporter(gdf, chemin_fichier, **kwargs):
+    """
+    Exporte une table dans le format déduit de l'extension du fichier :
+    .csv, .geojson, .parquet/.geoparquet ou .fgb (.csv.gz et .geojson.gz
+    pour les formats texte compressés)
+
+    Parameters:
+    -----------
+    gdf : GeoDataFrame ou DataFrame
+        Table à exporter
+    chemin_fichier : str
+        Chemin du fichier de sortie
+    **kwargs :
+        Options de l'exporteur correspondant
+    """
+    nom = str(chemin_fichier).lower().removesuffix(".gz")
+    extension = os.path.splitext(nom)[1]
+    format_sortie = EXTENSIONS_FORMATS.get(extension)
+    if str(chemin_fichier).endswith(".gz") and format_sortie not in ("csv", "geojson"):
+        raise ValueError(
+            "La compression gzip ne concerne que les formats CSV et GeoJSON"
+        )
+
+    if format_sortie == "csv":
+        exporter_csv(gdf, chemin_fichier, **kwargs)
+    elif format_sortie == "geojson":
+        exporter_geojson_flux(gdf, chemin_fichier, **kwargs)
+    elif format_sortie == "geoparquet":
+        exporter_geoparquet(gdf, chemin_fichier, **kwargs)
+    elif format_sortie == "flatgeobuf":
+        exporter_flatgeobuf(gdf, chemin_fichier, **kwargs)
+    else:
+        raise ValueError(
+            f"Format de sortie inconnu : {chemin_fichier} "
+            f"(extensions acceptées : {', '.join(EXTENSIONS_FORMATS)}, "
+            "et .csv.gz / .geojson.gz)"
+        )
@@ -0,0 +1,432 @@
+"""
+Calcul des indicateurs en flux, sans charger stop_times.txt en mémoire
+Pour les GTFS de grande taille (réseaux régionaux ou nationaux) : seules les
+petites tables (stops, routes, trips, calendriers) sont chargées. stop_times.txt
+est lu directement dans le zip, par blocs alignés sur les trips, et chaque bloc
+est filtré aux trips actifs puis replié dans des agrégats cumulés (passages,
+premier et dernier départ par arrêt ; nombre de passages, durées somme/min/max
+et esquisse des durées par tronçon, pour leurs quantiles). La mémoire utilisée
+dépend de la taille des blocs, pas du feed.
+
+stop_times.txt doit être groupé par trip_id (c'est le cas des GTFS usuels) :
+un trip coupé entre deux blocs est reporté en entier sur le bloc suivant.
+"""
+
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from src.arrets import (
+    DEBUT_PLAGE_ATTENTE_S,
+    FIN_PLAGE_ATTENTE_S,
+    formater_amplitude,
+)
+from src.indicateurs_troncons import (
+    ajouter_quantiles_durees,
+    joindre_indicateurs_troncons,
+    moyenne_depuis_somme,
+)
+from src.parcours import stations_parent
+from src.quantiles import esquisser, fusionner_esquisses
+from src.utils import (
+    COLONNES_COMPACTES,
+    charger_gtfs_compact,
+    convertir_temps_gtfs_en_secondes,
+    formater_secondes_en_temps,
+    obtenir_service_ids_pour_date,
+)
+
+
+# Nombre de lignes de stop_times.txt lues par bloc
+TAILLE_BLOC_STOP_TIMES = 500_000
+
+# Tables chargées en mémoire en mode flux (stop_times et shapes sont exclues)
+TABLES_HORS_FLUX = ["stops", "routes", "trips", "calendar", "calendar_dates"]
+
+
+def charger_gtfs_sans_stop_times(zip_path):
+    """
+    Charge les petites tables d'un GTFS (voir TABLES_HORS_FLUX), en mode
+    compact, sans stop_times ni shapes
+    Args:
+        zip_path (str): Chemin du zip GTFS
+    Returns:
+        feed: gtfs_kit Feed object (feed.stop_times à None)
+    """
+    return charger_gtfs_compact(zip_path, tables=TABLES_HORS_FLUX)
+
+
+def lire_stop_times_par_trips(zip_path, taille_bloc=TAILLE_BLOC_STOP_TIMES):
+    """
+    Lit stop_times.txt dans le zip par blocs d'environ taille_bloc lignes,
+    sans couper de trip : les lignes du dernier trip d'un bloc sont reportées
+    sur le bloc suivant
+    Args:
+        zip_path (str): Chemin du zip GTFS
+        taille_bloc (int): Nombre de lignes lues à la fois
+    Yields:
+        pd.DataFrame: Bloc de stop_times (colonnes texte, voir COLONNES_COMPACTES)
+    """
+    colonnes = [
+        col for col in COLONNES_COMPACTES["stop_times"] if col != "shape_dist_traveled"
+    ]
+    with zipfile.ZipFile(zip_path) as archive:
+        noms_fichiers = {nom.split("/")[-1]: nom for nom in archive.namelist()}
+        with archive.open(noms_fichiers["stop_times.txt"]) as fichier:
+            reste = None
+            for bloc in pd.read_csv(
+                fichier,
+                encoding="utf-8-sig",
+                usecols=lambda col: col.strip() in colonnes,
+                dtype=str,
+                skipinitialspace=True,
+                chunksize=taille_bloc,
+            ):
+                bloc.columns = bloc.columns.str.strip()
+                if reste is not None:
+                    bloc = pd.concat([reste, bloc], ignore_index=True)
+
+                dernier_trip = bloc["trip_id"].to_numpy()[-1]
+                fin_bloc = bloc["trip_id"].to_numpy() == dernier_trip
+                reste = bloc[fin_bloc]
+                if not fin_bloc.all():
+                    yield bloc[~fin_bloc]
+
+            if reste is not None and len(reste) > 0:
+                yield reste
+
+
+class AgregatsFlux:
+    """
+    Agrégats cumulés des stop_times des trips actifs, repliés bloc par bloc
+
+    Attributes:
+        passages (np.ndarray): Nombre de passages par arrêt
+        premier_depart_s, dernier_depart_s (np.ndarray): Premier et dernier
+            départ par arrêt (secondes)
+        departs_plage (np.ndarray): Nombre de départs dans la plage des temps
+            d'attente, par arrêt, avec premier_plage_s et dernier_plage_s
+        lignes_arrets (np.ndarray): Couples (arrêt, ligne) desservis, codés
+            arrêt * nombre de lignes + ligne
+        stats_paires (pd.DataFrame): Par (route_type, paire) : nombre de passages,
+            somme, min et max des durées
+        esquisses_paires (pd.DataFrame): Esquisse des durées par (route_type,
+            paire), fusionnée bloc par bloc (voir src.quantiles)
+    """
+
+    def __init__(self, feed, service_ids, route_types=None):
+        stops = feed.stops
+        self.stop_ids = pd.Index(np.asarray(stops["stop_id"], dtype=object))
+        self.route_ids = pd.Index(
+            np.asarray(feed.routes["route_id"], dtype=object)
+        ).unique()
+
+        # Trips retenus : service actif et route_type demandé
+        trips = feed.trips[["trip_id", "route_id", "service_id"]].astype(object)
+        trips = trips.merge(
+            feed.routes[["route_id", "route_type"]].astype({"route_id": object}),
+            on="route_id",
+            how="left",
+        ).drop_duplicates("trip_id")
+        self.trip_ids = pd.Index(trips["trip_id"].to_numpy(dtype=object))
+
+        # Les trips dont la ligne est absente de routes (route_type inconnu)
+        # sont écartés
+        actif = (
+            trips["service_id"].isin(list(service_ids)).to_numpy()
+            & trips["route_type"].notna().to_numpy()
+        )
+        if route_types is not None:
+            route_types = [int(rt) for rt in route_types]
+            actif = actif & trips["route_type"].isin(route_types).to_numpy()
+        self.trip_actif = actif
+        self.route_trip = self.route_ids.get_indexer(trips["route_id"].to_numpy())
+        self.route_type_trip = (
+            trips["route_type"].to_numpy(dtype="float64", na_value=np.nan)
+        )
+        self.trip_vu = np.zeros(len(self.trip_ids), dtype=bool)
+
+        # Stations parent, codées dans l'ordre alphabétique (paires normalisées)
+        parents = stations_parent(stops)
+        codes_parent, self.parents = pd.factorize(
+            np.asarray(
+                parents.reindex(self.stop_ids.to_numpy()).to_numpy(), dtype=object
+            ),
+            sort=True,
+        )
+        self.parent_stop = codes_parent
+
+        nb_stops = len(self.stop_ids)
+        self.passages = np.zeros(nb_stops, dtype="int64")
+        self.premier_depart_s = np.full(nb_stops, np.nan)
+        self.dernier_depart_s = np.full(nb_stops, np.nan)
+        self.departs_plage = np.zeros(nb_stops, dtype="int64")
+        self.premier_plage_s = np.full(nb_stops, np.nan)
+        self.dernier_plage_s = np.full(nb_stops, np.nan)
+        self.lignes_arrets = np.empty(0, dtype="int64")
+        self.stats_paires = None
+        self.esquisses_paires = None
+        self.nb_blocs = 0
+
+    def ajouter_bloc(self, bloc):
+        """
+        Replie un bloc de stop_times (trips complets) dans les agrégats
+        """
+        self.nb_blocs += 1
+        codes_trip = self.trip_ids.get_indexer(bloc["trip_id"].to_numpy(dtype=object))
+
+        # Chaque trip ne doit apparaître que dans un seul bloc
+        trips_bloc = np.unique(codes_trip[codes_trip >= 0])
+        if self.trip_vu[trips_bloc].any():
+            raise ValueError(
+                "stop_times.txt n'est pas groupé par trip_id : "
+                "calcul en flux impossible, utiliser charger_gtfs"
+            )
+        self.trip_vu[trips_bloc] = True
+
+        # Trips actifs uniquement
+        garder = codes_trip >= 0
+        garder[garder] = self.trip_actif[codes_trip[garder]]
+        bloc, codes_trip = bloc[garder], codes_trip[garder]
+        if len(bloc) == 0:
+            return
+
+        departs = convertir_temps_gtfs_en_secondes(bloc["departure_time"]).to_numpy(
+            dtype="float64", na_value=np.nan
+        )
+        arrivees = convertir_temps_gtfs_en_secondes(bloc["arrival_time"]).to_numpy(
+            dtype="float64", na_value=np.nan
+        )
+        codes_stop = self.stop_ids.get_indexer(bloc["stop_id"].to_numpy(dtype=object))
+
+        self._ajouter_arrets(codes_stop, codes_trip, departs)
+        self._ajouter_paires(
+            codes_stop,
+            codes_trip,
+            pd.to_numeric(bloc["stop_sequence"], errors="coerce").to_numpy(
+                dtype="float64", na_value=np.nan
+            ),
+            departs,
+            arrivees,
+        )
+
+    def _ajouter_arrets(self, codes_stop, codes_trip, departs):
+        connus = codes_stop >= 0
+        stops, trips, departs = codes_stop[connus], codes_trip[connus], departs[connus]
+
+        self.passages += np.bincount(stops, minlength=len(self.passages))
+        np.fmin.at(self.premier_depart_s, stops, departs)
+        np.fmax.at(self.dernier_depart_s, stops, departs)
+
+        plage = (departs >= DEBUT_PLAGE_ATTENTE_S) & (departs <= FIN_PLAGE_ATTENTE_S)
+        self.departs_plage += np.bincount(stops[plage], minlength=len(self.passages))
+        np.fmin.at(self.premier_plage_s, stops[plage], departs[plage])
+        np.fmax.at(self.dernier_plage_s, stops[plage], departs[plage])
+
+        routes = self.route_trip[trips]
+        avec_ligne = routes >= 0
+        lignes_arrets = stops[avec_ligne].astype("int64") * len(self.route_ids)
+        self.lignes_arrets = np.union1d(
+            self.lignes_arrets, lignes_arrets + routes[avec_ligne]
+        )
+
+    def _ajouter_paires(self, codes_stop, codes_trip, sequences, departs, arrivees):
+        # Arrêts consécutifs de chaque trip
+        ordre = np.lexsort((sequences, codes_trip))
+        codes_trip, codes_stop = codes_trip[ordre], codes_stop[ordre]
+        departs, arrivees = departs[ordre], arrivees[ordre]
+
+        parents = np.where(codes_stop >= 0, self.parent_stop[codes_stop], -1)
+        duree = arrivees[1:] - departs[:-1]
+        valide = (
+            (codes_trip[1:] == codes_trip[:-1])
+            & (parents[:-1] >= 0)
+            & (parents[1:] >= 0)
+            & (duree > 0)
+        )
+        if not valide.any():
+            return
+
+        code_min = np.minimum(parents[:-1], parents[1:])[valide]
+        code_max = np.maximum(parents[:-1], parents[1:])[valide]
+        passages = pd.DataFrame(
+            {
+                "route_type": self.route_type_trip[codes_trip[:-1][valide]],
+                "paire": code_min.astype("int64") * len(self.parents) + code_max,
+                "duree_secondes": duree[valide].astype("int64"),
+            }
+        )
+        esquisse = esquisser(passages, ["route_type", "paire"])
+        stats = (
+            passages.groupby(["route_type", "paire"], sort=False)
+            .agg(
+                nombre_passages=("duree_secondes", "count"),
+                duree_somme_secondes=("duree_secondes", "sum"),
+                duree_min_secondes=("duree_secondes", "min"),
+                duree_max_secondes=("duree_secondes", "max"),
+            )
+        )
+        if self.stats_paires is not None:
+            stats = (
+                pd.concat([self.stats_paires, stats])
+                .groupby(level=["route_type", "paire"], sort=False)
+                .agg(
+                    {
+                        "nombre_passages": "sum",
+                        "duree_somme_secondes": "sum",
+                        "duree_min_secondes": "min",
+                        "duree_max_secondes": "max",
+                    }
+                )
+            )
+            esquisse = fusionner_esquisses(
+                [self.esquisses_paires, esquisse], ["route_type", "paire"]
+            )
+        self.stats_paires = stats
+        self.esquisses_paires = esquisse
+
+    def indicateurs_arrets(self, stops):
+        """
+        Indicateurs par arrêt, aux colonnes de calculer_indicateurs_arrets.
+        Le temps d'attente moyen est déduit des départs de la plage horaire
+        (premier, dernier, nombre) ; les temps d'attente min, max et leur
+        coefficient de variation demandent tous les départs et restent à NaN.
+        """
+        desservis = np.flatnonzero(self.passages > 0)
+        nb_lignes = np.bincount(
+            self.lignes_arrets // len(self.route_ids), minlength=len(self.passages)
+        )
+        intervalles = self.departs_plage[desservis] - 1
+        attente = np.divide(
+            self.dernier_plage_s[desservis] - self.premier_plage_s[desservis],
+            intervalles,
+            out=np.full(len(desservis), np.nan),
+            where=intervalles > 0,
+        )
+
+        premier = pd.Series(self.premier_depart_s[desservis]).astype("Int64")
+        dernier = pd.Series(self.dernier_depart_s[desservis]).astype("Int64")
+        indicateurs = pd.DataFrame(
+            {
+                "stop_id": self.stop_ids.to_numpy()[desservis],
+                "nb_lignes": nb_lignes[desservis],
+                "nombre_passages": self.passages[desservis],
+                "premier_depart": formater_secondes_en_temps(premier),
+                "dernier_depart": formater_secondes_en_temps(dernier),
+                "amplitude_horaire": formater_amplitude(premier, dernier),
+                "temps_attente_moyen": attente / 60,
+                "temps_attente_min": np.nan,
+                "temps_attente_max": np.nan,
+                "cv_temps_attente": np.nan,
+            }
+        )
+        infos = stops[["stop_id", "stop_name", "stop_lat", "stop_lon"]].astype(
+            {"stop_id": object}
+        )
+        indicateurs = indicateurs.merge(infos, on="stop_id", how="left")
+        colonnes = ["stop_id", "stop_name", "stop_lat", "stop_lon"]
+        indicateurs = indicateurs[
+            colonnes + [col for col in indicateurs.columns if col not in colonnes]
+        ]
+        return indicateurs.sort_values("nombre_passages", ascending=False)
+
+    def statistiques_paires(self, par_mode=True):
+        """
+        Statistiques par paire de stations parent (stop_pair_min,
+        stop_pair_max), par route_type si par_mode, au format attendu
+        par joindre_indicateurs_troncons
+        """
+        if self.stats_paires is None:
+            return None
+        stats, esquisse = self.stats_paires, self.esquisses_paires
+        cles = ["route_type"] if par_mode else []
+        if not par_mode:
+            esquisse = fusionner_esquisses([esquisse], ["paire"])
+            stats = stats.groupby(level="paire", sort=False).agg(
+                {
+                    "nombre_passages": "sum",
+                    "duree_somme_secondes": "sum",
+                    "duree_min_secondes": "min",
+                    "duree_max_secondes": "max",
+                }
+            )
+        stats = ajouter_quantiles_durees(stats.reset_index(), esquisse, cles)
+        stats = moyenne_depuis_somme(stats)
+        paires = stats.pop("paire").to_numpy()
+        stats.insert(0, "stop_pair_max", self.parents[paires % len(self.parents)])
+        stats.insert(0, "stop_pair_min", self.parents[paires // len(self.parents)])
+        if par_mode:
+            stats["route_type"] = stats["route_type"].astype("int64")
+        return stats
+
+
+def calculer_indicateurs_en_flux(
+    zip_path,
+    date_str,
+    df_troncons_uniques=None,
+    route_types=None,
+    taille_bloc=TAILLE_BLOC_STOP_TIMES,
+):
+    """
+    Calcule en une seule lecture de stop_times.txt les indicateurs par arrêt
+    et, si des tronçons de référence sont fournis, les indicateurs par tronçon
+
+    Parameters:
+    -----------
+    zip_path : str
+        Chemin du zip GTFS
+    date_str : str
+        Date analysée, au format 'YYYYMMDD'
+    df_troncons_uniques : DataFrame
+        Tronçons de référence (ex: relus avec charger_troncons). Avec une
+        colonne route_type, les statistiques sont jointes par mode ; sans,
+        route_types doit désigner le mode des tronçons
+    route_types : list[int]
+        Types de route à retenir (défaut : tous)
+    taille_bloc : int
+        Nombre de lignes de stop_times.txt lues à la fois (borne la mémoire)
+
+    Returns:
+    --------
+    dict : {"arrets": DataFrame ou None, "troncons": DataFrame ou None}
+    """
+    print(f"\nCalcul des indicateurs en flux (blocs de {taille_bloc} lignes)...")
+
+    feed = charger_gtfs_sans_stop_times(zip_path)
+    service_ids = obtenir_service_ids_pour_date(feed, date_str)
+    if not service_ids:
+        print("⚠ Aucun service actif pour cette date")
+        return {"arrets": None, "troncons": None}
+
+    agregats = AgregatsFlux(feed, service_ids, route_types)
+    for bloc in lire_stop_times_par_trips(zip_path, taille_bloc):
+        agregats.ajouter_bloc(bloc)
+    print(
+        f"✓ {agregats.trip_actif.sum()} trips actifs, "
+        f"stop_times lus en {agregats.nb_blocs} bloc(s)"
+    )
+
+    indicateurs_arrets = agregats.indicateurs_arrets(feed.stops)
+    print(f"✓ Indicateurs calculés pour {len(indicateurs_arrets)} arrêts")
+
+    indicateurs_troncons = None
+    if df_troncons_uniques is not None:
+        par_mode = "route_type" in df_troncons_uniques.columns
+        stats_par_paire = agregats.statistiques_paires(par_mode=par_mode)
+        if stats_par_paire is None:
+            print("⚠ Aucun passage détecté")
+        else:
+            indicateurs_troncons = joindre_indicateurs_troncons(
+                df_troncons_uniques, stats_par_paire
+            )
+            tri = ["route_type", "nombre_passages"] if par_mode else ["nombre_passages"]
+            indicateurs_troncons = indicateurs_troncons.sort_values(
+                tri, ascending=[True] * (len(tri) - 1) + [False], kind="stable"
+            ).reset_index(drop=True)
+            print(
+                f"✓ Fréquentation calculée pour {len(indicateurs_troncons)} "
+                "tronçons uniques"
+            )
+
+    return {"arrets": indicateurs_arrets, "troncons": indicateurs_troncons}
@@ -8,65 +8,333 @@ import pandas as pd
 import numpy as np
 import geopandas as gpd
 
-from src.utils import charger_gtfs, obtenir_service_ids_pour_date
+from src.calendrier import obtenir_index_calendrier
+from src.create_troncons_uniques import creer_troncons_uniques_multimodal
+from src.instrumentation import etape, mesurer_etape
+from src.parcours import obtenir_index_parcours, stations_parent
+from src.quantiles import esquisser, fusionner_esquisses, quantiles_esquisse
+from src.tranches import affecter_tranches, definir_tranches, pivoter_tranches
+from src.utils import (
+    calculer_distance_haversine,
+    charger_gtfs,
+    obtenir_service_ids_pour_date,
+)
 
 
-def calculer_distance_haversine(lat1, lon1, lat2, lon2):
+def preparer_mapping_parent_stops(feed):
     """
-    Calcule la distance entre deux points GPS en kilomètres
-    Utilise la formule de Haversine
+    Crée un mapping entre stop_id et parent_station
+    Si parent_station n'existe pas, utilise stop_id comme parent
+    (même mapping que l'index des parcours, voir src.parcours.stations_parent)
+    """
+    return stations_parent(feed.stops).to_dict()
+
+
+def normaliser_paires(stop_1, stop_2):
+    """
+    Normalise des paires d'arrêts pour regrouper les deux sens d'un tronçon
+    (équivalent vectorisé de tuple(sorted([stop_1, stop_2])))
+    Les identifiants sont codés en entiers dans l'ordre alphabétique,
+    puis comparés par min/max sur les codes.
+
+    Returns:
+        Tuple de np.ndarray : (plus petit identifiant, plus grand identifiant)
     """
-    R = 6371  # Rayon de la Terre en km
+    stop_1 = np.asarray(stop_1, dtype=object)
+    stop_2 = np.asarray(stop_2, dtype=object)
+    codes, valeurs = pd.factorize(np.concatenate([stop_1, stop_2]), sort=True)
+    code_1, code_2 = codes[: len(stop_1)], codes[len(stop_1) :]
 
-    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
+    # Les paires avec un identifiant manquant sont laissées telles quelles
+    inverser = (code_2 < code_1) & (code_2 >= 0)
 
-    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
-    c = 2 * np.arcsin(np.sqrt(a))
+    stop_min = np.where(inverser, stop_2, stop_1)
+    stop_max = np.where(inverser, stop_1, stop_2)
 
-    return R * c
+    return stop_min, stop_max
 
 
-def convertir_temps_en_secondes(temps_str):
+def construire_passages(feed, route_type, service_ids=None, index=None):
     """
-    Convertit un temps GTFS (HH:MM:SS) en secondes
-    Gère les heures > 24 (ex: 25:30:00 pour 01:30 le lendemain)
+    Construit les passages entre arrêts consécutifs des trips d'un ou
+    plusieurs types de route, à partir de l'index des parcours du feed :
+    la topologie (paires d'arrêts parents) est lue sur le parcours de chaque
+    trip, seules les durées sont calculées trip par trip.
+
+    Parameters:
+    -----------
+    feed : gtfs_kit Feed object
+        Le feed GTFS chargé
+    route_type: int ou list[int]
+        Le ou les types de route (0=tram, 3=bus, etc.), None pour tous les modes
+    service_ids : list
+        Liste des service_id à conserver (défaut : tous les services)
+    index : IndexParcours
+        Index des parcours du feed (défaut : obtenir_index_parcours(feed))
+
+    Returns:
+    --------
+    Tuple (IndexParcours, DataFrame des passages) : une ligne par passage
+    de durée valide, voir IndexParcours.passages
     """
-    if pd.isna(temps_str):
-        return None
+    if index is None:
+        index = obtenir_index_parcours(feed)
+    with etape("filtre_trips", lignes_entree=len(index.trip_ids)) as mesure:
+        selection = index.selectionner_trips(route_type, service_ids)
+        mesure.lignes_sortie = selection.sum()
+
+    print(
+        f"✓ {selection.sum()} trips actifs, "
+        f"{len(np.unique(index.parcours_trip[selection]))} parcours distincts"
+    )
 
-    parts = str(temps_str).split(":")
-    heures = int(parts[0])
-    minutes = int(parts[1])
-    secondes = int(parts[2])
+    with etape("appariement", lignes_entree=selection.sum()) as mesure:
+        df_passages = index.passages(route_type, service_ids)
+        mesure.lignes_sortie = len(df_passages)
 
-    return heures * 3600 + minutes * 60 + secondes
+    return index, df_passages
 
 
-def preparer_mapping_parent_stops(feed):
+@mesurer_etape("agregation")
+def agreger_passages(df_passages, cles=()):
     """
-    Crée un mapping entre stop_id et parent_station
-    Si parent_station n'existe pas, utilise stop_id comme parent
+    Agrège les passages par paire de stops (tous sens confondus, colonne paire)
+    et par clés supplémentaires éventuelles (ex: service_id).
+    La somme des durées est conservée pour pouvoir ré-agréger les résultats
+    (voir moyenne_depuis_somme).
+    """
+    return (
+        df_passages.groupby(list(cles) + ["paire"], sort=False)
+        .agg(
+            nombre_passages=("duree_secondes", "count"),
+            duree_somme_secondes=("duree_secondes", "sum"),
+            duree_min_secondes=("duree_secondes", "min"),
+            duree_max_secondes=("duree_secondes", "max"),
+        )
+        .reset_index()
+    )
+
+
+def ajouter_quantiles_durees(stats_par_paire, esquisse, cles=()):
     """
-    stops = feed.stops.copy()
+    Joint aux statistiques par paire les quantiles des durées des passages
+    (duree_p10_secondes, duree_p50_secondes, duree_p90_secondes), tirés
+    d'une esquisse par paire et par clés (voir src.quantiles)
+    """
+    cles = list(cles) + ["paire"]
+    return stats_par_paire.merge(
+        quantiles_esquisse(esquisse, cles), on=cles, how="left"
+    )
+
+
+def agreger_passages_quantiles(df_passages, cles=()):
+    """
+    Agrège les passages par paire (voir agreger_passages), avec les quantiles
+    de leurs durées
+    """
+    cles = list(cles)
+    with etape("quantiles", lignes_entree=len(df_passages)) as mesure:
+        esquisse = esquisser(df_passages, cles + ["paire"])
+        mesure.lignes_sortie = len(esquisse)
+    return ajouter_quantiles_durees(agreger_passages(df_passages, cles), esquisse, cles)
+
+
+def moyenne_depuis_somme(stats_par_paire):
+    """
+    Remplace la somme des durées par la durée moyenne des passages
+    """
+    stats_par_paire = stats_par_paire.rename(
+        columns={"duree_somme_secondes": "duree_moyenne_secondes"}
+    )
+    stats_par_paire["duree_moyenne_secondes"] = (
+        stats_par_paire["duree_moyenne_secondes"] / stats_par_paire["nombre_passages"]
+    )
+    return stats_par_paire
+
+
+@mesurer_etape("enrichissement")
+def joindre_indicateurs_troncons(
+    df_troncons_uniques, stats_par_paire, dates=None, tranches=None
+):
+    """
+    Joint les statistiques par paire de stops à la table des tronçons uniques,
+    puis calcule distances et vitesses
+
+    Parameters:
+    -----------
+    df_troncons_uniques : DataFrame
+        Table des tronçons uniques
+    stats_par_paire : DataFrame
+        Statistiques par paire de stops (et par date si dates est renseigné)
+    dates : list[str]
+        Dates analysées : chaque tronçon est alors décliné par date
+    tranches : DataFrame
+        Tranches horaires analysées (voir src.tranches.definir_tranches) :
+        chaque tronçon est alors décliné par tranche
+
+    Returns:
+    --------
+    DataFrame avec fréquentation et vitesse moyenne par tronçon
+    (et par date ou par tranche), ainsi que les quantiles des vitesses
+    (vitesse_p10_kmh...) si les statistiques portent ceux des durées
+    """
+    # Préparer le matching avec df_troncons_uniques
+    # Créer la même clé normalisée dans df_troncons_uniques
+    df_resultat = df_troncons_uniques.copy()
+    df_resultat["stop_pair_min"], df_resultat["stop_pair_max"] = normaliser_paires(
+        df_resultat["stop_depart_parent_id"], df_resultat["stop_arrivee_parent_id"]
+    )
+    cles = ["stop_pair_min", "stop_pair_max"]
+
+    # Tronçons de plusieurs modes : statistiques jointes par mode
+    if "route_type" in df_resultat.columns and "route_type" in stats_par_paire.columns:
+        df_resultat["route_type"] = df_resultat["route_type"].astype("int64")
+        stats_par_paire = stats_par_paire.astype({"route_type": "int64"})
+        cles = ["route_type"] + cles
+
+    if dates is not None:
+        df_resultat = pd.DataFrame({"date": list(dates)}).merge(
+            df_resultat, how="cross"
+        )
+        cles = ["date"] + cles
+
+    if tranches is not None:
+        df_resultat = tranches[["tranche", "debut", "fin"]].merge(
+            df_resultat, how="cross"
+        )
+        cles = ["tranche"] + cles
 
-    # Si parent_station n'existe pas ou est vide, utiliser stop_id
-    if "parent_station" not in stops.columns:
-        stops["parent_station"] = stops["stop_id"]
+    # Joindre avec les statistiques
+    df_resultat = df_resultat.merge(stats_par_paire, on=cles, how="left")
+
+    # Supprimer les colonnes temporaires
+    df_resultat = df_resultat.drop(columns=["stop_pair_min", "stop_pair_max"])
+
+    # Calculer la distance si pas déjà présente (distance le long du tracé,
+    # voir src.traces), à vol d'oiseau pour les tronçons sans tracé
+    distance_vol_oiseau = calculer_distance_haversine(
+        df_resultat["lat_depart_parent"].to_numpy(dtype="float64"),
+        df_resultat["lon_depart_parent"].to_numpy(dtype="float64"),
+        df_resultat["lat_arrivee_parent"].to_numpy(dtype="float64"),
+        df_resultat["lon_arrivee_parent"].to_numpy(dtype="float64"),
+    )
+    if "distance_km" not in df_resultat.columns:
+        df_resultat["distance_km"] = distance_vol_oiseau
     else:
-        stops["parent_station"] = stops["parent_station"].fillna(stops["stop_id"])
-        # Remplacer les chaînes vides par stop_id
-        stops.loc[stops["parent_station"] == "", "parent_station"] = stops["stop_id"]
+        df_resultat["distance_km"] = df_resultat["distance_km"].fillna(
+            pd.Series(distance_vol_oiseau, index=df_resultat.index)
+        )
+
+    # Calculer la vitesse moyenne en km/h
+    df_resultat["vitesse_moyenne_kmh"] = df_resultat["distance_km"] / (
+        df_resultat["duree_moyenne_secondes"] / 3600
+    )
 
+    # Calculer aussi vitesse min et max
+    df_resultat["vitesse_min_kmh"] = df_resultat["distance_km"] / (
+        df_resultat["duree_max_secondes"] / 3600
+    )
+
+    df_resultat["vitesse_max_kmh"] = df_resultat["distance_km"] / (
+        df_resultat["duree_min_secondes"] / 3600
+    )
+
+    # Quantiles des vitesses : la vitesse p10 correspond à la durée p90
+    for vitesse, duree in [("p10", "p90"), ("p50", "p50"), ("p90", "p10")]:
+        if f"duree_{duree}_secondes" in df_resultat.columns:
+            df_resultat[f"vitesse_{vitesse}_kmh"] = df_resultat["distance_km"] / (
+                df_resultat[f"duree_{duree}_secondes"] / 3600
+            )
+
+    # Remplacer les NaN (tronçons sans passage) par 0
+    df_resultat["nombre_passages"] = (
+        df_resultat["nombre_passages"].fillna(0).astype(int)
+    )
+
+    return df_resultat
+
+
+def calculer_frequentation_par_tranche(
+    index, df_passages, df_troncons_uniques, tranches, format_tranches="long", cles=()
+):
+    """
+    Calcule la fréquentation et la vitesse moyenne de chaque tronçon unique
+    par tranche horaire, en une seule agrégation de tous les passages :
+    chaque passage est affecté à la tranche de son heure de départ.
+
+    Parameters:
+    -----------
+    index : IndexParcours
+        Index des parcours du feed (voir construire_passages)
+    df_passages : DataFrame
+        Passages (voir construire_passages)
+    df_troncons_uniques : DataFrame
+        Table des tronçons uniques
+    tranches : str, int, dict ou DataFrame
+        Découpage de la journée (voir src.tranches.definir_tranches)
+    format_tranches : str
+        "long" (une ligne par tronçon et par tranche) ou "large"
+        (une ligne par tronçon, une colonne par tranche et par indicateur :
+        passages, vitesse moyenne et durée médiane)
+    cles : list[str]
+        Clés supplémentaires d'agrégation (ex: route_type)
+
+    Returns:
+    --------
+    DataFrame des indicateurs par tronçon et par tranche horaire
+    """
+    definition = definir_tranches(tranches)
+
+    df_passages = df_passages.assign(
+        tranche=affecter_tranches(df_passages["depart_s"], definition)
+    )
+    df_passages = df_passages[df_passages["tranche"] >= 0]
+
+    stats_par_paire = agreger_passages_quantiles(
+        df_passages, cles=list(cles) + ["tranche"]
+    )
+    stats_par_paire["tranche"] = definition["tranche"].to_numpy()[
+        stats_par_paire["tranche"].to_numpy()
+    ]
+    stats_par_paire = index.decoder_paires(moyenne_depuis_somme(stats_par_paire))
+
+    df_resultat = joindre_indicateurs_troncons(
+        df_troncons_uniques, stats_par_paire, tranches=definition
+    )
+
+    print(f"✓ Fréquentation calculée pour {len(definition)} tranche(s) horaire(s)")
+
+    if format_tranches == "large":
+        large = pivoter_tranches(
+            df_resultat,
+            ["troncon_unique_id"],
+            ["nombre_passages", "vitesse_moyenne_kmh", "duree_p50_secondes"],
+        )
+        return df_troncons_uniques.merge(large, on="troncon_unique_id", how="left")
+
+    # Trier par tranche (ordre horaire), puis nombre de passages décroissant
+    df_resultat["ordre_tranche"] = df_resultat["tranche"].map(
+        {nom: i for i, nom in enumerate(definition["tranche"])}
+    )
+    tri = ["ordre_tranche"] + list(cles) + ["nombre_passages"]
     return (
-        stops[["stop_id", "parent_station"]]
-        .set_index("stop_id")["parent_station"]
-        .to_dict()
+        df_resultat.sort_values(
+            tri, ascending=[True] * (len(tri) - 1) + [False], kind="stable"
+        )
+        .drop(columns=["ordre_tranche"])
+        .reset_index(drop=True)
     )
 
 
-def calculer_frequentation_troncons(feed, df_troncons_uniques, service_ids, route_type):
+def calculer_frequentation_troncons(
+    feed,
+    df_troncons_uniques,
+    service_ids,
+    route_type,
+    tranches=None,
+    format_tranches="long",
+    index=None,
+):
     """
     Calcule la fréquentation et la vitesse moyenne pour chaque tronçon unique
 
@@ -81,151 +349,218 @@ def calculer_frequentation_troncons(feed, df_troncons_uniques, service_ids, rout
         Liste des service_id actifs pour la date analysée
     route_type: int
         Le type de route (0=tram, 3=bus, etc.)
+    tranches : str, int ou dict
+        Découpage de la journée en tranches horaires ("horaire", "15min",
+        "pointe"...) : voir calculer_frequentation_par_tranche ("horaire"
+        donne notamment la durée médiane par heure, duree_p50_secondes).
+        Par défaut, indicateurs sur la journée entière
+    format_tranches : str
+        Format du résultat par tranche : "long" ou "large"
+    index : IndexParcours
+        Index des parcours du feed (défaut : obtenir_index_parcours(feed))
 
     Returns:
     --------
-    DataFrame avec fréquentation et vitesse moyenne par tronçon
+    DataFrame avec fréquentation, vitesse moyenne, durées et vitesses
+    min/max et p10/p50/p90 par tronçon (et par tranche horaire si tranches
+    est renseigné)
     """
     print("\nCalcul de la fréquentation par tronçon unique...")
 
-    # Créer le mapping stop_id -> parent_station
-    mapping_parent = preparer_mapping_parent_stops(feed)
+    # Construire les passages par paire de stops consécutifs
+    index, df_passages = construire_passages(
+        feed, route_type, service_ids, index
+    )
 
-    # Filtrer les trips actifs
-    trips_actifs = feed.trips[feed.trips["service_id"].isin(service_ids)].copy()
+    print(f"✓ {len(df_passages)} passages détectés")
 
-    # Restriction au bon route_type
-    routes_filtrees = feed.routes[feed.routes["route_type"] == route_type]
-    trips_actifs = trips_actifs[
-        trips_actifs["route_id"].isin(routes_filtrees["route_id"])
-    ]
+    if df_passages.empty:
+        print("⚠ Aucun passage détecté")
+        return None
 
-    print(f"✓ {len(trips_actifs)} trips actifs")
+    if tranches is not None:
+        return calculer_frequentation_par_tranche(
+            index, df_passages, df_troncons_uniques, tranches, format_tranches
+        )
 
-    # Enrichir stop_times avec les informations nécessaires
-    stop_times = feed.stop_times.merge(
-        trips_actifs[["trip_id", "route_id"]], on="trip_id"
+    # Agréger par paire de stops (tous sens confondus)
+    # On compte le nombre de passages et calcule la durée moyenne
+    stats_par_paire = index.decoder_paires(
+        moyenne_depuis_somme(agreger_passages_quantiles(df_passages))
     )
 
-    # Ajouter les parent_station pour chaque stop
-    stop_times["stop_parent_id"] = stop_times["stop_id"].map(mapping_parent)
+    print(f"✓ Statistiques calculées pour {len(stats_par_paire)} paires de stops")
 
-    # Trier par trip et séquence
-    stop_times = stop_times.sort_values(["trip_id", "stop_sequence"])
+    df_resultat = joindre_indicateurs_troncons(df_troncons_uniques, stats_par_paire)
 
-    print(f"✓ {len(stop_times)} stop_times à analyser")
+    # Trier par nombre de passages décroissant
+    df_resultat = df_resultat.sort_values(
+        "nombre_passages", ascending=False
+    ).reset_index(drop=True)
 
-    # Calculer les passages par paire de stops consécutifs
-    passages_list = []
+    print(f"✓ Fréquentation calculée pour {len(df_resultat)} tronçons uniques")
+    print(f"✓ Tronçons avec passages : {(df_resultat['nombre_passages'] > 0).sum()}")
 
-    for trip_id, groupe in stop_times.groupby("trip_id"):
-        groupe = groupe.sort_values("stop_sequence").reset_index(drop=True)
+    return df_resultat
 
-        for i in range(len(groupe) - 1):
-            depart = groupe.iloc[i]
-            arrivee = groupe.iloc[i + 1]
 
-            # Calculer le temps de parcours
-            temps_depart = convertir_temps_en_secondes(depart["departure_time"])
-            temps_arrivee = convertir_temps_en_secondes(arrivee["arrival_time"])
+def calculer_frequentation_troncons_multimodal(
+    feed,
+    df_troncons_uniques,
+    service_ids,
+    route_types=None,
+    tranches=None,
+    format_tranches="long",
+    index=None,
+):
+    """
+    Calcule en un seul passage la fréquentation et la vitesse moyenne
+    des tronçons uniques de tous les modes
 
-            if temps_depart is not None and temps_arrivee is not None:
-                duree_secondes = temps_arrivee - temps_depart
+    Parameters:
+    -----------
+    feed : gtfs_kit Feed object
+        Le feed GTFS chargé
+    df_troncons_uniques : DataFrame
+        Table des tronçons uniques multimodale, avec une colonne route_type
+        (voir creer_troncons_uniques_multimodal)
+    service_ids : list
+        Liste des service_id actifs pour la date analysée
+    route_types : list[int]
+        Types de route à traiter (défaut : ceux présents dans df_troncons_uniques)
+    tranches : str, int ou dict
+        Découpage de la journée en tranches horaires (voir
+        calculer_frequentation_par_tranche), défaut : journée entière
+    format_tranches : str
+        Format du résultat par tranche : "long" ou "large"
+    index : IndexParcours
+        Index des parcours du feed (défaut : obtenir_index_parcours(feed))
 
-                if duree_secondes > 0:
-                    # Identifier le tronçon (tous sens confondus)
-                    parent_depart = depart["stop_parent_id"]
-                    parent_arrivee = arrivee["stop_parent_id"]
+    Returns:
+    --------
+    DataFrame avec fréquentation et vitesse moyenne par tronçon, trié par mode
+    puis par nombre de passages décroissant
+    """
+    print("\nCalcul de la fréquentation par tronçon unique (tous modes)...")
 
-                    # Créer une clé normalisée (ordre alphabétique pour regrouper les deux sens)
-                    stops_pair = tuple(sorted([parent_depart, parent_arrivee]))
+    if route_types is None:
+        route_types = sorted(df_troncons_uniques["route_type"].unique())
 
-                    passages_list.append(
-                        {
-                            "stop_pair": stops_pair,
-                            "stop_depart_parent": parent_depart,
-                            "stop_arrivee_parent": parent_arrivee,
-                            "duree_secondes": duree_secondes,
-                            "trip_id": trip_id,
-                        }
-                    )
+    # Construire les passages de tous les modes en une seule passe
+    index, df_passages = construire_passages(
+        feed, route_types, service_ids, index
+    )
 
-    print(f"✓ {len(passages_list)} passages détectés")
+    print(f"✓ {len(df_passages)} passages détectés")
 
-    if not passages_list:
+    if df_passages.empty:
         print("⚠ Aucun passage détecté")
         return None
 
-    df_passages = pd.DataFrame(passages_list)
+    if tranches is not None:
+        return calculer_frequentation_par_tranche(
+            index,
+            df_passages,
+            df_troncons_uniques,
+            tranches,
+            format_tranches,
+            cles=["route_type"],
+        )
 
-    # Agréger par paire de stops (tous sens confondus)
-    # On compte le nombre de passages et calcule la durée moyenne
-    stats_par_paire = (
-        df_passages.groupby("stop_pair")
-        .agg(
-            nombre_passages=("trip_id", "count"),
-            duree_moyenne_secondes=("duree_secondes", "mean"),
-            duree_min_secondes=("duree_secondes", "min"),
-            duree_max_secondes=("duree_secondes", "max"),
+    # Agréger par mode et par paire de stops (tous sens confondus)
+    stats_par_paire = index.decoder_paires(
+        moyenne_depuis_somme(
+            agreger_passages_quantiles(df_passages, cles=["route_type"])
         )
-        .reset_index()
     )
 
-    print(f"✓ Statistiques calculées pour {len(stats_par_paire)} paires de stops")
+    df_resultat = joindre_indicateurs_troncons(df_troncons_uniques, stats_par_paire)
 
-    # Préparer le matching avec df_troncons_uniques
-    # Créer la même clé normalisée dans df_troncons_uniques
-    df_troncons_uniques["stop_pair"] = df_troncons_uniques.apply(
-        lambda row: tuple(
-            sorted([row["stop_depart_parent_id"], row["stop_arrivee_parent_id"]])
-        ),
-        axis=1,
-    )
+    # Trier par mode puis par nombre de passages décroissant
+    df_resultat = df_resultat.sort_values(
+        ["route_type", "nombre_passages"], ascending=[True, False], kind="stable"
+    ).reset_index(drop=True)
 
-    # Joindre avec les statistiques
-    df_resultat = df_troncons_uniques.merge(stats_par_paire, on="stop_pair", how="left")
+    print(f"✓ Fréquentation calculée pour {len(df_resultat)} tronçons uniques")
+    print(f"✓ Tronçons avec passages : {(df_resultat['nombre_passages'] > 0).sum()}")
 
-    # Supprimer la colonne temporaire
-    df_resultat = df_resultat.drop(columns=["stop_pair"])
+    return df_resultat
 
-    # Calculer la distance si pas déjà présente
-    if "distance_km" not in df_resultat.columns:
-        df_resultat["distance_km"] = df_resultat.apply(
-            lambda row: calculer_distance_haversine(
-                row["lat_depart_parent"],
-                row["lon_depart_parent"],
-                row["lat_arrivee_parent"],
-                row["lon_arrivee_parent"],
-            ),
-            axis=1,
-        )
 
-    # Calculer la vitesse moyenne en km/h
-    df_resultat["vitesse_moyenne_kmh"] = df_resultat["distance_km"] / (
-        df_resultat["duree_moyenne_secondes"] / 3600
-    )
+def calculer_frequentation_troncons_periode(feed, df_troncons_uniques, dates, route_type):
+    """
+    Calcule la fréquentation et la vitesse moyenne de chaque tronçon unique
+    pour chacune des dates demandées.
 
-    # Calculer aussi vitesse min et max
-    df_resultat["vitesse_min_kmh"] = df_resultat["distance_km"] / (
-        df_resultat["duree_max_secondes"] / 3600
+    Les passages sont construits une seule fois pour tous les services,
+    puis agrégés par service : les indicateurs d'une date sont obtenus
+    en cumulant les statistiques des services actifs ce jour-là, et ses
+    quantiles en fusionnant leurs esquisses (voir src.quantiles).
+
+    Parameters:
+    -----------
+    feed : gtfs_kit Feed object
+        Le feed GTFS chargé
+    df_troncons_uniques : DataFrame
+        Table des tronçons uniques
+    dates : list[str]
+        Dates analysées au format 'YYYYMMDD' (voir src.calendrier.lister_dates)
+    route_type: int
+        Le type de route (0=tram, 3=bus, etc.)
+
+    Returns:
+    --------
+    DataFrame au format long : une ligne par date et par tronçon
+    """
+    dates = list(dates)
+    print(f"\nCalcul de la fréquentation par tronçon unique sur {len(dates)} date(s)...")
+
+    # Passages de tous les services, indépendants de la date
+    index, df_passages = construire_passages(feed, route_type)
+
+    print(f"✓ {len(df_passages)} passages détectés (tous services)")
+
+    if df_passages.empty:
+        print("⚠ Aucun passage détecté")
+        return None
+
+    stats_par_service = agreger_passages(df_passages, cles=["service_id"])
+    esquisse_par_service = esquisser(df_passages, ["service_id", "paire"])
+
+    # Cumul des statistiques des services actifs pour chaque date
+    services_par_date = obtenir_index_calendrier(feed).table_services_actifs(dates)
+    stats_par_paire = (
+        services_par_date.merge(stats_par_service, on="service_id")
+        .groupby(["date", "paire"], sort=False)
+        .agg(
+            nombre_passages=("nombre_passages", "sum"),
+            duree_somme_secondes=("duree_somme_secondes", "sum"),
+            duree_min_secondes=("duree_min_secondes", "min"),
+            duree_max_secondes=("duree_max_secondes", "max"),
+        )
+        .reset_index()
     )
 
-    df_resultat["vitesse_max_kmh"] = df_resultat["distance_km"] / (
-        df_resultat["duree_min_secondes"] / 3600
+    # Quantiles d'une date : fusion des esquisses des services actifs
+    esquisse_par_date = fusionner_esquisses(
+        [services_par_date.merge(esquisse_par_service, on="service_id")],
+        ["date", "paire"],
+    )
+    stats_par_paire = ajouter_quantiles_durees(
+        stats_par_paire, esquisse_par_date, cles=["date"]
     )
+    stats_par_paire = index.decoder_paires(moyenne_depuis_somme(stats_par_paire))
 
-    # Remplacer les NaN (tronçons sans passage) par 0
-    df_resultat["nombre_passages"] = (
-        df_resultat["nombre_passages"].fillna(0).astype(int)
+    df_resultat = joindre_indicateurs_troncons(
+        df_troncons_uniques, stats_par_paire, dates
     )
 
-    # Trier par nombre de passages décroissant
+    # Trier par date puis par nombre de passages décroissant
     df_resultat = df_resultat.sort_values(
-        "nombre_passages", ascending=False
+        ["date", "nombre_passages"], ascending=[True, False]
     ).reset_index(drop=True)
 
-    print(f"✓ Fréquentation calculée pour {len(df_resultat)} tronçons uniques")
-    print(f"✓ Tronçons avec passages : {(df_resultat['nombre_passages'] > 0).sum()}")
+    print(f"✓ Fréquentation calculée pour {len(dates)} date(s)")
 
     return df_resultat
 
@@ -272,13 +607,87 @@ def compute_indicateurs_troncons(
     return indicateurs_bus_gdf, indicateurs_tram_gdf
 
 
+def compute_indicateurs_troncons_multimodal(
+    feed, active_service_ids: list[str], reference_troncons_uniques=None, index=None
+):
+    """
+    Réalise le calcul des indicateurs par tronçon de tous les modes du feed
+    pour une date d'analyse donnée
+    Args:
+        feed: gtfs_kit Feed object
+            Le feed GTFS chargé
+        active_service_ids: list[str]: Liste des services actifs à la date choisie
+        reference_troncons_uniques (pd.DataFrame):
+            Table des tronçons uniques multimodale (défaut : calculée
+            avec creer_troncons_uniques_multimodal)
+        index (IndexParcours): Index des parcours du feed (défaut :
+            obtenir_index_parcours(feed))
+
+    Returns:
+        GeoDataFrame des indicateurs, avec les colonnes route_type et mode
+        (None si aucun passage ce jour-là)
+    """
+    if reference_troncons_uniques is None:
+        reference_troncons_uniques = creer_troncons_uniques_multimodal(
+            feed, index=index
+        )
+
+    indicateurs = calculer_frequentation_troncons_multimodal(
+        feed, reference_troncons_uniques, active_service_ids, index=index
+    )
+    if indicateurs is None:
+        return None
+
+    return gpd.GeoDataFrame(indicateurs, geometry="geometry", crs="EPSG:4326")
+
+
+def compute_indicateurs_troncons_periode(
+    feed,
+    dates: list[str],
+    reference_troncons_uniques_bus: pd.DataFrame,
+    reference_troncons_uniques_tram: pd.DataFrame,
+):
+    """
+    Réalise le calcul des indicateurs par tronçon pour plusieurs dates d'analyse
+    Args:
+        feed: gtfs_kit Feed object
+            Le feed GTFS chargé
+        dates: list[str]: Dates analysées au format 'YYYYMMDD'
+        reference_troncons_uniques_bus (pd.DataFrame):
+            Table des tronçons uniques bus
+        reference_troncons_uniques_tram (pd.DataFrame):
+            Table des tronçons uniques tram
+
+    Returns:
+        Tuple de GeoDataFrame au format long, avec une colonne date :
+        (indicateurs_bus, indicateurs_tram)
+    """
+    indicateurs_bus = calculer_frequentation_troncons_periode(
+        feed, reference_troncons_uniques_bus, dates, route_type=3  # Bus
+    )
+
+    indicateurs_tram = calculer_frequentation_troncons_periode(
+        feed, reference_troncons_uniques_tram, dates, route_type=0  # Tram
+    )
+
+    indicateurs_bus_gdf = gpd.GeoDataFrame(
+        indicateurs_bus, geometry="geometry", crs="EPSG:4326"
+    )
+
+    indicateurs_tram_gdf = gpd.GeoDataFrame(
+        indicateurs_tram, geometry="geometry", crs="EPSG:4326"
+    )
+
+    return indicateurs_bus_gdf, indicateurs_tram_gdf
+
+
 # =============================================================================
 # EXEMPLE D'UTILISATION
 # =============================================================================
 
 if __name__ == "__main__":
-    from src.create_troncons_uniques import creer_troncons_uniques
-    from src.utils import exporter_geojson, exporter_df_to_csv, exporter_gdf_to_csv
+    from src.exports import exporter_geoparquet
+    from src.utils import decrire_mode, exporter_geojson, exporter_gdf_to_csv
 
     date_calcul = "20251123"
 
@@ -287,27 +696,22 @@ if __name__ == "__main__":
     feed = charger_gtfs()
     active_service_ids = obtenir_service_ids_pour_date(feed, date_calcul)
 
-    # Charger la table des tronçons uniques
-    df_troncons_uniques_bus = creer_troncons_uniques(feed, route_type=3)
-    df_troncons_uniques_tram = creer_troncons_uniques(feed, route_type=0)
-
-    # Calcul des indicateurs
-    indicateurs_bus, indicateurs_tram = compute_indicateurs_troncons(
-        feed, active_service_ids, df_troncons_uniques_bus, df_troncons_uniques_tram
-    )
+    # Tronçons uniques et indicateurs de tous les modes, en une passe
+    indicateurs = compute_indicateurs_troncons_multimodal(feed, active_service_ids)
 
-    # Export en csv
-    exporter_gdf_to_csv(
-        indicateurs_bus, f"output/indicateurs_troncons_bus_{date_calcul}.csv"
-    )
-    exporter_gdf_to_csv(
-        indicateurs_tram, f"output/indicateurs_troncons_tram_{date_calcul}.csv"
+    # Export de tous les modes en un seul GeoParquet compressé
+    exporter_geoparquet(
+        indicateurs, f"output/indicateurs_troncons_{date_calcul}.parquet"
     )
 
-    # Export en geojson
-    exporter_geojson(
-        indicateurs_bus, f"output/indicateurs_troncons_bus_{date_calcul}.geojson"
-    )
-    exporter_geojson(
-        indicateurs_tram, f"output/indicateurs_troncons_tram_{date_calcul}.geojson"
-    )
+    # Export en csv et en geojson, un fichier par mode
+    for route_type, indicateurs_mode in indicateurs.groupby("route_type"):
+        code = decrire_mode(route_type)["code"]
+        indicateurs_mode = indicateurs_mode.drop(columns=["route_type", "mode"])
+        exporter_gdf_to_csv(
+            indicateurs_mode, f"output/indicateurs_troncons_{code}_{date_calcul}.csv"
+        )
+        exporter_geojson(
+            indicateurs_mode,
+            f"output/indicateurs_troncons_{code}_{date_calcul}.geojson",
+        )
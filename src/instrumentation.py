@@ -0,0 +1,290 @@
+"""
+Mesure des étapes du traitement (durée, volumes, mémoire)
+Les fonctions de src/ encadrent leurs étapes (chargement, calendrier,
+empreintes, filtre des trips, jointure, tri, appariement, agrégation,
+quantiles, enrichissement, géométrie, carte, export) par le gestionnaire
+de contexte etape(). Hors d'une collecte, une étape ne coûte rien ; dans
+une collecte ouverte par collecter_etapes(), chaque étape enregistre sa
+durée, ses nombres de lignes en entrée et en sortie et sa consommation
+mémoire, émises aussi en logs structurés (JSON) sur le logger "src.etapes".
+
+Exemple :
+    with collecter_etapes() as collecte:
+        feed = charger_gtfs(zip_path)
+        calculer_indicateurs_arrets(feed, service_ids, date_str)
+    print(collecte.tableau())
+"""
+
+import functools
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure de la mémoire résidente
+    resource = None
+
+
+# Logger des mesures d'étapes (une ligne JSON par étape terminée)
+journal = logging.getLogger("src.etapes")
+
+# Collecte en cours dans le contexte d'exécution (thread, session Streamlit)
+_collecte_courante = ContextVar("collecte_etapes", default=None)
+
+# ru_maxrss est en kilo-octets sous Linux, en octets sous macOS
+_UNITE_RSS = 1 if sys.platform == "darwin" else 1024
+
+
+def _rss_max_mo():
+    """
+    Pic de mémoire résidente du processus depuis son démarrage, en Mo
+    (None si le module resource est indisponible, ex: sous Windows)
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _UNITE_RSS / 2**20
+
+
+def _arrondir(valeur):
+    """
+    Arrondit une mesure en Mo (None conservé)
+    """
+    return None if valeur is None else round(valeur, 3)
+
+
+class CollecteEtapes:
+    """
+    Mesures des étapes exécutées pendant une collecte
+
+    Attributes:
+        mesures (list[dict]): Une mesure par étape terminée, dans l'ordre de
+            fin : etape, chemin (étapes englobantes séparées par "/"),
+            niveau, debut_s (depuis le début de la collecte), duree_s,
+            lignes_entree, lignes_sortie, memoire_pic_mo et rss_max_mo
+        suivre_memoire (bool): Pic de mémoire mesuré par tracemalloc
+    """
+
+    def __init__(self, suivre_memoire=False):
+        self.mesures = []
+        self.suivre_memoire = suivre_memoire
+        self.debut = time.perf_counter()
+        self._pile = []
+
+    def __len__(self):
+        return len(self.mesures)
+
+    def tableau(self):
+        """
+        Mesures au format DataFrame, dans l'ordre de début des étapes
+        """
+        colonnes = [
+            "etape",
+            "chemin",
+            "niveau",
+            "debut_s",
+            "duree_s",
+            "lignes_entree",
+            "lignes_sortie",
+            "memoire_pic_mo",
+            "rss_max_mo",
+        ]
+        if not self.mesures:
+            return pd.DataFrame(columns=colonnes)
+        return (
+            pd.DataFrame(self.mesures, columns=colonnes)
+            .astype(
+                {
+                    "lignes_entree": "Int64",
+                    "lignes_sortie": "Int64",
+                    "memoire_pic_mo": "float64",
+                    "rss_max_mo": "float64",
+                }
+            )
+            .sort_values("debut_s", kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def synthese(self):
+        """
+        Nombre d'appels, durée totale, plus grand volume en sortie et pic
+        de mémoire par étape, toutes occurrences confondues
+        """
+        tableau = self.tableau()
+        return (
+            tableau.groupby("etape", sort=False)
+            .agg(
+                appels=("duree_s", "size"),
+                duree_s=("duree_s", "sum"),
+                lignes_sortie=("lignes_sortie", "max"),
+                memoire_pic_mo=("memoire_pic_mo", "max"),
+            )
+            .reset_index()
+        )
+
+    def _ouvrir(self, nom, lignes_entree):
+        if self.suivre_memoire:
+            # Le pic de l'étape englobante doit survivre à la remise à zéro
+            courante, pic = tracemalloc.get_traced_memory()
+            if self._pile:
+                self._pile[-1]["pic_octets"] = max(self._pile[-1]["pic_octets"], pic)
+            tracemalloc.reset_peak()
+        else:
+            courante = 0
+        cadre = {
+            "etape": nom,
+            "chemin": "/".join([c["etape"] for c in self._pile] + [nom]),
+            "niveau": len(self._pile),
+            "debut": time.perf_counter(),
+            "lignes_entree": lignes_entree,
+            "lignes_sortie": None,
+            "memoire_debut": courante,
+            "pic_octets": 0,
+            "rss_debut_mo": _rss_max_mo(),
+        }
+        self._pile.append(cadre)
+        return cadre
+
+    def _fermer(self, cadre):
+        fin = time.perf_counter()
+        self._pile.remove(cadre)
+
+        if self.suivre_memoire:
+            pic = max(cadre["pic_octets"], tracemalloc.get_traced_memory()[1])
+            memoire_pic_mo = (pic - cadre["memoire_debut"]) / 2**20
+            if self._pile:
+                self._pile[-1]["pic_octets"] = max(self._pile[-1]["pic_octets"], pic)
+        else:
+            # Sans tracemalloc : hausse du pic de mémoire résidente du processus
+            # pendant l'étape (0 si l'étape reste sous le pic déjà atteint)
+            rss_max_mo = _rss_max_mo()
+            memoire_pic_mo = (
+                None if rss_max_mo is None else rss_max_mo - cadre["rss_debut_mo"]
+            )
+
+        mesure = {
+            "etape": cadre["etape"],
+            "chemin": cadre["chemin"],
+            "niveau": cadre["niveau"],
+            "debut_s": round(cadre["debut"] - self.debut, 6),
+            "duree_s": round(fin - cadre["debut"], 6),
+            "lignes_entree": cadre["lignes_entree"],
+            "lignes_sortie": cadre["lignes_sortie"],
+            "memoire_pic_mo": _arrondir(memoire_pic_mo),
+            "rss_max_mo": _arrondir(_rss_max_mo()),
+        }
+        self.mesures.append(mesure)
+        journal.info(json.dumps(mesure, ensure_ascii=False))
+
+
+class _MesureEtape:
+    """
+    Mesure en cours, renvoyée par etape() : permet de renseigner
+    les nombres de lignes une fois connus
+    """
+
+    def __init__(self, cadre):
+        self._cadre = cadre
+
+    @property
+    def lignes_entree(self):
+        return self._cadre["lignes_entree"]
+
+    @lignes_entree.setter
+    def lignes_entree(self, valeur):
+        self._cadre["lignes_entree"] = None if valeur is None else int(valeur)
+
+    @property
+    def lignes_sortie(self):
+        return self._cadre["lignes_sortie"]
+
+    @lignes_sortie.setter
+    def lignes_sortie(self, valeur):
+        self._cadre["lignes_sortie"] = None if valeur is None else int(valeur)
+
+
+@contextmanager
+def etape(nom, lignes_entree=None):
+    """
+    Encadre une étape du traitement. Hors collecte, ne mesure rien.
+
+    Args:
+        nom (str): Nom de l'étape (chargement, calendrier, empreintes,
+            filtre_trips, jointure, tri, appariement, agregation,
+            quantiles, enrichissement, geometrie, carte, export)
+        lignes_entree (int): Nombre de lignes traitées en entrée
+    Yields:
+        Objet dont on peut renseigner lignes_entree et lignes_sortie
+    """
+    collecte = _collecte_courante.get()
+    cadre = {"lignes_entree": lignes_entree, "lignes_sortie": None}
+    if collecte is None:
+        yield _MesureEtape(cadre)
+        return
+
+    cadre = collecte._ouvrir(nom, None)
+    mesure = _MesureEtape(cadre)
+    mesure.lignes_entree = lignes_entree
+    try:
+        yield mesure
+    finally:
+        collecte._fermer(cadre)
+
+
+def _nombre_lignes(objet):
+    """
+    Nombre de lignes d'une table (None pour les autres objets)
+    """
+    return len(objet) if hasattr(objet, "shape") else None
+
+
+def mesurer_etape(nom):
+    """
+    Décorateur : chaque appel de la fonction est une étape (voir etape),
+    dont les lignes en entrée sont celles du premier argument et les lignes
+    en sortie celles du résultat, lorsque ce sont des tables
+    """
+
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        def fonction_mesuree(*args, **kwargs):
+            entree = _nombre_lignes(args[0]) if args else None
+            with etape(nom, lignes_entree=entree) as mesure:
+                resultat = fonction(*args, **kwargs)
+                mesure.lignes_sortie = _nombre_lignes(resultat)
+            return resultat
+
+        return fonction_mesuree
+
+    return decorateur
+
+
+@contextmanager
+def collecter_etapes(suivre_memoire=False):
+    """
+    Collecte les mesures des étapes exécutées dans le bloc
+
+    Args:
+        suivre_memoire (bool): Mesurer le pic de mémoire de chaque étape avec
+            tracemalloc (précis mais ralentit nettement les calculs) ; sinon,
+            la hausse du pic de mémoire résidente du processus est relevée
+    Yields:
+        CollecteEtapes
+    """
+    collecte = CollecteEtapes(suivre_memoire)
+    demarre = suivre_memoire and not tracemalloc.is_tracing()
+    if demarre:
+        tracemalloc.start()
+    jeton = _collecte_courante.set(collecte)
+    try:
+        yield collecte
+    finally:
+        _collecte_courante.reset(jeton)
+        if demarre:
+            tracemalloc.stop()
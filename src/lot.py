@@ -0,0 +1,502 @@
+"""
+Traitement par lot de réseaux GTFS (ligne de commande)
+Pour chaque zip et chaque date, calcule les indicateurs par arrêt et par
+tronçon (tous modes) sur un pool de processus, et les écrit dans
+l'arborescence <sortie>/<reseau>/<date>/. Un manifeste (manifeste.json)
+conserve, pour chaque tâche, l'empreinte du zip, les options, les fichiers
+produits et les durées par étape : une tâche dont le zip et les options
+n'ont pas changé et dont les sorties existent n'est pas recalculée. Avec
+--differentiel, si le zip a changé et que sa version précédente est encore
+dans le cache disque, seuls les arrêts et tronçons affectés par les
+différences entre les deux versions sont recalculés (voir src.differentiel).
+
+Le recalcul complet reste le mode par défaut : il réutilise l'index des
+parcours et les tronçons de référence du processus pour toutes les dates
+d'un zip, et il est au moins aussi rapide sur les réseaux mesurés (voir
+src.differentiel pour les cas où la mise à jour est intéressante).
+
+Exemples :
+    uv run -m src.lot data/ --dates 20251021 20251123
+    uv run -m src.lot reseaux/*.zip --dates 20251021 --format geojson --processus 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import geopandas as gpd
+import pandas as pd
+
+from src.arrets import calculer_indicateurs_arrets
+from src.cache import calculer_empreinte_zip
+from src.create_troncons_uniques import creer_troncons_uniques_multimodal
+from src.differentiel import mettre_a_jour_indicateurs
+from src.execution import obtenir_feed_du_processus
+from src.exports import exporter
+from src.indicateurs_troncons import compute_indicateurs_troncons_multimodal
+from src.instrumentation import collecter_etapes
+from src.utils import (
+    charger_gtfs,
+    charger_gtfs_du_cache,
+    charger_troncons,
+    obtenir_service_ids_pour_date,
+)
+
+
+# Dossier racine des sorties
+DOSSIER_SORTIE = "output"
+
+# Nom du manifeste, à la racine du dossier de sortie
+FICHIER_MANIFESTE = "manifeste.json"
+
+# Version des sorties : à incrémenter si leur contenu change (tout est recalculé)
+VERSION_LOT = 1
+
+# Extension des fichiers produits selon le format demandé
+EXTENSIONS_SORTIE = {
+    "parquet": ".parquet",
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "geojson": ".geojson",
+    "fgb": ".fgb",
+}
+
+# Tronçons de référence déjà calculés dans le processus courant (par zip)
+_troncons_uniques = {}
+
+# Versions précédentes des feeds, relues du cache dans le processus courant
+_feeds_precedents = {}
+
+
+def lister_zips(chemins):
+    """
+    Liste les zips GTFS à traiter
+    Args:
+        chemins (list[str]): Zips ou dossiers (tous les .zip du dossier)
+    Returns:
+        list[str]: Chemins des zips, sans doublon, dans l'ordre fourni
+    """
+    zips = []
+    for chemin in chemins:
+        if os.path.isdir(chemin):
+            zips.extend(
+                os.path.join(chemin, nom)
+                for nom in sorted(os.listdir(chemin))
+                if nom.lower().endswith(".zip")
+            )
+        elif os.path.isfile(chemin):
+            zips.append(chemin)
+        else:
+            print(f"⚠ Chemin ignoré (introuvable) : {chemin}")
+    return list(dict.fromkeys(zips))
+
+
+def nom_reseau(zip_path):
+    """
+    Nom du réseau d'un zip (nom du fichier sans extension), utilisé comme
+    dossier de sortie et dans les clés du manifeste
+    """
+    return os.path.splitext(os.path.basename(zip_path))[0]
+
+
+def verifier_noms_reseaux(zips):
+    """
+    Vérifie que deux zips du lot n'ont pas le même nom de réseau : leurs
+    sorties et leurs entrées du manifeste s'écraseraient mutuellement
+    (ex: a/gtfs.zip et b/gtfs.zip)
+    Args:
+        zips (list[str]): Chemins des zips
+    Raises:
+        ValueError: Si plusieurs zips ont le même nom de réseau
+    """
+    par_reseau = {}
+    for zip_path in zips:
+        par_reseau.setdefault(nom_reseau(zip_path), []).append(zip_path)
+    doublons = {
+        reseau: chemins for reseau, chemins in par_reseau.items() if len(chemins) > 1
+    }
+    if doublons:
+        raise ValueError(
+            "Plusieurs zips ont le même nom de réseau, à renommer : "
+            + " ; ".join(
+                f"{reseau} ({', '.join(chemins)})"
+                for reseau, chemins in doublons.items()
+            )
+        )
+
+
+def chemins_sorties(dossier_sortie, reseau, date_str, format_sortie):
+    """
+    Fichiers produits par une tâche
+    Returns:
+        dict {"arrets": chemin, "troncons": chemin}
+    """
+    extension = EXTENSIONS_SORTIE[format_sortie]
+    dossier = os.path.join(dossier_sortie, reseau, date_str)
+    return {
+        "arrets": os.path.join(dossier, f"indicateurs_arrets{extension}"),
+        "troncons": os.path.join(dossier, f"indicateurs_troncons{extension}"),
+    }
+
+
+def lire_manifeste(dossier_sortie=DOSSIER_SORTIE):
+    """
+    Relit le manifeste du dossier de sortie (vide s'il n'existe pas)
+    """
+    chemin = os.path.join(dossier_sortie, FICHIER_MANIFESTE)
+    if not os.path.exists(chemin):
+        return {"version": VERSION_LOT, "taches": {}}
+    with open(chemin, encoding="utf-8") as fichier:
+        return json.load(fichier)
+
+
+def ecrire_manifeste(manifeste, dossier_sortie=DOSSIER_SORTIE):
+    """
+    Écrit le manifeste (remplacement atomique : un lot interrompu laisse
+    toujours un manifeste lisible)
+    """
+    os.makedirs(dossier_sortie, exist_ok=True)
+    chemin = os.path.join(dossier_sortie, FICHIER_MANIFESTE)
+    with open(chemin + ".tmp", "w", encoding="utf-8") as fichier:
+        json.dump(manifeste, fichier, indent=2, ensure_ascii=False)
+    os.replace(chemin + ".tmp", chemin)
+
+
+def est_a_jour(entree, empreinte, options):
+    """
+    Indique si une tâche du manifeste est à jour : même zip, mêmes options,
+    calcul terminé et fichiers produits toujours présents
+    """
+    return (
+        entree is not None
+        and entree.get("empreinte") == empreinte
+        and entree.get("options") == options
+        and entree.get("statut") in ("ok", "aucun_service")
+        and all(os.path.exists(chemin) for chemin in entree.get("sorties", []))
+    )
+
+
+def _troncons_reference(zip_path, compact):
+    """
+    Tronçons de référence de tous les modes d'un zip, calculés une seule
+    fois par processus
+    """
+    cle = (zip_path, compact)
+    if cle not in _troncons_uniques:
+        if len(_troncons_uniques) >= 2:
+            del _troncons_uniques[next(iter(_troncons_uniques))]
+        _troncons_uniques[cle] = creer_troncons_uniques_multimodal(
+            obtenir_feed_du_processus(zip_path, compact)
+        )
+    return _troncons_uniques[cle]
+
+
+def _feed_precedent(empreinte, compact):
+    """
+    Version précédente d'un feed, relue une seule fois par processus depuis
+    le cache disque (None si elle n'y est plus)
+    """
+    cle = (empreinte, compact)
+    if cle not in _feeds_precedents:
+        if len(_feeds_precedents) >= 2:
+            del _feeds_precedents[next(iter(_feeds_precedents))]
+        _feeds_precedents[cle] = charger_gtfs_du_cache(empreinte, compact)
+    return _feeds_precedents[cle]
+
+
+def executer_tache_lot(tache):
+    """
+    Calcule et écrit les indicateurs d'une tâche (zip, date)
+
+    Parameters:
+    -----------
+    tache : dict
+        zip_path, date, reseau, sorties (voir chemins_sorties), compact et
+        empreinte_precedente (zip des sorties existantes, pour un recalcul
+        différentiel ; None pour un calcul complet)
+
+    Returns:
+    --------
+    dict : statut ("ok", "aucun_service" ou "erreur"), mode ("complet" ou
+    "differentiel"), fichiers produits, durée totale, durées et volumes par
+    étape, message d'erreur éventuel
+    """
+    debut = time.perf_counter()
+    resultat = {"statut": "ok", "mode": "complet", "sorties": [], "erreur": None}
+    zip_path, date_str, compact = tache["zip_path"], tache["date"], tache["compact"]
+
+    with collecter_etapes() as collecte:
+        try:
+            feed = obtenir_feed_du_processus(zip_path, compact)
+
+            # Version précédente du zip encore en cache : seuls les arrêts et
+            # tronçons affectés par ses différences sont recalculés
+            ancien = None
+            if tache.get("empreinte_precedente"):
+                ancien = _feed_precedent(tache["empreinte_precedente"], compact)
+            if ancien is not None:
+                resultat["mode"] = "differentiel"
+                arrets, troncons = mettre_a_jour_indicateurs(
+                    ancien,
+                    feed,
+                    date_str,
+                    charger_troncons(tache["sorties"]["arrets"]),
+                    charger_troncons(tache["sorties"]["troncons"]),
+                )
+            else:
+                service_ids = obtenir_service_ids_pour_date(feed, date_str)
+                arrets = calculer_indicateurs_arrets(feed, service_ids, date_str)
+                troncons = None
+                if service_ids:
+                    troncons = compute_indicateurs_troncons_multimodal(
+                        feed, service_ids, _troncons_reference(zip_path, compact)
+                    )
+                if arrets is not None:
+                    points = gpd.points_from_xy(arrets["stop_lon"], arrets["stop_lat"])
+                    arrets = gpd.GeoDataFrame(arrets, geometry=points, crs="EPSG:4326")
+
+            if arrets is None and troncons is None:
+                resultat["statut"] = "aucun_service"
+            if arrets is not None:
+                exporter(arrets, tache["sorties"]["arrets"])
+                resultat["sorties"].append(tache["sorties"]["arrets"])
+                resultat["nb_arrets"] = len(arrets)
+            if troncons is not None:
+                exporter(troncons, tache["sorties"]["troncons"])
+                resultat["sorties"].append(tache["sorties"]["troncons"])
+                resultat["nb_troncons"] = len(troncons)
+        except Exception as erreur:
+            resultat["statut"] = "erreur"
+            resultat["erreur"] = f"{type(erreur).__name__}: {erreur}"
+            resultat["trace"] = traceback.format_exc()
+
+    synthese = collecte.synthese()
+    resultat["duree_s"] = round(time.perf_counter() - debut, 3)
+    resultat["etapes"] = {
+        ligne.etape: {
+            "appels": int(ligne.appels),
+            "duree_s": round(float(ligne.duree_s), 3),
+            "memoire_pic_mo": (
+                None
+                if pd.isna(ligne.memoire_pic_mo)
+                else round(float(ligne.memoire_pic_mo), 1)
+            ),
+        }
+        for ligne in synthese.itertuples()
+    }
+    resultat["pid"] = os.getpid()
+    return resultat
+
+
+def executer_lot(
+    chemins,
+    dates,
+    dossier_sortie=DOSSIER_SORTIE,
+    format_sortie="parquet",
+    nb_processus=None,
+    compact=True,
+    forcer=False,
+    differentiel=False,
+):
+    """
+    Traite un lot de zips GTFS et de dates sur un pool de processus
+
+    Parameters:
+    -----------
+    chemins : list[str]
+        Zips GTFS ou dossiers contenant des zips, de noms distincts (le nom
+        du zip désigne le réseau, voir verifier_noms_reseaux)
+    dates : list[str]
+        Dates au format 'YYYYMMDD'
+    dossier_sortie : str
+        Racine de l'arborescence <reseau>/<date>/ et du manifeste
+    format_sortie : str
+        Format des fichiers produits (voir EXTENSIONS_SORTIE)
+    nb_processus : int
+        Nombre de processus (défaut : nombre de cœurs). 1 = exécution
+        séquentielle dans le processus courant
+    compact : bool
+        Chargement compact des feeds (voir charger_gtfs)
+    forcer : bool
+        Recalculer toutes les tâches, même à jour
+    differentiel : bool
+        Mettre à jour les sorties d'un zip modifié en ne recalculant que
+        les éléments affectés, si sa version précédente est en cache
+        (défaut : recalcul complet)
+
+    Returns:
+    --------
+    dict : Manifeste mis à jour
+    """
+    if format_sortie not in EXTENSIONS_SORTIE:
+        raise ValueError(
+            f"Format inconnu : {format_sortie!r} "
+            f"(attendu : {', '.join(EXTENSIONS_SORTIE)})"
+        )
+    debut_lot = time.perf_counter()
+    nb_processus = nb_processus or os.cpu_count() or 1
+    options = {"version": VERSION_LOT, "format": format_sortie, "compact": compact}
+
+    zips = lister_zips(chemins)
+    verifier_noms_reseaux(zips)
+    manifeste = lire_manifeste(dossier_sortie)
+    taches_manifeste = manifeste.setdefault("taches", {})
+
+    # 1. Tâches à calculer : zip modifié, options changées ou sorties manquantes
+    taches, nb_a_jour = [], 0
+    for zip_path in zips:
+        empreinte = calculer_empreinte_zip(zip_path)
+        reseau = nom_reseau(zip_path)
+        for date_str in dates:
+            cle = f"{reseau}/{date_str}"
+            if not forcer and est_a_jour(
+                taches_manifeste.get(cle), empreinte, options
+            ):
+                nb_a_jour += 1
+                continue
+            # Sorties complètes d'une version précédente du zip
+            precedente = taches_manifeste.get(cle)
+            empreinte_precedente = None
+            if (
+                differentiel
+                and not forcer
+                and precedente is not None
+                and precedente.get("statut") == "ok"
+                and precedente.get("options") == options
+                and precedente.get("empreinte") != empreinte
+                and len(precedente.get("sorties", [])) == 2
+                and all(os.path.exists(chemin) for chemin in precedente["sorties"])
+            ):
+                empreinte_precedente = precedente["empreinte"]
+            taches.append(
+                {
+                    "cle": cle,
+                    "zip_path": zip_path,
+                    "empreinte": empreinte,
+                    "reseau": reseau,
+                    "date": date_str,
+                    "compact": compact,
+                    "empreinte_precedente": empreinte_precedente,
+                    "sorties": chemins_sorties(
+                        dossier_sortie, reseau, date_str, format_sortie
+                    ),
+                }
+            )
+
+    print(
+        f"\n{len(zips)} réseau(x), {len(dates)} date(s) : "
+        f"{len(taches)} tâche(s) à calculer, {nb_a_jour} déjà à jour"
+    )
+
+    def enregistrer(tache, resultat):
+        taches_manifeste[tache["cle"]] = {
+            "zip": tache["zip_path"],
+            "empreinte": tache["empreinte"],
+            "date": tache["date"],
+            "options": options,
+            "termine_le": pd.Timestamp.now().isoformat(timespec="seconds"),
+            **resultat,
+        }
+        ecrire_manifeste(manifeste, dossier_sortie)
+        symbole = "✓" if resultat["statut"] != "erreur" else "⚠"
+        print(
+            f"{symbole} {tache['cle']} : {resultat['statut']} "
+            f"({resultat['mode']}) en {resultat['duree_s']:.1f} s"
+        )
+
+    # 2. Cache disque rempli une fois par zip, avant de lancer les processus
+    for zip_path in dict.fromkeys(tache["zip_path"] for tache in taches):
+        charger_gtfs(zip_path, compact=compact)
+
+    # 3. Exécution, tâches d'un même zip à la suite (feed réutilisé)
+    taches.sort(key=lambda tache: (tache["zip_path"], tache["date"]))
+    if nb_processus == 1 or len(taches) <= 1:
+        for tache in taches:
+            enregistrer(tache, executer_tache_lot(tache))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=nb_processus,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executeur:
+            futurs = {
+                executeur.submit(executer_tache_lot, tache): tache for tache in taches
+            }
+            for futur in as_completed(futurs):
+                enregistrer(futurs[futur], futur.result())
+
+    nb_erreurs = sum(
+        taches_manifeste[tache["cle"]]["statut"] == "erreur" for tache in taches
+    )
+    manifeste["version"] = VERSION_LOT
+    manifeste["dernier_lot"] = {
+        "date": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "duree_s": round(time.perf_counter() - debut_lot, 3),
+        "nb_processus": nb_processus,
+        "nb_taches": len(taches),
+        "nb_a_jour": nb_a_jour,
+        "nb_differentiels": sum(
+            taches_manifeste[tache["cle"]].get("mode") == "differentiel"
+            for tache in taches
+        ),
+        "nb_erreurs": nb_erreurs,
+    }
+    ecrire_manifeste(manifeste, dossier_sortie)
+
+    print(
+        f"\n✓ Lot terminé en {manifeste['dernier_lot']['duree_s']:.1f} s : "
+        f"{len(taches) - nb_erreurs} tâche(s) calculée(s), {nb_a_jour} ignorée(s)"
+    )
+    if nb_erreurs:
+        print(f"⚠ {nb_erreurs} tâche(s) en erreur (voir {FICHIER_MANIFESTE})")
+
+    return manifeste
+
+
+# =============================================================================
+# EXEMPLE D'UTILISATION
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Indicateurs par arrêt et par tronçon d'un lot de zips GTFS"
+    )
+    parser.add_argument("chemins", nargs="+", help="Zips GTFS ou dossiers de zips")
+    parser.add_argument(
+        "--dates", nargs="+", required=True, help="Dates au format YYYYMMDD"
+    )
+    parser.add_argument("--sortie", default=DOSSIER_SORTIE)
+    parser.add_argument(
+        "--format", default="parquet", choices=list(EXTENSIONS_SORTIE)
+    )
+    parser.add_argument("--processus", type=int, default=None)
+    parser.add_argument(
+        "--complet",
+        action="store_true",
+        help="Chargement complet des feeds (défaut : compact)",
+    )
+    parser.add_argument(
+        "--forcer", action="store_true", help="Recalculer les tâches à jour"
+    )
+    parser.add_argument(
+        "--differentiel",
+        action="store_true",
+        help="Mise à jour différentielle des zips modifiés (défaut : complet)",
+    )
+    arguments = parser.parse_args()
+
+    manifeste = executer_lot(
+        arguments.chemins,
+        arguments.dates,
+        dossier_sortie=arguments.sortie,
+        format_sortie=arguments.format,
+        nb_processus=arguments.processus,
+        compact=not arguments.complet,
+        forcer=arguments.forcer,
+        differentiel=arguments.differentiel,
+    )
+    if manifeste["dernier_lot"]["nb_erreurs"]:
+        raise SystemExit(1)
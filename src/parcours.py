@@ -0,0 +1,326 @@
+"""
+Parcours des trips GTFS (suites ordonnées de stations parent)
+Les trips d'un même route_type qui desservent la même suite de stations
+parent partagent un parcours. La topologie des tronçons (paires d'arrêts
+consécutifs, normalisées tous sens confondus) est calculée une seule fois
+par parcours ; le travail par trip se réduit aux horaires et au comptage.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.cache import conserver_sur_le_feed, lire_resultat_du_feed
+from src.instrumentation import etape
+from src.utils import ajouter_temps_en_secondes
+
+
+def stations_parent(stops):
+    """
+    Mapping stop_id -> parent_station (stop_id si l'arrêt n'a pas de parent)
+    Args:
+        stops (pd.DataFrame): Table des arrêts du feed
+    Returns:
+        pd.Series: parent_station indexée par stop_id, dans l'ordre de stops
+    """
+    stops = stops.copy()
+    if "parent_station" not in stops.columns:
+        stops["parent_station"] = stops["stop_id"]
+    stops["parent_station"] = stops["parent_station"].fillna(stops["stop_id"])
+    stops.loc[stops["parent_station"] == "", "parent_station"] = stops["stop_id"]
+    return stops.set_index("stop_id")["parent_station"]
+
+
+class IndexParcours:
+    """
+    Index des stop_times d'un feed, triés par (trip_id, stop_sequence),
+    et des parcours de ses trips.
+
+    L'index est le contexte d'analyse commun à tous les indicateurs (arrêts,
+    tronçons, profils horaires) : construit une fois par feed (voir
+    obtenir_index_parcours), il évite à chaque calcul de re-trier stop_times
+    ou de le re-joindre aux trips. Les identifiants y sont codés en entiers.
+
+    Un parcours est identifié par le hachage de la suite des stations parent
+    de ses trips (et de leur route_type). Ses segments (tronçons entre deux
+    arrêts consécutifs) sont numérotés une fois pour toutes : chaque stop_time
+    qui n'est pas le dernier de son trip pointe vers le segment qu'il ouvre.
+
+    Attributes:
+        stop_ids (np.ndarray): Identifiants des arrêts desservis, dans l'ordre
+            alphabétique
+        codes_stop (np.ndarray): Code de l'arrêt (indice dans stop_ids)
+            de chaque stop_time trié, -1 si stop_id est manquant
+        station_parent (pd.Series): Mapping stop_id -> station parent
+            (voir stations_parent)
+        parents (np.ndarray): Identifiants des stations parent, dans l'ordre
+            alphabétique (les codes d'arrêt sont des indices dans ce tableau)
+        trip_ids (np.ndarray): Identifiants des trips, dans l'ordre de tri
+        debut_trip (np.ndarray): Position du premier stop_time de chaque trip
+            (et nombre total de stop_times en dernière position)
+        codes_parent (np.ndarray): Code de la station parent (indice dans
+            parents) de chaque stop_time trié, -1 si inconnue
+        departs, arrivees (np.ndarray): Heures de départ et d'arrivée de
+            chaque stop_time trié, en secondes (NaN si manquantes)
+        lignes_stop_times (pd.Index): Étiquettes des lignes de feed.stop_times,
+            dans l'ordre de tri
+        route_type_trip (np.ndarray): route_type de chaque trip
+        service_id_trip (np.ndarray): service_id de chaque trip
+        route_ids (np.ndarray): Identifiants des lignes desservies
+        route_trip (np.ndarray): Ligne de chaque trip (indice dans route_ids)
+        parcours_trip (np.ndarray): Parcours de chaque trip
+        route_type_parcours (np.ndarray): route_type de chaque parcours
+        trip_representatif (np.ndarray): Premier trip de chaque parcours
+        segments (pd.DataFrame): Segments des parcours, dans l'ordre des
+            parcours puis des arrêts : parcours, route_type, ligne (position
+            du stop_time de départ sur le trip représentatif), code_depart,
+            code_arrivee, paire
+        paires (pd.DataFrame): Paires normalisées (code_min, code_max)
+            des segments, indexées par le code de paire
+    """
+
+    def __init__(self, feed):
+        # Temps en secondes (déjà présents si le feed vient de charger_gtfs)
+        ajouter_temps_en_secondes(feed)
+
+        with etape("jointure", lignes_entree=len(feed.stop_times)) as mesure:
+            trips = feed.trips[["trip_id", "route_id", "service_id"]].merge(
+                feed.routes[["route_id", "route_type"]], on="route_id"
+            )
+            stop_times = feed.stop_times[
+                ["trip_id", "stop_id", "stop_sequence", "arrival_s", "departure_s"]
+            ]
+            stop_times = stop_times[stop_times["trip_id"].isin(trips["trip_id"])]
+            mesure.lignes_sortie = len(stop_times)
+
+        with etape("tri", lignes_entree=len(stop_times)) as mesure:
+            stop_times = stop_times.sort_values(
+                ["trip_id", "stop_sequence"], kind="stable"
+            )
+            self.lignes_stop_times = stop_times.index
+            mesure.lignes_sortie = len(stop_times)
+
+        # 1. Trips dans l'ordre de tri, et position de leurs stop_times
+        codes_trip, self.trip_ids = pd.factorize(
+            np.asarray(stop_times["trip_id"], dtype=object)
+        )
+        self.debut_trip = np.searchsorted(
+            codes_trip, np.arange(len(self.trip_ids) + 1)
+        )
+        longueurs = np.diff(self.debut_trip)
+
+        infos_trips = trips.drop_duplicates("trip_id")
+        infos_trips = infos_trips.set_index(
+            pd.Index(np.asarray(infos_trips["trip_id"], dtype=object))
+        ).reindex(self.trip_ids)
+        self.route_type_trip = infos_trips["route_type"].to_numpy(dtype="int64")
+        self.service_id_trip = np.asarray(infos_trips["service_id"], dtype=object)
+        self.route_trip, self.route_ids = pd.factorize(
+            np.asarray(infos_trips["route_id"], dtype=object)
+        )
+
+        # 2. Codes des arrêts puis de leurs stations parent (ordre alphabétique,
+        # -1 si inconnue), le mapping n'étant appliqué qu'une fois par arrêt
+        self.codes_stop, self.stop_ids = pd.factorize(
+            np.asarray(stop_times["stop_id"], dtype=object), sort=True
+        )
+        self.station_parent = stations_parent(feed.stops)
+        parents_stops = pd.Series(self.stop_ids, dtype=object).map(
+            self.station_parent
+        )
+        codes_parent_stop, self.parents = pd.factorize(
+            np.asarray(parents_stops, dtype=object), sort=True
+        )
+        self.codes_parent = np.where(
+            self.codes_stop >= 0, codes_parent_stop[self.codes_stop], -1
+        )
+
+        self.departs = stop_times["departure_s"].to_numpy(
+            dtype="float64", na_value=np.nan
+        )
+        self.arrivees = stop_times["arrival_s"].to_numpy(
+            dtype="float64", na_value=np.nan
+        )
+
+        # 3 à 5. Parcours distincts et paires d'arrêts consécutifs
+        with etape("appariement", lignes_entree=len(self.trip_ids)) as mesure:
+            self._apparier(longueurs)
+            mesure.lignes_sortie = len(self.segments)
+
+    def _apparier(self, longueurs):
+        """
+        Regroupe les trips en parcours et numérote les segments des parcours
+        """
+        # 3. Parcours : hachage de la suite des stations parent de chaque trip
+        codes = self.codes_parent.astype("int64")
+        parcours = {}
+        self.parcours_trip = np.fromiter(
+            (
+                parcours.setdefault(
+                    (route_type, codes[debut:fin].tobytes()), len(parcours)
+                )
+                for route_type, debut, fin in zip(
+                    self.route_type_trip, self.debut_trip[:-1], self.debut_trip[1:]
+                )
+            ),
+            dtype="int64",
+            count=len(self.trip_ids),
+        )
+        nb_parcours = len(parcours)
+
+        # Trip représentatif de chaque parcours (le premier dans l'ordre de tri)
+        representant = np.full(nb_parcours, len(self.trip_ids), dtype="int64")
+        np.minimum.at(representant, self.parcours_trip, np.arange(len(self.trip_ids)))
+        self.trip_representatif = representant
+        self.route_type_parcours = self.route_type_trip[representant]
+
+        # 4. Segments de chaque parcours, lus sur son trip représentatif
+        nb_segments = np.maximum(longueurs[representant] - 1, 0)
+        self.debut_segments = np.concatenate([[0], np.cumsum(nb_segments)])
+        rang = np.arange(self.debut_segments[-1]) - np.repeat(
+            self.debut_segments[:-1], nb_segments
+        )
+        lignes = np.repeat(self.debut_trip[representant], nb_segments) + rang
+        code_depart = codes[lignes]
+        code_arrivee = codes[lignes + 1]
+
+        # Paires normalisées (tous sens confondus), -1 si une station est inconnue
+        code_min = np.minimum(code_depart, code_arrivee)
+        code_max = np.maximum(code_depart, code_arrivee)
+        connue = code_min >= 0
+        paire = np.full(len(code_min), -1, dtype="int64")
+        paire[connue], cles_paires = pd.factorize(
+            code_min[connue] * len(self.parents) + code_max[connue]
+        )
+        self.paires = pd.DataFrame(
+            {
+                "code_min": cles_paires // max(len(self.parents), 1),
+                "code_max": cles_paires % max(len(self.parents), 1),
+            }
+        )
+
+        self.segments = pd.DataFrame(
+            {
+                "parcours": np.repeat(np.arange(nb_parcours), nb_segments),
+                "route_type": np.repeat(self.route_type_parcours, nb_segments),
+                "ligne": lignes,
+                "code_depart": code_depart,
+                "code_arrivee": code_arrivee,
+                "paire": paire,
+            }
+        )
+
+        # 5. Segment ouvert par chaque stop_time (-1 pour le dernier arrêt d'un trip)
+        rang_ligne = np.arange(len(codes)) - np.repeat(self.debut_trip[:-1], longueurs)
+        self.segment_ligne = np.where(
+            rang_ligne < np.repeat(longueurs, longueurs) - 1,
+            np.repeat(self.debut_segments[self.parcours_trip], longueurs) + rang_ligne,
+            -1,
+        )
+
+    def __len__(self):
+        """Nombre de parcours distincts"""
+        return len(self.route_type_parcours)
+
+    def selectionner_trips(self, route_types=None, service_ids=None):
+        """
+        Sélectionne des trips par route_type et service_id
+        Args:
+            route_types (int | list[int]): Type(s) de route, None pour tous
+            service_ids (list[str]): Services à conserver, None pour tous
+        Returns:
+            np.ndarray: Masque booléen sur les trips
+        """
+        selection = np.ones(len(self.trip_ids), dtype=bool)
+        if route_types is not None:
+            route_types = [route_types] if np.isscalar(route_types) else route_types
+            selection &= np.isin(self.route_type_trip, [int(rt) for rt in route_types])
+        if service_ids is not None:
+            selection &= pd.Index(self.service_id_trip).isin(list(service_ids))
+        return selection
+
+    def lignes_selectionnees(self, selection):
+        """
+        Positions (dans l'ordre de tri) des stop_times des trips sélectionnés
+        Args:
+            selection (np.ndarray): Masque booléen sur les trips
+                (voir selectionner_trips)
+        Returns:
+            tuple (np.ndarray, np.ndarray): Positions des stop_times et indice
+            de leur trip
+        """
+        trip_ligne = np.repeat(np.arange(len(self.trip_ids)), np.diff(self.debut_trip))
+        lignes = np.flatnonzero(selection[trip_ligne])
+        return lignes, trip_ligne[lignes]
+
+    def passages(self, route_types=None, service_ids=None):
+        """
+        Passages des trips sélectionnés sur les segments de leur parcours,
+        en ne gardant que les durées valides (renseignées et > 0)
+        Args:
+            route_types (int | list[int]): Type(s) de route, None pour tous
+            service_ids (list[str]): Services à conserver, None pour tous
+        Returns:
+            pd.DataFrame: Une ligne par passage : trip (indice dans trip_ids),
+            route_type, service_id, paire (code de paire normalisée),
+            depart_s (heure de départ) et duree_secondes
+        """
+        selection = self.selectionner_trips(route_types, service_ids)
+        lignes_selectionnees = np.repeat(selection, np.diff(self.debut_trip))
+
+        duree = np.full(len(self.departs), np.nan)
+        duree[:-1] = self.arrivees[1:] - self.departs[:-1]
+
+        lignes = np.flatnonzero(
+            lignes_selectionnees & (self.segment_ligne >= 0) & (duree > 0)
+        )
+        paire = self.segments["paire"].to_numpy()[self.segment_ligne[lignes]]
+        lignes, paire = lignes[paire >= 0], paire[paire >= 0]
+
+        trip = np.searchsorted(self.debut_trip, lignes, side="right") - 1
+        return pd.DataFrame(
+            {
+                "trip": trip,
+                "route_type": self.route_type_trip[trip],
+                "service_id": self.service_id_trip[trip],
+                "paire": paire,
+                "depart_s": self.departs[lignes],
+                "duree_secondes": duree[lignes].astype("int64"),
+            }
+        )
+
+    def decoder_paires(self, df):
+        """
+        Remplace la colonne paire (code) par les identifiants des stations
+        parent de la paire : stop_pair_min, stop_pair_max
+        """
+        paires = self.paires.iloc[df["paire"].to_numpy()]
+        position = df.columns.get_loc("paire")
+        df = df.drop(columns=["paire"])
+        df.insert(position, "stop_pair_max", self.parents[paires["code_max"]])
+        df.insert(position, "stop_pair_min", self.parents[paires["code_min"]])
+        return df
+
+
+def obtenir_index_parcours(feed):
+    """
+    Retourne l'index des parcours du feed, construit au premier appel puis
+    conservé sur le feed. L'index est reconstruit si l'une des tables
+    utilisées (stop_times, trips, routes, stops) a été remplacée entre-temps.
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        IndexParcours
+    """
+    tables = [
+        getattr(feed, table) for table in ["stop_times", "trips", "routes", "stops"]
+    ]
+    index = lire_resultat_du_feed(feed, "_index_parcours", tables)
+    if index is None:
+        with etape("index_parcours", lignes_entree=len(feed.stop_times)) as mesure:
+            index = IndexParcours(feed)
+            mesure.lignes_sortie = len(index.lignes_stop_times)
+        conserver_sur_le_feed(feed, "_index_parcours", tables, index)
+        print(
+            f"✓ {len(index.trip_ids)} trips regroupés en {len(index)} parcours distincts"
+        )
+    return index
@@ -0,0 +1,161 @@
+"""
+Quantiles fusionnables des durées (esquisses par histogramme logarithmique)
+Une esquisse compte les valeurs entières par case : les valeurs sont gardées
+exactes jusqu'à 2^BITS_SIGNIFICATIFS - 1, puis arrondies à BITS_SIGNIFICATIFS
+bits significatifs (erreur relative inférieure à 0,4 %). Deux esquisses se
+fusionnent en additionnant les effectifs de leurs cases : les quantiles d'une
+période, d'un calcul par blocs ou de plusieurs processus se calculent sans
+conserver toutes les observations, et ne dépendent pas de l'ordre de fusion.
+
+Une esquisse est un DataFrame au format long : clés (ex: paire), case et
+effectif, une ligne par case non vide.
+
+Exemple :
+    esquisse = fusionner_esquisses(
+        [esquisser(bloc, ["paire"]) for bloc in blocs], ["paire"]
+    )
+    quantiles_esquisse(esquisse, ["paire"])
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Bits significatifs conservés : valeurs exactes jusqu'à 255 (secondes)
+BITS_SIGNIFICATIFS = 8
+
+# Quantiles calculés par défaut (suffixe de colonne : fraction)
+QUANTILES_DUREES = {"p10": 0.1, "p50": 0.5, "p90": 0.9}
+
+
+def _decalage(valeurs):
+    """
+    Nombre de bits de poids faible abandonnés pour chaque valeur
+    """
+    bits = np.zeros(len(valeurs), dtype="int64")
+    positives = valeurs > 0
+    bits[positives] = np.floor(np.log2(valeurs[positives])).astype("int64") + 1
+    return np.maximum(bits - BITS_SIGNIFICATIFS, 0)
+
+
+def case_esquisse(valeurs):
+    """
+    Case de chaque valeur : sa borne inférieure, après arrondi
+    à BITS_SIGNIFICATIFS bits significatifs
+    Args:
+        valeurs (array-like): Valeurs entières (ex: durées en secondes)
+    Returns:
+        np.ndarray: Case de chaque valeur (int64)
+    """
+    valeurs = np.asarray(valeurs, dtype="int64")
+    decalage = _decalage(valeurs)
+    return (valeurs >> decalage) << decalage
+
+
+def valeur_case(cases):
+    """
+    Valeur représentative de chaque case : le milieu des entiers qu'elle
+    contient (la valeur exacte pour les cases d'une seule valeur)
+    """
+    cases = np.asarray(cases, dtype="int64")
+    return cases + ((1 << _decalage(cases)) - 1) / 2
+
+
+def esquisser(df, cles, colonne="duree_secondes"):
+    """
+    Esquisse des valeurs d'une colonne, par clés
+    Args:
+        df (pd.DataFrame): Observations (ex: passages)
+        cles (list[str]): Colonnes identifiant une distribution (ex: paire)
+        colonne (str): Colonne des valeurs entières
+    Returns:
+        pd.DataFrame: Esquisse (clés, case, effectif)
+    """
+    cles = list(cles)
+    return (
+        df[cles]
+        .assign(case=case_esquisse(df[colonne]))
+        .groupby(cles + ["case"], sort=False)
+        .size()
+        .rename("effectif")
+        .reset_index()
+    )
+
+
+def fusionner_esquisses(esquisses, cles):
+    """
+    Fusionne des esquisses (blocs, services, processus) en additionnant
+    les effectifs de leurs cases, par clés
+    Args:
+        esquisses (list[pd.DataFrame]): Esquisses à fusionner
+        cles (list[str]): Clés de l'esquisse fusionnée (les autres colonnes
+            des esquisses sont confondues)
+    Returns:
+        pd.DataFrame: Esquisse (clés, case, effectif)
+    """
+    cles = list(cles)
+    return (
+        pd.concat([esquisse[cles + ["case", "effectif"]] for esquisse in esquisses])
+        .groupby(cles + ["case"], sort=False)["effectif"]
+        .sum()
+        .reset_index()
+    )
+
+
+def quantiles_esquisse(
+    esquisse, cles, quantiles=QUANTILES_DUREES, modele="duree_{}_secondes"
+):
+    """
+    Quantiles de chaque distribution d'une esquisse (méthode de l'inverse de
+    la fonction de répartition : la plus petite valeur dont le rang atteint
+    la fraction demandée, comme np.quantile(method="inverted_cdf"))
+    Args:
+        esquisse (pd.DataFrame): Esquisse (voir esquisser)
+        cles (list[str]): Clés identifiant une distribution
+        quantiles (dict): {suffixe: fraction} (voir QUANTILES_DUREES)
+        modele (str): Nom des colonnes, {} étant remplacé par le suffixe
+    Returns:
+        pd.DataFrame: Une ligne par distribution : clés, puis une colonne
+        par quantile
+    """
+    cles = list(cles)
+    esquisse = esquisse.sort_values(cles + ["case"], kind="stable")
+    cumul = np.cumsum(esquisse["effectif"].to_numpy(dtype="int64"))
+    valeurs = valeur_case(esquisse["case"].to_numpy())
+
+    # Première ligne et effectif total de chaque distribution (lignes contiguës)
+    debuts = np.flatnonzero(~esquisse.duplicated(cles).to_numpy())
+    cumul_avant = np.concatenate(([0], cumul))[debuts]
+    total = np.append(cumul[debuts[1:] - 1], cumul[-1:]) - cumul_avant
+
+    resultat = esquisse.iloc[debuts][cles].reset_index(drop=True)
+    for suffixe, fraction in quantiles.items():
+        # Rang de la valeur cherchée (l'écart absorbe l'arrondi de fraction)
+        rang = np.maximum(np.ceil(fraction * total - 1e-9), 1).astype("int64")
+        lignes = np.searchsorted(cumul, cumul_avant + rang, side="left")
+        resultat[modele.format(suffixe)] = valeurs[lignes]
+    return resultat
+
+
+# =============================================================================
+# EXEMPLE D'UTILISATION
+# =============================================================================
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    observations = pd.DataFrame(
+        {
+            "paire": rng.integers(0, 3, 30000),
+            "duree_secondes": rng.gamma(4, 40, 30000).astype("int64") + 1,
+        }
+    )
+    blocs = [observations.iloc[debut::4] for debut in range(4)]
+    esquisse = fusionner_esquisses(
+        [esquisser(bloc, ["paire"]) for bloc in blocs], ["paire"]
+    )
+    print(f"✓ {len(observations)} observations, {len(esquisse)} cases")
+    print(quantiles_esquisse(esquisse, ["paire"]))
+    mediane_exacte = observations.groupby("paire")["duree_secondes"].agg(
+        lambda durees: np.quantile(durees, 0.5, method="inverted_cdf")
+    )
+    print(f"Médianes exactes : {mediane_exacte.tolist()}")
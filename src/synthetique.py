@@ -0,0 +1,396 @@
+"""
+Génération de feeds GTFS synthétiques, pour les mesures de performance
+Le réseau (lignes, arrêts, stations parent, services, exceptions) est tiré
+aléatoirement à partir d'une graine : un même jeu de paramètres produit
+toujours le même zip. Les tables sont construites en bloc (numpy), ce qui
+permet de générer des feeds de plusieurs millions de stop_times. Les tracés
+(shapes.txt et shape_dist_traveled) sont optionnels.
+"""
+
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from src.utils import calculer_distance_haversine, formater_secondes_en_temps
+
+
+# Centre du réseau synthétique (degrés) et rayon de dispersion des arrêts
+CENTRE_RESEAU = (43.61, 3.88)
+RAYON_RESEAU_DEG = 0.15
+
+# Jeux de paramètres prédéfinis (nombre de stop_times ≈ lignes x trips x arrêts)
+TAILLES_FEEDS = {
+    "petit": {"nb_lignes": 20, "nb_arrets": 400, "trips_par_ligne": 60},
+    "moyen": {"nb_lignes": 60, "nb_arrets": 1500, "trips_par_ligne": 200},
+    "grand": {"nb_lignes": 150, "nb_arrets": 4000, "trips_par_ligne": 400},
+    "tres_grand": {"nb_lignes": 300, "nb_arrets": 8000, "trips_par_ligne": 700},
+}
+
+# Masques de jours (lundi -> dimanche) des services réguliers
+JOURS_SERVICES = [
+    (1, 1, 1, 1, 1, 0, 0),
+    (0, 0, 0, 0, 0, 1, 0),
+    (0, 0, 0, 0, 0, 0, 1),
+    (1, 1, 1, 1, 1, 1, 0),
+    (0, 0, 0, 0, 0, 1, 1),
+]
+JOURS_SEMAINE = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def _ecrire_table(archive, nom_table, df):
+    """
+    Écrit une table dans le zip, directement dans l'entrée compressée
+    """
+    with archive.open(f"{nom_table}.txt", "w") as entree:
+        df.to_csv(entree, index=False, encoding="utf-8")
+
+
+def _generer_arrets(rng, nb_arrets, part_stations):
+    """
+    Arrêts physiques et stations parent : une part des arrêts est regroupée
+    par deux sous une même station (quais de part et d'autre de la voie)
+    """
+    lat = CENTRE_RESEAU[0] + rng.normal(0, RAYON_RESEAU_DEG / 2, nb_arrets)
+    lon = CENTRE_RESEAU[1] + rng.normal(0, RAYON_RESEAU_DEG / 2, nb_arrets)
+    stop_ids = np.char.add("S", np.arange(nb_arrets).astype(str))
+
+    # Arrêts regroupés : les premiers arrêts, deux par station
+    nb_regroupes = int(nb_arrets * part_stations) // 2 * 2
+    nb_stations = nb_regroupes // 2
+    station_ids = np.char.add("P", np.arange(nb_stations).astype(str))
+    parent = np.full(nb_arrets, "", dtype=object)
+    parent[:nb_regroupes] = np.repeat(station_ids, 2)
+
+    # Les quais d'une station sont à quelques mètres l'un de l'autre
+    lat[1:nb_regroupes:2] = lat[0:nb_regroupes:2] + 0.0002
+    lon[1:nb_regroupes:2] = lon[0:nb_regroupes:2]
+
+    arrets = pd.DataFrame(
+        {
+            "stop_id": stop_ids,
+            "stop_name": np.char.add("Arrêt ", np.arange(nb_arrets).astype(str)),
+            "stop_lat": lat.round(6),
+            "stop_lon": lon.round(6),
+            "location_type": 0,
+            "parent_station": parent,
+        }
+    )
+    stations = pd.DataFrame(
+        {
+            "stop_id": station_ids,
+            "stop_name": np.char.add("Station ", np.arange(nb_stations).astype(str)),
+            "stop_lat": lat[0:nb_regroupes:2].round(6),
+            "stop_lon": lon[0:nb_regroupes:2].round(6),
+            "location_type": 1,
+            "parent_station": "",
+        }
+    )
+    return pd.concat([stations, arrets], ignore_index=True), lat, lon
+
+
+def _generer_calendrier(rng, nb_services, date_debut, nb_jours, nb_exceptions):
+    """
+    Services réguliers (calendar) et exceptions tirées au hasard
+    (calendar_dates, ajouts et suppressions)
+    """
+    debut = pd.Timestamp(date_debut)
+    fin = debut + pd.Timedelta(days=nb_jours - 1)
+    service_ids = [f"SERV{i}" for i in range(nb_services)]
+
+    masques = [JOURS_SERVICES[i % len(JOURS_SERVICES)] for i in range(nb_services)]
+    calendar = pd.DataFrame(masques, columns=JOURS_SEMAINE)
+    calendar.insert(0, "service_id", service_ids)
+    calendar["start_date"] = debut.strftime("%Y%m%d")
+    calendar["end_date"] = fin.strftime("%Y%m%d")
+
+    dates = debut + pd.to_timedelta(rng.integers(0, nb_jours, nb_exceptions), "D")
+    calendar_dates = pd.DataFrame(
+        {
+            "service_id": rng.choice(service_ids, nb_exceptions),
+            "date": dates.strftime("%Y%m%d"),
+            "exception_type": rng.integers(1, 3, nb_exceptions),
+        }
+    ).drop_duplicates(["service_id", "date"])
+
+    return calendar, calendar_dates
+
+
+def _generer_traces(rng, parcours, lat, lon, points_intermediaires):
+    """
+    Tracés des lignes, un par ligne et par sens : les arrêts du parcours
+    reliés par des points intermédiaires décalés de la ligne droite (la
+    distance le long du tracé dépasse donc la distance à vol d'oiseau).
+    Returns:
+        tuple: (shapes, distance cumulée en km de chaque arrêt du parcours
+        dans le sens 0, longueur de chaque tracé en km)
+    """
+    nb_lignes, nb_arrets = parcours.shape
+    pas = points_intermediaires + 1
+    position = np.arange(pas) / pas
+    lat_arrets, lon_arrets = lat[parcours], lon[parcours]
+
+    # Points de chaque inter-arrêt, décalés perpendiculairement (en arc)
+    d_lat = np.diff(lat_arrets, axis=1)[..., None]
+    d_lon = np.diff(lon_arrets, axis=1)[..., None]
+    decalage = rng.normal(0, 0.1, (nb_lignes, nb_arrets - 1, 1)) * np.sin(
+        np.pi * position
+    )
+    points_lat = lat_arrets[:, :-1, None] + position * d_lat - decalage * d_lon
+    points_lon = lon_arrets[:, :-1, None] + position * d_lon + decalage * d_lat
+    points_lat = np.concatenate(
+        [points_lat.reshape(nb_lignes, -1), lat_arrets[:, -1:]], axis=1
+    )
+    points_lon = np.concatenate(
+        [points_lon.reshape(nb_lignes, -1), lon_arrets[:, -1:]], axis=1
+    )
+
+    segments = calculer_distance_haversine(
+        points_lat[:, :-1], points_lon[:, :-1], points_lat[:, 1:], points_lon[:, 1:]
+    )
+    distance = np.concatenate(
+        [np.zeros((nb_lignes, 1)), np.cumsum(segments, axis=1)], axis=1
+    )
+    longueur = distance[:, -1]
+
+    # Sens 1 : tracé parcouru à rebours
+    nb_points = points_lat.shape[1]
+    shape_ids = np.char.add("SH", np.arange(nb_lignes).astype(str))
+    shapes = pd.DataFrame(
+        {
+            "shape_id": np.concatenate(
+                [
+                    np.repeat(np.char.add(shape_ids, "_0"), nb_points),
+                    np.repeat(np.char.add(shape_ids, "_1"), nb_points),
+                ]
+            ),
+            "shape_pt_lat": np.concatenate(
+                [points_lat.ravel(), points_lat[:, ::-1].ravel()]
+            ).round(6),
+            "shape_pt_lon": np.concatenate(
+                [points_lon.ravel(), points_lon[:, ::-1].ravel()]
+            ).round(6),
+            "shape_pt_sequence": np.tile(np.arange(1, nb_points + 1), 2 * nb_lignes),
+            "shape_dist_traveled": np.concatenate(
+                [distance.ravel(), (longueur[:, None] - distance[:, ::-1]).ravel()]
+            ).round(4),
+        }
+    )
+    return shapes, distance[:, ::pas], longueur
+
+
+def generer_gtfs_synthetique(
+    chemin_zip,
+    nb_lignes=60,
+    nb_arrets=1500,
+    arrets_par_ligne=30,
+    trips_par_ligne=200,
+    part_tram=0.1,
+    part_stations=0.5,
+    nb_services=3,
+    nb_exceptions=40,
+    date_debut="20250101",
+    nb_jours=365,
+    avec_traces=False,
+    points_intermediaires=4,
+    graine=0,
+):
+    """
+    Génère un feed GTFS synthétique et l'écrit dans un zip
+
+    Chaque ligne dessert une suite d'arrêts alignés selon une direction tirée
+    au hasard, parcourue dans les deux sens (direction_id 0 et 1). Les trips
+    partent entre 05:00 et 25:00, avec des temps de parcours propres à chaque
+    ligne ; les lignes se croisent et partagent des tronçons.
+
+    Parameters:
+    -----------
+    chemin_zip : str
+        Chemin du zip à écrire
+    nb_lignes : int
+        Nombre de lignes (routes)
+    nb_arrets : int
+        Nombre d'arrêts physiques
+    arrets_par_ligne : int
+        Nombre d'arrêts desservis par chaque trip
+    trips_par_ligne : int
+        Nombre de trips par ligne, tous sens et services confondus
+    part_tram : float
+        Part des lignes de tram (route_type 0), les autres étant des bus
+    part_stations : float
+        Part des arrêts regroupés deux par deux sous une station parent
+    nb_services : int
+        Nombre de services réguliers (semaine, samedi, dimanche...)
+    nb_exceptions : int
+        Nombre d'exceptions tirées dans calendar_dates
+    date_debut : str
+        Premier jour de validité, au format 'YYYYMMDD'
+    nb_jours : int
+        Durée de validité des services, en jours
+    avec_traces : bool
+        Écrire les tracés des lignes (shapes.txt, un par ligne et par sens)
+        et shape_dist_traveled dans stop_times, pour découper les tronçons
+        dans les tracés (voir src.traces)
+    points_intermediaires : int
+        Nombre de points des tracés entre deux arrêts consécutifs
+    graine : int
+        Graine du générateur aléatoire
+
+    Returns:
+    --------
+    dict : Nombre de lignes de chaque table écrite
+    """
+    rng = np.random.default_rng(graine)
+    arrets_par_ligne = min(arrets_par_ligne, nb_arrets)
+
+    stops, lat, lon = _generer_arrets(rng, nb_arrets, part_stations)
+    calendar, calendar_dates = _generer_calendrier(
+        rng, nb_services, date_debut, nb_jours, nb_exceptions
+    )
+
+    # 1. Lignes : arrêts tirés au hasard, ordonnés selon une direction
+    route_ids = np.char.add("L", np.arange(nb_lignes).astype(str))
+    numeros = np.arange(1, nb_lignes + 1).astype(str)
+    nb_trams = int(round(nb_lignes * part_tram))
+    routes = pd.DataFrame(
+        {
+            "route_id": route_ids,
+            "agency_id": "SYNTH",
+            "route_short_name": numeros,
+            "route_long_name": np.char.add("Ligne ", numeros),
+            "route_type": np.where(np.arange(nb_lignes) < nb_trams, 0, 3),
+        }
+    )
+
+    parcours = np.empty((nb_lignes, arrets_par_ligne), dtype="int64")
+    for ligne in range(nb_lignes):
+        arrets = rng.choice(nb_arrets, arrets_par_ligne, replace=False)
+        angle = rng.uniform(0, np.pi)
+        projection = lat[arrets] * np.sin(angle) + lon[arrets] * np.cos(angle)
+        parcours[ligne] = arrets[np.argsort(projection)]
+    temps_parcours = rng.integers(60, 181, (nb_lignes, arrets_par_ligne))
+    temps_parcours[:, 0] = 0
+
+    # 2. Trips : ligne, sens, service et heure de départ
+    nb_trips = nb_lignes * trips_par_ligne
+    ligne_trip = np.repeat(np.arange(nb_lignes), trips_par_ligne)
+    sens_trip = np.tile(np.arange(trips_par_ligne) % 2, nb_lignes)
+    trip_ids = np.char.add("T", np.arange(nb_trips).astype(str))
+    trips = pd.DataFrame(
+        {
+            "route_id": route_ids[ligne_trip],
+            "service_id": rng.choice(calendar["service_id"].to_numpy(), nb_trips),
+            "trip_id": trip_ids,
+            "direction_id": sens_trip,
+        }
+    )
+    depart_trip = rng.integers(5 * 3600, 25 * 3600, nb_trips) // 60 * 60
+
+    # 3. stop_times, construits en bloc : une ligne par (trip, rang d'arrêt)
+    rang = np.tile(np.arange(arrets_par_ligne), nb_trips)
+    trip = np.repeat(np.arange(nb_trips), arrets_par_ligne)
+    rang_parcours = np.where(
+        sens_trip[trip] == 0, rang, arrets_par_ligne - 1 - rang
+    )
+    cumul = np.cumsum(temps_parcours, axis=1)
+    duree = np.where(
+        sens_trip[trip] == 0,
+        cumul[ligne_trip[trip], rang_parcours],
+        cumul[ligne_trip[trip], -1] - cumul[ligne_trip[trip], rang_parcours],
+    )
+    arrivee = depart_trip[trip] + duree
+    depart = arrivee + np.where(rang % 3 == 0, 30, 0)
+    stop_times = pd.DataFrame(
+        {
+            "trip_id": trip_ids[trip],
+            "arrival_time": formater_secondes_en_temps(arrivee).to_numpy(),
+            "departure_time": formater_secondes_en_temps(depart).to_numpy(),
+            "stop_id": stops["stop_id"].to_numpy()[
+                len(stops) - nb_arrets + parcours[ligne_trip[trip], rang_parcours]
+            ],
+            "stop_sequence": rang + 1,
+        }
+    )
+
+    # 4. Tracés, tirés en dernier : une même graine donne les mêmes tables
+    # avec ou sans tracés
+    shapes = None
+    if avec_traces:
+        shapes, distance_arrets, longueur = _generer_traces(
+            rng, parcours, lat, lon, points_intermediaires
+        )
+        trips["shape_id"] = np.char.add(
+            np.char.add("SH", ligne_trip.astype(str)),
+            np.char.add("_", sens_trip.astype(str)),
+        )
+        distance = distance_arrets[ligne_trip[trip], rang_parcours]
+        stop_times["shape_dist_traveled"] = np.where(
+            sens_trip[trip] == 0, distance, longueur[ligne_trip[trip]] - distance
+        ).round(4)
+
+    agency = pd.DataFrame(
+        {
+            "agency_id": ["SYNTH"],
+            "agency_name": ["Réseau synthétique"],
+            "agency_url": ["https://example.org"],
+            "agency_timezone": ["Europe/Paris"],
+        }
+    )
+
+    tables = {
+        "agency": agency,
+        "stops": stops,
+        "routes": routes,
+        "trips": trips,
+        "stop_times": stop_times,
+        "calendar": calendar,
+        "calendar_dates": calendar_dates,
+    }
+    if shapes is not None:
+        tables["shapes"] = shapes
+    dossier = os.path.dirname(chemin_zip)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+    with zipfile.ZipFile(chemin_zip, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for nom_table, df in tables.items():
+            _ecrire_table(archive, nom_table, df)
+
+    detail_traces = "" if shapes is None else f", {len(shapes)} points de tracés"
+    print(
+        f"✓ GTFS synthétique écrit : {chemin_zip} ({len(routes)} lignes, "
+        f"{len(trips)} trips, {len(stop_times)} stop_times{detail_traces})"
+    )
+
+    return {nom_table: len(df) for nom_table, df in tables.items()}
+
+
+def generer_gtfs_taille(chemin_zip, taille="moyen", graine=0, **parametres):
+    """
+    Génère un feed synthétique d'une taille prédéfinie (voir TAILLES_FEEDS),
+    les paramètres explicites remplaçant ceux de la taille
+    """
+    if taille not in TAILLES_FEEDS:
+        raise ValueError(
+            f"Taille inconnue : {taille!r} (attendu : {', '.join(TAILLES_FEEDS)})"
+        )
+    return generer_gtfs_synthetique(
+        chemin_zip, graine=graine, **{**TAILLES_FEEDS[taille], **parametres}
+    )
+
+
+# =============================================================================
+# EXEMPLE D'UTILISATION
+# =============================================================================
+
+if __name__ == "__main__":
+    for taille in TAILLES_FEEDS:
+        generer_gtfs_taille(f"output/synthetique/gtfs_{taille}.zip", taille)
@@ -0,0 +1,266 @@
+"""
+Découpage des tracés GTFS (shapes.txt) entre deux arrêts
+Les géométries des tronçons sont extraites des tracés par référencement
+linéaire sur shape_dist_traveled, de façon vectorisée pour tous les
+tronçons à la fois. La distance d'un tronçon est la longueur du tracé
+découpé, et non plus la distance à vol d'oiseau entre ses arrêts.
+"""
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from src.cache import conserver_sur_le_feed, lire_resultat_du_feed
+from src.utils import calculer_distance_haversine
+
+
+def a_des_traces(feed):
+    """
+    Indique si le feed permet de découper les tracés entre arrêts :
+    shapes.txt présent, shape_id renseigné sur les trips et
+    shape_dist_traveled présent dans shapes et stop_times
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        bool
+    """
+    shapes = getattr(feed, "shapes", None)
+    return (
+        isinstance(shapes, pd.DataFrame)
+        and not shapes.empty
+        and "shape_dist_traveled" in shapes.columns
+        and "shape_dist_traveled" in feed.stop_times.columns
+        and "shape_id" in feed.trips.columns
+    )
+
+
+def decouper_traces(shapes, decoupes):
+    """
+    Découpe des tracés entre deux positions (référencement linéaire)
+
+    Parameters:
+    -----------
+    shapes : DataFrame
+        Table shapes.txt (shape_id, shape_pt_lat, shape_pt_lon,
+        shape_pt_sequence, shape_dist_traveled)
+    decoupes : DataFrame
+        Une ligne par découpe : shape_id, dist_debut et dist_fin
+        (dans l'unité de shape_dist_traveled). Si dist_debut > dist_fin,
+        la géométrie est orientée dans le sens inverse du tracé.
+
+    Returns:
+    --------
+    Tuple (np.ndarray de LineString, np.ndarray des longueurs en km) :
+    None et NaN pour les découpes impossibles (tracé inconnu ou incomplet,
+    positions manquantes)
+    """
+    geometries = np.full(len(decoupes), None, dtype=object)
+    distances = np.full(len(decoupes), np.nan)
+
+    # 1. Points des tracés, triés et concaténés
+    shapes = shapes.sort_values(["shape_id", "shape_pt_sequence"], kind="stable")
+    codes_shape, shape_ids = pd.factorize(
+        np.asarray(shapes["shape_id"], dtype=object)
+    )
+    lon = shapes["shape_pt_lon"].to_numpy(dtype="float64", na_value=np.nan)
+    lat = shapes["shape_pt_lat"].to_numpy(dtype="float64", na_value=np.nan)
+    dist = shapes["shape_dist_traveled"].to_numpy(dtype="float64", na_value=np.nan)
+
+    debut = np.searchsorted(codes_shape, np.arange(len(shape_ids) + 1))
+    if len(dist) == 0:
+        return geometries, distances
+
+    # Tracés utilisables : positions renseignées et croissantes
+    invalide = np.isnan(dist) | np.isnan(lon) | np.isnan(lat)
+    invalide[1:] |= (np.diff(dist) < 0) & (codes_shape[1:] == codes_shape[:-1])
+    nb_invalides = np.bincount(codes_shape, weights=invalide, minlength=len(shape_ids))
+    shape_valide = nb_invalides == 0
+
+    # Clé de recherche croissante sur tous les tracés : code du tracé
+    # + position normalisée dans [0, 1[
+    dist = np.where(invalide, 0.0, dist)
+    dist_min = dist[debut[:-1]]
+    dist_max = dist[debut[1:] - 1]
+    echelle = dist_max - dist_min + 1.0
+    cle = codes_shape + (dist - dist_min[codes_shape]) / echelle[codes_shape]
+    cle = np.where(shape_valide[codes_shape], cle, codes_shape)
+
+    # 2. Découpes réalisables
+    code = pd.Index(shape_ids).get_indexer(
+        np.asarray(decoupes["shape_id"], dtype=object)
+    )
+    dist_debut = decoupes["dist_debut"].to_numpy(dtype="float64", na_value=np.nan)
+    dist_fin = decoupes["dist_fin"].to_numpy(dtype="float64", na_value=np.nan)
+    realisable = (
+        (code >= 0)
+        & np.isfinite(dist_debut)
+        & np.isfinite(dist_fin)
+        & (dist_debut != dist_fin)
+    )
+    realisable[realisable] &= shape_valide[code[realisable]]
+    retenues = np.flatnonzero(realisable)
+    if len(retenues) == 0:
+        return geometries, distances
+
+    code = code[retenues]
+    inverse = dist_debut[retenues] > dist_fin[retenues]
+    premier, dernier = debut[code], debut[code + 1] - 1
+    a = np.minimum(dist_debut, dist_fin)[retenues]
+    b = np.maximum(dist_debut, dist_fin)[retenues]
+    a = np.clip(a, dist[premier], dist[dernier])
+    b = np.clip(b, dist[premier], dist[dernier])
+
+    # 3. Points intérieurs : positions strictement comprises entre a et b
+    cle_a = code + (a - dist_min[code]) / echelle[code]
+    cle_b = code + (b - dist_min[code]) / echelle[code]
+    i_debut = np.searchsorted(cle, cle_a, "right")
+    i_fin = np.searchsorted(cle, cle_b, "left")
+
+    def interpoler(d, apres):
+        apres = np.clip(apres, premier, dernier)
+        avant = np.clip(apres - 1, premier, dernier)
+        ecart = dist[apres] - dist[avant]
+        fraction = np.divide(
+            d - dist[avant], ecart, out=np.zeros_like(d), where=ecart > 0
+        )
+        return (
+            lon[avant] + fraction * (lon[apres] - lon[avant]),
+            lat[avant] + fraction * (lat[apres] - lat[avant]),
+        )
+
+    lon_a, lat_a = interpoler(a, i_debut)
+    lon_b, lat_b = interpoler(b, i_fin)
+
+    # 4. Assemblage des coordonnées : extrémité a, points intérieurs, extrémité b
+    nb_points = np.maximum(i_fin - i_debut, 0) + 2
+    decalage = np.concatenate([[0], np.cumsum(nb_points)])
+    decoupe = np.repeat(np.arange(len(retenues)), nb_points)
+    rang = np.arange(decalage[-1]) - decalage[decoupe]
+
+    interieur = (rang > 0) & (rang < nb_points[decoupe] - 1)
+    source = np.where(interieur, i_debut[decoupe] + rang - 1, 0)
+    x = np.where(interieur, lon[source], 0.0)
+    y = np.where(interieur, lat[source], 0.0)
+    extremite_a = rang == 0
+    extremite_b = rang == nb_points[decoupe] - 1
+    x[extremite_a], y[extremite_a] = lon_a, lat_a
+    x[extremite_b], y[extremite_b] = lon_b, lat_b
+
+    # Découpes inversées : points réécrits du dernier au premier
+    position = np.where(
+        inverse[decoupe],
+        decalage[decoupe] + nb_points[decoupe] - 1 - rang,
+        np.arange(len(rang)),
+    )
+    coords = np.empty((len(rang), 2))
+    coords[position, 0] = x
+    coords[position, 1] = y
+
+    geometries[retenues] = shapely.linestrings(coords, indices=decoupe)
+
+    # 5. Longueur des géométries découpées
+    longueurs = calculer_distance_haversine(
+        coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0]
+    )
+    longueurs[decoupe[:-1] != decoupe[1:]] = 0.0
+    distances[retenues] = np.bincount(
+        decoupe[:-1], weights=longueurs, minlength=len(retenues)
+    )
+
+    return geometries, distances
+
+
+def decouper_troncons(feed, index, troncons):
+    """
+    Géométries et distances des tronçons découpées dans les tracés.
+
+    Chaque tronçon est découpé dans le tracé du premier trip qui le parcourt
+    (trip représentatif du premier parcours, voir src.parcours), orienté
+    de stop_depart_parent_id vers stop_arrivee_parent_id. Les découpes sont
+    conservées sur le feed par (shape_id, paire d'arrêts) : un tronçon
+    commun à plusieurs modes ou à plusieurs appels n'est découpé qu'une fois.
+
+    Parameters:
+    -----------
+    feed : gtfs_kit Feed object
+        Feed GTFS chargé (voir a_des_traces)
+    index : IndexParcours
+        Index des parcours du feed
+    troncons : DataFrame
+        Tronçons à découper : route_type et paire (code de paire de l'index)
+
+    Returns:
+    --------
+    Tuple (np.ndarray de LineString, np.ndarray des distances en km) :
+    None et NaN pour les tronçons sans tracé exploitable
+    """
+    # Premier segment de parcours de chaque tronçon
+    segments = index.segments.drop_duplicates(["route_type", "paire"])
+    segments = troncons[["route_type", "paire"]].merge(
+        segments, on=["route_type", "paire"], how="left"
+    )
+    lignes = segments["ligne"].to_numpy()
+    trips = index.trip_representatif[segments["parcours"].to_numpy()]
+
+    shape_par_trip = feed.trips.drop_duplicates("trip_id").set_index(
+        pd.Index(np.asarray(feed.trips["trip_id"].drop_duplicates(), dtype=object))
+    )["shape_id"]
+    shape_ids = shape_par_trip.reindex(index.trip_ids[trips]).astype(object)
+    shape_ids = np.asarray(shape_ids.where(shape_ids.notna(), None), dtype=object)
+
+    # Positions des deux arrêts sur le tracé
+    dist_stop_times = feed.stop_times["shape_dist_traveled"]
+    dist_depart = dist_stop_times.loc[index.lignes_stop_times[lignes]].to_numpy(
+        dtype="float64", na_value=np.nan
+    )
+    dist_arrivee = dist_stop_times.loc[
+        index.lignes_stop_times[lignes + 1]
+    ].to_numpy(dtype="float64", na_value=np.nan)
+
+    # Orientation du tronçon : de l'arrêt de plus petit identifiant au plus grand
+    paires = index.paires.iloc[segments["paire"].to_numpy()]
+    dans_le_sens = segments["code_depart"].to_numpy() == paires["code_min"].to_numpy()
+    decoupes = pd.DataFrame(
+        {
+            "shape_id": shape_ids,
+            "parent_min": index.parents[paires["code_min"].to_numpy()],
+            "parent_max": index.parents[paires["code_max"].to_numpy()],
+            "dist_debut": np.where(dans_le_sens, dist_depart, dist_arrivee),
+            "dist_fin": np.where(dans_le_sens, dist_arrivee, dist_depart),
+        }
+    )
+
+    # Découpes déjà réalisées pour ce feed (réinitialisées si shapes change)
+    cache = lire_resultat_du_feed(feed, "_decoupes_traces", [feed.shapes])
+    if cache is None:
+        cache = conserver_sur_le_feed(feed, "_decoupes_traces", [feed.shapes], {})
+
+    cles = list(
+        zip(decoupes["shape_id"], decoupes["parent_min"], decoupes["parent_max"])
+    )
+    a_decouper = decoupes[[cle not in cache for cle in cles]]
+    a_decouper = a_decouper.drop_duplicates(["shape_id", "parent_min", "parent_max"])
+    if len(a_decouper) > 0:
+        geometries, distances = decouper_traces(feed.shapes, a_decouper)
+        cache.update(
+            zip(
+                zip(
+                    a_decouper["shape_id"],
+                    a_decouper["parent_min"],
+                    a_decouper["parent_max"],
+                ),
+                zip(geometries, distances),
+            )
+        )
+
+    geometries = np.empty(len(cles), dtype=object)
+    distances = np.empty(len(cles), dtype="float64")
+    for i, cle in enumerate(cles):
+        geometries[i], distances[i] = cache[cle]
+
+    print(
+        f"  → {np.isfinite(distances).sum()}/{len(distances)} tronçons découpés "
+        f"dans les tracés ({len(a_decouper)} découpes calculées)"
+    )
+
+    return geometries, distances
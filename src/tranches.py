@@ -0,0 +1,156 @@
+"""
+Tranches horaires des indicateurs (heures, quarts d'heure, périodes de pointe)
+Une tranche est un intervalle [debut_s, fin_s[ en secondes depuis minuit.
+Les départs sont affectés à leur tranche en une seule recherche dichotomique
+sur les bornes, puis comptés en une passe (np.bincount ou groupby).
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.utils import convertir_temps_gtfs_en_secondes, formater_secondes_en_temps
+
+
+# Pas des tranches régulières, en secondes
+PAS_TRANCHES = {"horaire": 3600, "30min": 1800, "15min": 900}
+
+# Périodes de pointe par défaut (tranches nommées)
+PERIODES_POINTE = {
+    "pointe_matin": ("07:00:00", "09:00:00"),
+    "creuse": ("09:00:00", "16:30:00"),
+    "pointe_soir": ("16:30:00", "19:00:00"),
+}
+
+# Fin de la dernière tranche régulière (les services se prolongent après minuit)
+FIN_JOURNEE_S = 30 * 3600
+
+
+def definir_tranches(tranches):
+    """
+    Construit la table des tranches horaires
+    Args:
+        tranches (str | int | dict): Découpage de la journée :
+            - "horaire", "30min" ou "15min" (voir PAS_TRANCHES), ou un pas
+              en secondes : tranches régulières de 00:00 à 30:00
+            - "pointe" : périodes de pointe par défaut (voir PERIODES_POINTE)
+            - dict {nom: (debut, fin)} : tranches nommées, bornes au format
+              'HH:MM:SS', sans chevauchement
+    Returns:
+        pd.DataFrame: Une ligne par tranche : tranche (libellé), debut_s, fin_s,
+        debut et fin (format 'HH:MM:SS'), triées par heure de début
+    """
+    if isinstance(tranches, pd.DataFrame):
+        return tranches
+
+    if tranches == "pointe":
+        tranches = PERIODES_POINTE
+
+    if isinstance(tranches, dict):
+        bornes = convertir_temps_gtfs_en_secondes(
+            pd.Series([b for debut_fin in tranches.values() for b in debut_fin])
+        ).to_numpy(dtype="int64")
+        definition = pd.DataFrame(
+            {
+                "tranche": list(tranches),
+                "debut_s": bornes[0::2],
+                "fin_s": bornes[1::2],
+            }
+        ).sort_values("debut_s", ignore_index=True)
+        if (definition["fin_s"] <= definition["debut_s"]).any():
+            raise ValueError("Chaque tranche doit finir après son début")
+        debuts, fins = definition["debut_s"].to_numpy(), definition["fin_s"].to_numpy()
+        if (debuts[1:] < fins[:-1]).any():
+            raise ValueError("Les tranches horaires ne doivent pas se chevaucher")
+    else:
+        pas = PAS_TRANCHES.get(tranches, tranches)
+        if not isinstance(pas, (int, np.integer)) or pas <= 0:
+            raise ValueError(
+                f"Découpage inconnu : {tranches!r} "
+                f"(attendu : {', '.join(PAS_TRANCHES)}, 'pointe', un pas en "
+                "secondes ou un dict de tranches nommées)"
+            )
+        debuts = np.arange(0, FIN_JOURNEE_S, pas)
+        definition = pd.DataFrame(
+            {
+                "tranche": formater_secondes_en_temps(debuts).str[:5].to_numpy(),
+                "debut_s": debuts,
+                "fin_s": debuts + pas,
+            }
+        )
+
+    definition["debut"] = formater_secondes_en_temps(definition["debut_s"]).to_numpy()
+    definition["fin"] = formater_secondes_en_temps(definition["fin_s"]).to_numpy()
+    return definition
+
+
+def affecter_tranches(secondes, definition):
+    """
+    Affecte chaque heure à sa tranche, en une recherche dichotomique sur les bornes
+    Args:
+        secondes (array-like): Heures en secondes depuis minuit (NaN possibles)
+        definition (pd.DataFrame): Tranches (voir definir_tranches)
+    Returns:
+        np.ndarray: Indice de la tranche (ligne de definition), -1 hors tranches
+    """
+    secondes = np.asarray(secondes, dtype="float64")
+    debuts = definition["debut_s"].to_numpy(dtype="float64")
+    fins = definition["fin_s"].to_numpy(dtype="float64")
+
+    indices = np.searchsorted(debuts, secondes, side="right") - 1
+    dans_tranche = (indices >= 0) & ~np.isnan(secondes)
+    dans_tranche[dans_tranche] &= secondes[dans_tranche] < fins[indices[dans_tranche]]
+    return np.where(dans_tranche, indices, -1)
+
+
+def compter_par_tranche(codes, tranches, nb_codes, nb_tranches, poids=None):
+    """
+    Compte (ou somme des poids) par entité et par tranche, en une passe
+    Args:
+        codes (np.ndarray): Code de l'entité (arrêt, tronçon...) de chaque départ
+        tranches (np.ndarray): Indice de tranche de chaque départ (-1 ignoré)
+        nb_codes (int): Nombre d'entités
+        nb_tranches (int): Nombre de tranches
+        poids (np.ndarray): Poids à sommer (défaut : comptage)
+    Returns:
+        np.ndarray: Matrice (nb_codes x nb_tranches)
+    """
+    retenus = (tranches >= 0) & (codes >= 0)
+    cellules = codes[retenus] * nb_tranches + tranches[retenus]
+    return np.bincount(
+        cellules,
+        weights=None if poids is None else poids[retenus],
+        minlength=nb_codes * nb_tranches,
+    ).reshape(nb_codes, nb_tranches)
+
+
+def pivoter_tranches(df_long, cles, valeurs):
+    """
+    Passe un tableau par tranche du format long au format large :
+    une colonne par tranche et par indicateur (ex: nombre_passages_07:00)
+    Args:
+        df_long (pd.DataFrame): Tableau au format long (colonne tranche)
+        cles (list[str]): Colonnes identifiant une ligne du format large
+        valeurs (list[str]): Indicateurs à répartir par tranche
+    Returns:
+        pd.DataFrame: Tableau au format large, tranches dans l'ordre horaire
+    """
+    ordre_tranches = list(dict.fromkeys(df_long["tranche"]))
+    large = df_long.pivot_table(
+        index=cles, columns="tranche", values=valeurs, sort=False, dropna=False
+    )
+    large = large.reindex(
+        columns=pd.MultiIndex.from_product([valeurs, ordre_tranches])
+    )
+    large.columns = [f"{valeur}_{tranche}" for valeur, tranche in large.columns]
+
+    # Les comptages restent entiers (pivot_table renvoie des flottants) :
+    # chaque indicateur est converti d'un bloc, sans fragmenter le tableau
+    blocs = []
+    for valeur in valeurs:
+        bloc = large[[f"{valeur}_{tranche}" for tranche in ordre_tranches]]
+        if pd.api.types.is_integer_dtype(df_long[valeur]):
+            bloc = bloc.fillna(0).astype(df_long[valeur].dtype)
+        blocs.append(bloc)
+    large = pd.concat(blocs, axis=1)
+
+    return large.reset_index()
@@ -1,87 +1,523 @@
+import re
+import zipfile
+
 import gtfs_kit as gk
+import numpy as np
 import pandas as pd
-from shapely import wkt
 import geopandas as gpd
+import shapely
+
+from src.calendrier import obtenir_index_calendrier
+from src.instrumentation import etape, mesurer_etape
+from src.cache import (
+    DOSSIER_CACHE,
+    calculer_empreinte_zip,
+    ecrire_tables_dans_cache,
+    lire_tables_du_cache,
+)
 
 
 # Configuration
 GTFS_ZIP_PATH = "data/TAM_MMM_GTFS.zip"  # À modifier
 
+# Tables GTFS pouvant être portées par un Feed gtfs_kit
+TABLES_GTFS = [
+    "agency",
+    "attributions",
+    "calendar",
+    "calendar_dates",
+    "fare_attributes",
+    "fare_rules",
+    "feed_info",
+    "frequencies",
+    "routes",
+    "shapes",
+    "stops",
+    "stop_times",
+    "trips",
+    "transfers",
+]
+
+# Modes de transport GTFS (route_type de base)
+MODES_GTFS = {
+    0: {"nom": "Tram", "code": "tram", "emoji": "🚊"},
+    1: {"nom": "Métro", "code": "metro", "emoji": "🚇"},
+    2: {"nom": "Train", "code": "train", "emoji": "🚆"},
+    3: {"nom": "Bus", "code": "bus", "emoji": "🚌"},
+    4: {"nom": "Ferry", "code": "ferry", "emoji": "⛴️"},
+    5: {"nom": "Tramway à câble", "code": "tram_cable", "emoji": "🚋"},
+    6: {"nom": "Téléphérique", "code": "telepherique", "emoji": "🚡"},
+    7: {"nom": "Funiculaire", "code": "funiculaire", "emoji": "🚞"},
+    11: {"nom": "Trolleybus", "code": "trolleybus", "emoji": "🚎"},
+    12: {"nom": "Monorail", "code": "monorail", "emoji": "🚝"},
+}
+
+# Types de route étendus (par centaine) -> route_type de base équivalent
+FAMILLES_MODES_ETENDUS = {
+    100: 2,  # Services ferroviaires
+    200: 3,  # Cars
+    400: 1,  # Ferroviaire urbain (métro)
+    700: 3,  # Bus
+    800: 11,  # Trolleybus
+    900: 0,  # Tram
+    1000: 4,  # Services fluviaux
+    1200: 4,  # Ferry
+    1300: 6,  # Téléphérique
+    1400: 7,  # Funiculaire
+}
+
+# Chargement compact : tables et colonnes utiles au calcul des indicateurs
+COLONNES_COMPACTES = {
+    "stops": [
+        "stop_id",
+        "stop_name",
+        "stop_lat",
+        "stop_lon",
+        "location_type",
+        "parent_station",
+    ],
+    "routes": ["route_id", "route_short_name", "route_long_name", "route_type"],
+    "trips": ["route_id", "service_id", "trip_id", "direction_id", "shape_id"],
+    "calendar": [
+        "service_id",
+        "monday",
+        "tuesday",
+        "wednesday",
+        "thursday",
+        "friday",
+        "saturday",
+        "sunday",
+        "start_date",
+        "end_date",
+    ],
+    "calendar_dates": ["service_id", "date", "exception_type"],
+    "stop_times": [
+        "trip_id",
+        "arrival_time",
+        "departure_time",
+        "stop_id",
+        "stop_sequence",
+        "shape_dist_traveled",
+    ],
+    "shapes": [
+        "shape_id",
+        "shape_pt_lat",
+        "shape_pt_lon",
+        "shape_pt_sequence",
+        "shape_dist_traveled",
+    ],
+}
+
+# Types étroits des colonnes non identifiantes (chargement compact)
+TYPES_COMPACTS = {
+    "stop_name": "string",
+    "stop_lat": "float64",
+    "stop_lon": "float64",
+    "location_type": "Int8",
+    "route_short_name": "string",
+    "route_long_name": "string",
+    "route_type": "Int16",
+    "direction_id": "Int8",
+    "monday": "Int8",
+    "tuesday": "Int8",
+    "wednesday": "Int8",
+    "thursday": "Int8",
+    "friday": "Int8",
+    "saturday": "Int8",
+    "sunday": "Int8",
+    "start_date": "string",
+    "end_date": "string",
+    "date": "string",
+    "exception_type": "Int8",
+    "arrival_time": "category",
+    "departure_time": "category",
+    "stop_sequence": "Int32",
+    "shape_dist_traveled": "float64",
+    "shape_pt_lat": "float64",
+    "shape_pt_lon": "float64",
+    "shape_pt_sequence": "Int32",
+}
+
+# Identifiants stockés en catégories partagées entre les tables
+COLONNES_IDENTIFIANTS = {
+    "stop_id": "stop_id",
+    "parent_station": "stop_id",
+    "trip_id": "trip_id",
+    "route_id": "route_id",
+    "service_id": "service_id",
+    "shape_id": "shape_id",
+}
+
 
 ########################################################################
 # HELPERS GTFS
 ########################################################################
 
 
-def charger_gtfs(zip_path=GTFS_ZIP_PATH):
+def charger_gtfs(
+    zip_path=GTFS_ZIP_PATH, compact=False, cache=True, dossier_cache=DOSSIER_CACHE
+):
     """
     Charge le fichier GTFS à l'aide de gtfs_kit.
+    Les tables typées sont mises en cache (Parquet) sous l'empreinte du zip :
+    un second chargement du même fichier est relu depuis le cache.
+    Args:
+        zip_path (str): Chemin du zip GTFS
+        compact (bool): Si True, ne lit que les tables et colonnes utiles
+            aux indicateurs, avec des identifiants catégoriels et des types
+            numériques étroits (voir charger_gtfs_compact)
+        cache (bool): Utiliser le cache disque des feeds (voir src.cache)
+        dossier_cache (str): Dossier du cache
+    Returns:
+        feed: gtfs_kit Feed object
+    """
+    with etape("chargement") as mesure:
+        mode = "compact" if compact else "complet"
+
+        if cache:
+            empreinte = calculer_empreinte_zip(zip_path)
+            feed = charger_gtfs_du_cache(empreinte, compact, dossier_cache)
+            if feed is not None:
+                print(f"✓ GTFS chargé depuis le cache : {zip_path}")
+                mesure.lignes_sortie = len(feed.stop_times)
+                return feed
+
+        if compact:
+            feed = charger_gtfs_compact(zip_path)
+        else:
+            print(f"Chargement du fichier GTFS : {zip_path}")
+            feed = gk.read_feed(zip_path, dist_units='km')
+            ajouter_temps_en_secondes(feed)
+            print(f"✓ GTFS chargé avec succès")
+
+        if cache:
+            ecrire_tables_dans_cache(
+                tables_du_feed(feed),
+                {"dist_units": feed.dist_units},
+                empreinte,
+                mode,
+                dossier_cache,
+            )
+
+        if feed.stop_times is not None:
+            mesure.lignes_sortie = len(feed.stop_times)
+
+    return feed
+
+
+def charger_gtfs_du_cache(empreinte, compact=False, dossier_cache=DOSSIER_CACHE):
+    """
+    Relit un feed depuis le cache disque d'après l'empreinte de son zip,
+    sans avoir besoin du zip (ex: version précédente d'un feed remplacé)
+    Args:
+        empreinte (str): Empreinte du zip GTFS (voir calculer_empreinte_zip)
+        compact (bool): Mode de chargement du feed mis en cache
+        dossier_cache (str): Dossier du cache
+    Returns:
+        feed: gtfs_kit Feed object, ou None si le feed n'est pas en cache
+    """
+    mode = "compact" if compact else "complet"
+    en_cache = lire_tables_du_cache(empreinte, mode, dossier_cache)
+    if en_cache is None:
+        return None
+    tables, meta = en_cache
+    return gk.Feed(dist_units=meta["dist_units"], **tables)
+
+
+def decrire_mode(route_type):
+    """
+    Décrit un mode de transport à partir de son route_type GTFS
+    (types de base 0 à 12 et types étendus 100 à 1700).
+    Args:
+        route_type (int): Type de route GTFS
+    Returns:
+        dict: nom (affichage), code (noms de fichiers) et emoji du mode
+    """
+    route_type = int(route_type)
+    if route_type in MODES_GTFS:
+        return dict(MODES_GTFS[route_type])
+
+    famille = FAMILLES_MODES_ETENDUS.get(route_type // 100 * 100)
+    if famille is not None:
+        mode = MODES_GTFS[famille]
+        return {
+            "nom": f"{mode['nom']} ({route_type})",
+            "code": f"{mode['code']}_{route_type}",
+            "emoji": mode["emoji"],
+        }
+
+    return {"nom": f"Mode {route_type}", "code": f"rt{route_type}", "emoji": "🚏"}
+
+
+def lister_route_types(feed):
+    """
+    Liste les types de route présents dans feed.routes
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        list[int]: route_type triés
+    """
+    return sorted(int(rt) for rt in feed.routes["route_type"].dropna().unique())
+
+
+def tables_du_feed(feed):
+    """
+    Retourne les tables présentes dans un feed GTFS.
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        dict[str, DataFrame]: Tables présentes dans le feed, par nom
+    """
+    return {
+        nom_table: getattr(feed, nom_table)
+        for nom_table in TABLES_GTFS
+        if isinstance(getattr(feed, nom_table, None), pd.DataFrame)
+    }
+
+
+def _lire_table_compacte(archive, nom_table):
+    """
+    Lit une table du zip GTFS en ne conservant que les colonnes utiles.
+    Les identifiants sont lus directement en catégories.
+    Retourne None si la table est absente du zip.
+    """
+    noms_fichiers = {nom.split("/")[-1]: nom for nom in archive.namelist()}
+    nom_fichier = noms_fichiers.get(f"{nom_table}.txt")
+    if nom_fichier is None:
+        return None
+
+    colonnes = COLONNES_COMPACTES[nom_table]
+    types = {
+        col: "category" if col in COLONNES_IDENTIFIANTS else TYPES_COMPACTS[col]
+        for col in colonnes
+    }
+
+    with archive.open(nom_fichier) as fichier:
+        df = pd.read_csv(
+            fichier,
+            encoding="utf-8-sig",
+            usecols=lambda col: col.strip() in colonnes,
+            dtype={
+                col: "category" if type_col == "category" else "string"
+                for col, type_col in types.items()
+            },
+            skipinitialspace=True,
+        )
+    df.columns = df.columns.str.strip()
+
+    for col, type_col in types.items():
+        if col not in df.columns:
+            continue
+        if type_col in ["float64", "Int8", "Int16", "Int32"]:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(type_col)
+        elif type_col == "category":
+            # Catégories triées et ordonnées : min/max/tri comme sur les chaînes
+            df[col] = df[col].cat.reorder_categories(
+                sorted(df[col].cat.categories), ordered=True
+            )
+
+    return df
+
+
+def charger_gtfs_compact(zip_path=GTFS_ZIP_PATH, tables=None):
+    """
+    Charge le fichier GTFS en mode compact, pour les jeux de données volumineux :
+    - seules les tables et colonnes utiles aux indicateurs sont lues
+      (voir COLONNES_COMPACTES ; transfers.txt, fare_*.txt, etc. sont ignorés)
+    - stop_id, trip_id, route_id, service_id et shape_id sont stockés en catégories
+      partagées entre les tables (mêmes codes partout, fusions rapides)
+    - les colonnes numériques utilisent des types étroits (Int8, Int16, Int32)
+    Args:
+        zip_path (str): Chemin du zip GTFS
+        tables (list[str]): Tables à lire (défaut : toutes celles de
+            COLONNES_COMPACTES). Ex: sans stop_times pour un calcul en flux
+            (voir src.flux)
     Returns:
         feed: gtfs_kit Feed object
     """
-    print(f"Chargement du fichier GTFS : {zip_path}")
-    feed = gk.read_feed(zip_path, dist_units='km')
-    print(f"✓ GTFS chargé avec succès")
+    print(f"Chargement compact du fichier GTFS : {zip_path}")
+
+    with zipfile.ZipFile(zip_path) as archive:
+        tables = {
+            nom_table: _lire_table_compacte(archive, nom_table)
+            for nom_table in (tables or COLONNES_COMPACTES)
+        }
+
+    # Catégories communes à toutes les tables pour chaque type d'identifiant
+    valeurs_identifiants = {}
+    for df in tables.values():
+        if df is None:
+            continue
+        for col, identifiant in COLONNES_IDENTIFIANTS.items():
+            if col in df.columns:
+                valeurs_identifiants.setdefault(identifiant, set()).update(
+                    df[col].cat.categories
+                )
+    types_identifiants = {
+        identifiant: pd.CategoricalDtype(sorted(valeurs), ordered=True)
+        for identifiant, valeurs in valeurs_identifiants.items()
+    }
+    for df in tables.values():
+        if df is None:
+            continue
+        for col, identifiant in COLONNES_IDENTIFIANTS.items():
+            if col in df.columns:
+                df[col] = df[col].astype(types_identifiants[identifiant])
+
+    feed = gk.Feed(dist_units="km", **tables)
+    if feed.stop_times is not None:
+        ajouter_temps_en_secondes(feed)
+
+    memoire = mesurer_memoire_feed(feed)
+    print(f"✓ GTFS chargé avec succès ({sum(memoire.values()):.1f} Mo en mémoire)")
     return feed
 
 
+def mesurer_memoire_feed(feed):
+    """
+    Mesure l'occupation mémoire des tables d'un feed GTFS.
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        dict: Mémoire occupée par table, en Mo
+    """
+    return {
+        nom_table: df.memory_usage(deep=True).sum() / 1024**2
+        for nom_table, df in tables_du_feed(feed).items()
+    }
+
+
+def comparer_memoire_chargement(zip_path=GTFS_ZIP_PATH):
+    """
+    Compare l'occupation mémoire du chargement compact avec celle
+    du chargement gtfs_kit par défaut, et affiche le gain obtenu.
+    Args:
+        zip_path (str): Chemin du zip GTFS
+    Returns:
+        pd.DataFrame: Mémoire par table (en Mo) pour chaque mode de chargement
+    """
+    memoire_defaut = mesurer_memoire_feed(charger_gtfs(zip_path, cache=False))
+    memoire_compacte = mesurer_memoire_feed(charger_gtfs_compact(zip_path))
+
+    comparaison = pd.DataFrame(
+        {"defaut_mo": memoire_defaut, "compact_mo": memoire_compacte}
+    ).fillna(0)
+    comparaison.loc["total"] = comparaison.sum()
+    comparaison["gain_mo"] = comparaison["defaut_mo"] - comparaison["compact_mo"]
+
+    total = comparaison.loc["total"]
+    print(
+        f"✓ Mémoire : {total['compact_mo']:.1f} Mo en mode compact "
+        f"contre {total['defaut_mo']:.1f} Mo avec gtfs_kit "
+        f"({total['gain_mo']:.1f} Mo économisés, "
+        f"-{100 * total['gain_mo'] / total['defaut_mo']:.0f} %)"
+    )
+    return comparaison
+
+
+def calculer_distance_haversine(lat1, lon1, lat2, lon2):
+    """
+    Calcule la distance entre deux points GPS en kilomètres
+    Utilise la formule de Haversine
+    """
+    R = 6371  # Rayon de la Terre en km
+
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(a))
+
+    return R * c
+
+
+def ajouter_temps_en_secondes(feed):
+    """
+    Ajoute à feed.stop_times les colonnes arrival_s et departure_s (Int32),
+    temps GTFS convertis en secondes une fois pour toutes au chargement.
+    Sans effet si les colonnes sont déjà présentes.
+    Args:
+        feed: gtfs_kit Feed object
+    Returns:
+        feed: gtfs_kit Feed object
+    """
+    stop_times = feed.stop_times
+    for colonne_temps, colonne_secondes in [
+        ("arrival_time", "arrival_s"),
+        ("departure_time", "departure_s"),
+    ]:
+        if colonne_secondes not in stop_times.columns:
+            stop_times[colonne_secondes] = convertir_temps_gtfs_en_secondes(
+                stop_times[colonne_temps]
+            )
+    return feed
+
+
+def convertir_temps_gtfs_en_secondes(serie):
+    """
+    Convertit une série de temps GTFS (HH:MM:SS) en secondes, de manière vectorisée.
+    Gère les heures > 24 (ex: 25:30:00 pour 01:30 le lendemain) et les valeurs vides.
+
+    Seules les valeurs distinctes (quelques milliers au plus) sont découpées,
+    puis le résultat est redistribué sur toute la série.
+
+    Args:
+        serie (pd.Series): Temps au format 'HH:MM:SS'
+    Returns:
+        pd.Series: Temps en secondes (Int32, <NA> pour les valeurs vides)
+    """
+    codes, valeurs_uniques = pd.factorize(serie)
+    parties = (
+        pd.Series(valeurs_uniques, dtype="string")
+        .str.strip()
+        .str.split(":", n=2, expand=True)
+        .reindex(columns=range(3))
+    )
+    secondes_uniques = (
+        pd.to_numeric(parties[0], errors="coerce") * 3600
+        + pd.to_numeric(parties[1], errors="coerce") * 60
+        + pd.to_numeric(parties[2], errors="coerce")
+    ).to_numpy(dtype="float64", na_value=np.nan)
+
+    secondes = np.full(len(codes), np.nan)
+    connus = codes >= 0
+    secondes[connus] = secondes_uniques[codes[connus]]
+
+    return pd.Series(secondes, index=serie.index).astype("Int32")
+
+
+def formater_secondes_en_temps(secondes):
+    """
+    Convertit une série de secondes en temps GTFS (HH:MM:SS), de manière vectorisée.
+    Les heures > 24 sont conservées (ex: 91800 -> 25:30:00).
+    Args:
+        secondes (pd.Series): Temps en secondes
+    Returns:
+        pd.Series: Temps au format 'HH:MM:SS' (<NA> pour les valeurs manquantes)
+    """
+    secondes = pd.Series(secondes).astype("Int64")
+    heures = (secondes // 3600).astype("string").str.zfill(2)
+    minutes = (secondes % 3600 // 60).astype("string").str.zfill(2)
+    reste = (secondes % 60).astype("string").str.zfill(2)
+    return heures + ":" + minutes + ":" + reste
+
+
 def obtenir_service_ids_pour_date(feed, date_str):
     """
     Identifie les service_id actifs pour une date donnée
-    en tenant compte de calendar et calendar_dates
+    en tenant compte de calendar et calendar_dates.
+    S'appuie sur l'index calendrier du feed, construit une seule fois
+    (voir src.calendrier.IndexCalendrier).
     Args:
         feed: gtfs_kit Feed object
         date_str (str): Date au format 'YYYYMMDD'
     Returns:
         list[str]: Liste des service_id actifs
     """
-    date_obj = pd.to_datetime(date_str, format='%Y%m%d')
-    jour_semaine = date_obj.strftime('%A').lower()  # lundi, mardi, etc.
-    
-    # Mapping jour de la semaine -> colonne calendar
-    jour_mapping = {
-        'monday': 'monday',
-        'tuesday': 'tuesday', 
-        'wednesday': 'wednesday',
-        'thursday': 'thursday',
-        'friday': 'friday',
-        'saturday': 'saturday',
-        'sunday': 'sunday'
-    }
-    
-    service_ids = set()
-    
-    # 1. Vérifier calendar.txt
-    if hasattr(feed, 'calendar') and feed.calendar is not None:
-        calendar = feed.calendar.copy()
-        # Convertir les dates
-        calendar['start_date'] = pd.to_datetime(calendar['start_date'], format='%Y%m%d')
-        calendar['end_date'] = pd.to_datetime(calendar['end_date'], format='%Y%m%d')
-        
-        # Filtrer les services actifs ce jour
-        jour_col = jour_mapping[jour_semaine]
-        services_calendar = calendar[
-            (calendar['start_date'] <= date_obj) &
-            (calendar['end_date'] >= date_obj) &
-            (calendar[jour_col] == 1)
-        ]['service_id'].tolist()
-        
-        service_ids.update(services_calendar)
-    
-    # 2. Vérifier calendar_dates.txt (exceptions)
-    if hasattr(feed, 'calendar_dates') and feed.calendar_dates is not None:
-        calendar_dates = feed.calendar_dates.copy()
-        calendar_dates['date'] = pd.to_datetime(calendar_dates['date'], format='%Y%m%d')
-        
-        exceptions = calendar_dates[calendar_dates['date'] == date_obj]
-        
-        for _, row in exceptions.iterrows():
-            if row['exception_type'] == 1:  # Service ajouté
-                service_ids.add(row['service_id'])
-            elif row['exception_type'] == 2:  # Service retiré
-                service_ids.discard(row['service_id'])
-    
-    service_ids = list(service_ids)
+    with etape("calendrier") as mesure:
+        service_ids = obtenir_index_calendrier(feed).services_actifs(date_str)
+        mesure.lignes_sortie = len(service_ids)
     print(f"✓ Services actifs le {date_str} : {len(service_ids)} service(s)")
     return service_ids
 
@@ -91,6 +527,7 @@ def obtenir_service_ids_pour_date(feed, date_str):
 ########################################################################
 
 
+@mesurer_etape("export")
 def exporter_df_to_csv(df, chemin_fichier):
     """
     Exporte un DataFrame en CSV
@@ -105,6 +542,7 @@ def exporter_df_to_csv(df, chemin_fichier):
     df.to_csv(chemin_fichier, index=False, encoding='utf-8-sig')
     print(f"✓ CSV exporté : {chemin_fichier}")
     
+@mesurer_etape("export")
 def exporter_gdf_to_csv(gdf, chemin_fichier):
     """
     Exporte un GeoDataFrame en CSV sans la geometry
@@ -121,6 +559,7 @@ def exporter_gdf_to_csv(gdf, chemin_fichier):
     print(f"✓ CSV exporté : {chemin_fichier}")
 
 
+@mesurer_etape("export")
 def exporter_geojson(gdf, chemin_fichier):
     """
     Exporte un GeoDataFrame en GeoJSON.
@@ -136,25 +575,155 @@ def exporter_geojson(gdf, chemin_fichier):
     print(f"✓ GeoJSON exporté : {chemin_fichier}")
 
 
-def charger_csv_avec_geometrie(chemin_fichier):
+# Coordonnées des stations parent aux extrémités d'un tronçon
+COLONNES_COORDONNEES_TRONCONS = [
+    "lon_depart_parent",
+    "lat_depart_parent",
+    "lon_arrivee_parent",
+    "lat_arrivee_parent",
+]
+
+
+def creer_lignes_entre_arrets(df):
     """
-    Charge un CSV contenant une colonne 'geometry' en WKT et retourne un GeoDataFrame.
-    
+    Construit en bloc les LineString des tronçons à partir des coordonnées
+    de leurs stations parent (lat/lon_depart_parent, lat/lon_arrivee_parent)
+
+    Parameters:
+    -----------
+    df : DataFrame
+        Tronçons avec les quatre colonnes de coordonnées
+
+    Returns:
+    --------
+    np.ndarray de LineString (None si une coordonnée manque)
+    """
+    coords = np.stack(
+        [
+            df[["lon_depart_parent", "lat_depart_parent"]].to_numpy(dtype="float64"),
+            df[["lon_arrivee_parent", "lat_arrivee_parent"]].to_numpy(dtype="float64"),
+        ],
+        axis=1,
+    ).reshape(-1, 2, 2)
+    coords_completes = ~np.isnan(coords).any(axis=(1, 2))
+    geometries = np.full(len(df), None, dtype=object)
+    geometries[coords_completes] = shapely.linestrings(coords[coords_completes])
+    return geometries
+
+
+def lire_geometries(valeurs):
+    """
+    Décode en bloc une colonne de géométries sérialisées : WKB (binaire ou
+    hexadécimal) ou WKT. Les valeurs vides ou illisibles donnent None.
+
+    Parameters:
+    -----------
+    valeurs : array-like
+        Géométries sérialisées
+
+    Returns:
+    --------
+    np.ndarray de géométries shapely
+    """
+    valeurs = pd.Series(valeurs, dtype=object)
+    valeurs = valeurs.where(valeurs.notna(), None).to_numpy(dtype=object)
+    renseignees = valeurs[pd.notna(valeurs)]
+    if len(renseignees) == 0:
+        return np.full(len(valeurs), None, dtype=object)
+
+    # Format déduit de la première valeur (une colonne n'en mélange pas)
+    premiere = renseignees[0]
+    en_wkb = isinstance(premiere, (bytes, bytearray)) or (
+        re.fullmatch(r"\s*(?:00|01)[0-9A-Fa-f]+\s*", str(premiere)) is not None
+    )
+    lecteur = shapely.from_wkb if en_wkb else shapely.from_wkt
+    return lecteur(valeurs, on_invalid="ignore")
+
+
+def _completer_geometries(df, crs):
+    """
+    Retourne un GeoDataFrame : géométries décodées (WKT ou WKB) si la colonne
+    geometry existe, géométries manquantes reconstruites à partir des
+    coordonnées des stations parent si elles sont disponibles
+    """
+    geometries = None
+    if "geometry" in df.columns:
+        colonne = df["geometry"]
+        if not isinstance(colonne, gpd.GeoSeries):
+            colonne = lire_geometries(colonne)
+        geometries = np.asarray(colonne, dtype=object)
+
+    if set(COLONNES_COORDONNEES_TRONCONS).issubset(df.columns):
+        if geometries is None:
+            geometries = creer_lignes_entre_arrets(df)
+        else:
+            manquantes = pd.isna(geometries)
+            if manquantes.any():
+                geometries[manquantes] = creer_lignes_entre_arrets(df[manquantes])
+
+    if geometries is None:
+        return gpd.GeoDataFrame(df, crs=crs)
+    return gpd.GeoDataFrame(
+        df.drop(columns=["geometry"], errors="ignore"),
+        geometry=gpd.GeoSeries(geometries, index=df.index, crs=crs),
+    )
+
+
+def charger_csv_avec_geometrie(chemin_fichier, crs="EPSG:4326"):
+    """
+    Charge un CSV (éventuellement .csv.gz) et retourne un GeoDataFrame.
+    La colonne 'geometry' (WKT ou WKB hexadécimal) est décodée en bloc ;
+    les géométries absentes (colonne manquante, comme dans les tronçons de
+    référence de data/, ou valeurs vides) sont reconstruites à partir des
+    colonnes lat/lon_*_parent des tronçons.
+
     Parameters:
     -----------
     chemin_fichier : str
         Chemin du fichier CSV
-    
+    crs : str
+        Système de coordonnées des géométries
+
     Returns:
     --------
     GeoDataFrame
     """
-    df = pd.read_csv(chemin_fichier)
-    
-    if 'geometry' in df.columns:
-        df['geometry'] = df['geometry'].apply(wkt.loads)
-        gdf = gpd.GeoDataFrame(df, geometry='geometry', crs='EPSG:4326')
-    else:
-        gdf = gpd.GeoDataFrame(df, crs='EPSG:4326')
-    
-    return gdf
+    df = pd.read_csv(chemin_fichier, dtype={"geometry": object})
+    return _completer_geometries(df, crs)
+
+
+def charger_troncons(chemin_fichier, crs="EPSG:4326"):
+    """
+    Charge des tronçons précalculés, sans les recalculer depuis le GTFS :
+    GeoParquet (lecture directe, colonnaire), Parquet sans métadonnées
+    géographiques (géométrie WKB/WKT ou reconstruite), CSV (voir
+    charger_csv_avec_geometrie), ou tout format lu par GDAL (GeoJSON,
+    FlatGeobuf...). Les CSV et GeoJSON compressés (.csv.gz, .geojson.gz)
+    sont décompressés à la lecture.
+
+    Parameters:
+    -----------
+    chemin_fichier : str
+        Chemin du fichier de tronçons
+    crs : str
+        Système de coordonnées, si le fichier n'en précise pas
+
+    Returns:
+    --------
+    GeoDataFrame
+    """
+    nom = str(chemin_fichier).lower().removesuffix(".gz")
+    if nom.endswith((".parquet", ".geoparquet")):
+        try:
+            gdf = gpd.read_parquet(chemin_fichier)
+        except ValueError:
+            # Parquet sans métadonnées GeoParquet
+            return _completer_geometries(pd.read_parquet(chemin_fichier), crs)
+        return gdf if gdf.crs is not None else gdf.set_crs(crs)
+    if nom.endswith(".csv"):
+        return charger_csv_avec_geometrie(chemin_fichier, crs)
+    if str(chemin_fichier).lower().endswith(".gz"):
+        # GDAL lit les fichiers gzip à travers son système de fichiers virtuel
+        chemin_fichier = f"/vsigzip/{chemin_fichier}"
+    gdf = gpd.read_file(chemin_fichier)
+    return gdf if gdf.crs is not None else gdf.set_crs(crs)
@@ -5,8 +5,7 @@ Page Arrêts - Analyse GTFS Indicateurs par Arrêt
 import streamlit as st
 import streamlit.components.v1 as components
 
-from src.arrets import calculer_indicateurs_arrets
-from src.cartographie import create_carte_arrets
+from views.cache import carte_arrets_en_cache, indicateurs_arrets_en_cache
 
 
 def arrets_page():
@@ -22,10 +21,10 @@ def arrets_page():
         if st.session_state.indicateurs_arrets is None:
             with st.spinner("Calcul des indicateurs d'arrêts..."):
                 try:
-                    indicateurs = calculer_indicateurs_arrets(
-                        st.session_state.feed,
-                        st.session_state.active_service_ids,
+                    indicateurs = indicateurs_arrets_en_cache(
+                        st.session_state.empreinte_feed,
                         st.session_state.date_str,
+                        st.session_state.feed,
                     )
                     st.session_state.indicateurs_arrets = indicateurs
                 except Exception as e:
@@ -60,10 +59,29 @@ def arrets_page():
             else:
                 st.info("Aucun arrêt actif trouvé.")
 
+            # Profil horaire
+            st.header("📈 Profil horaire des passages")
+            if st.session_state.profil_horaire_arrets is None:
+                with st.spinner("Calcul des passages par heure..."):
+                    st.session_state.profil_horaire_arrets = (
+                        indicateurs_arrets_en_cache(
+                            st.session_state.empreinte_feed,
+                            st.session_state.date_str,
+                            st.session_state.feed,
+                            tranches="horaire",
+                        )
+                    )
+            profil = st.session_state.profil_horaire_arrets
+            st.bar_chart(
+                profil.groupby("tranche", sort=False)["nombre_passages"].sum()
+            )
+
             # Carte
             st.header("🗺️ Carte des Arrêts")
-            m = create_carte_arrets(indicateurs)
-            components.html(m._repr_html_(), height=500, width=1000)
+            carte_html = carte_arrets_en_cache(
+                st.session_state.empreinte_feed, st.session_state.date_str, indicateurs
+            )
+            components.html(carte_html, height=500, width=1000)
 
             # Télécharger les résultats
             st.header("💾 Téléchargement")
@@ -74,6 +92,13 @@ def arrets_page():
                 file_name=f"indicateurs_arrets_{st.session_state.date_str}.csv",
                 mime="text/csv",
             )
+            csv_horaire = profil.to_csv(index=False).encode("utf-8")
+            st.download_button(
+                label="📥 Télécharger les passages par heure CSV",
+                data=csv_horaire,
+                file_name=f"indicateurs_arrets_horaires_{st.session_state.date_str}.csv",
+                mime="text/csv",
+            )
         else:
             st.info("🔄 Calcul des indicateurs en cours...")
     else:
@@ -0,0 +1,130 @@
+"""
+Cache des feeds et des indicateurs de l'application Streamlit
+Les feeds sont identifiés par l'empreinte (SHA-256) du fichier uploadé et
+partagés entre toutes les sessions du processus : un même fichier n'est lu
+qu'une fois, quel que soit le nombre d'utilisateurs qui l'analysent.
+Les indicateurs sont mis en cache par (empreinte, date) : changer de page ou
+revenir à une date déjà analysée ne relance aucun calcul.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import streamlit as st
+
+from src.arrets import calculer_indicateurs_arrets
+from src.cartographie import create_carte_arrets, creer_carte_troncons_multimodale
+from src.create_troncons_uniques import creer_troncons_uniques_multimodal
+from src.indicateurs_troncons import (
+    calculer_frequentation_troncons_multimodal,
+    compute_indicateurs_troncons_multimodal,
+)
+from src.utils import charger_gtfs, obtenir_service_ids_pour_date
+
+
+# Nombre de feeds conservés en mémoire (tous utilisateurs confondus)
+NB_FEEDS_EN_MEMOIRE = 4
+
+# Nombre de résultats d'indicateurs conservés par fonction
+NB_RESULTATS_EN_CACHE = 32
+
+
+def calculer_empreinte_upload(uploaded_file):
+    """
+    Empreinte SHA-256 du contenu d'un fichier uploadé, calculée une seule
+    fois par fichier et par session
+    Args:
+        uploaded_file: Fichier renvoyé par st.file_uploader
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    identifiant = getattr(uploaded_file, "file_id", None) or uploaded_file.name
+    if st.session_state.get("upload_empreinte", (None, None))[0] != identifiant:
+        empreinte = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        st.session_state.upload_empreinte = (identifiant, empreinte)
+    return st.session_state.upload_empreinte[1]
+
+
+@st.cache_resource(show_spinner=False, max_entries=NB_FEEDS_EN_MEMOIRE)
+def obtenir_feed(empreinte, _uploaded_file):
+    """
+    Charge le feed d'un fichier uploadé, une seule fois par empreinte pour
+    tout le processus. Le feed est partagé entre les sessions : il ne doit
+    pas être modifié.
+    Args:
+        empreinte (str): Empreinte du fichier (clé du cache)
+        _uploaded_file: Fichier renvoyé par st.file_uploader (non haché)
+    Returns:
+        feed: gtfs_kit Feed object
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_file:
+        tmp_file.write(_uploaded_file.getbuffer())
+        zip_path = tmp_file.name
+    try:
+        return charger_gtfs(zip_path)
+    finally:
+        os.unlink(zip_path)
+
+
+@st.cache_resource(show_spinner=False, max_entries=NB_FEEDS_EN_MEMOIRE)
+def obtenir_troncons_uniques(empreinte, _feed):
+    """
+    Tronçons de référence de tous les modes, calculés une fois par feed
+    (partagés entre les sessions, à ne pas modifier)
+    """
+    return creer_troncons_uniques_multimodal(_feed)
+
+
+@st.cache_data(show_spinner=False, max_entries=NB_RESULTATS_EN_CACHE)
+def indicateurs_arrets_en_cache(empreinte, date_str, _feed, tranches=None):
+    """
+    Indicateurs par arrêt d'un feed à une date (voir calculer_indicateurs_arrets)
+    """
+    service_ids = obtenir_service_ids_pour_date(_feed, date_str)
+    return calculer_indicateurs_arrets(_feed, service_ids, date_str, tranches=tranches)
+
+
+@st.cache_data(show_spinner=False, max_entries=NB_RESULTATS_EN_CACHE)
+def indicateurs_troncons_en_cache(empreinte, date_str, _feed):
+    """
+    Indicateurs par tronçon de tous les modes d'un feed à une date
+    (voir compute_indicateurs_troncons_multimodal)
+    """
+    service_ids = obtenir_service_ids_pour_date(_feed, date_str)
+    return compute_indicateurs_troncons_multimodal(
+        _feed, service_ids, obtenir_troncons_uniques(empreinte, _feed)
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=NB_RESULTATS_EN_CACHE)
+def profil_troncons_en_cache(empreinte, date_str, _feed, tranches="horaire"):
+    """
+    Passages par tronçon et par tranche horaire d'un feed à une date
+    (voir calculer_frequentation_troncons_multimodal)
+    """
+    service_ids = obtenir_service_ids_pour_date(_feed, date_str)
+    return calculer_frequentation_troncons_multimodal(
+        _feed,
+        obtenir_troncons_uniques(empreinte, _feed),
+        service_ids,
+        tranches=tranches,
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=NB_RESULTATS_EN_CACHE)
+def carte_troncons_en_cache(empreinte, date_str, _indicateurs):
+    """
+    HTML de la carte des tronçons d'un feed à une date, généré une seule fois
+    (voir creer_carte_troncons_multimodale)
+    """
+    return creer_carte_troncons_multimodale(_indicateurs)._repr_html_()
+
+
+@st.cache_data(show_spinner=False, max_entries=NB_RESULTATS_EN_CACHE)
+def carte_arrets_en_cache(empreinte, date_str, _indicateurs):
+    """
+    HTML de la carte des arrêts d'un feed à une date, généré une seule fois
+    (voir create_carte_arrets)
+    """
+    return create_carte_arrets(_indicateurs)._repr_html_()
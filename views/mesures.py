@@ -0,0 +1,52 @@
+"""
+Panneau des mesures d'étapes (barre latérale)
+Affiche la durée, les volumes et la mémoire de chaque étape exécutée lors
+du dernier calcul (voir src.instrumentation). Les résultats lus dans le
+cache Streamlit ne relancent aucune étape : le panneau conserve alors les
+mesures du dernier calcul effectif.
+"""
+
+import streamlit as st
+
+
+def panneau_mesures(collecte):
+    """
+    Affiche dans la barre latérale les mesures des étapes
+    Args:
+        collecte (CollecteEtapes): Mesures du passage courant du script
+    """
+    if len(collecte) > 0:
+        st.session_state.mesures_etapes = collecte.tableau()
+
+    mesures = st.session_state.get("mesures_etapes")
+    with st.sidebar.expander("⏱️ Temps de calcul par étape", expanded=False):
+        if mesures is None or mesures.empty:
+            st.caption("Aucun calcul effectué pour le moment.")
+            return
+
+        if len(collecte) == 0:
+            st.caption("Résultats lus dans le cache : mesures du dernier calcul.")
+
+        principales = mesures[mesures["niveau"] == 0]
+        st.metric("Durée totale", f"{principales['duree_s'].sum():.2f} s")
+        st.dataframe(
+            mesures[
+                [
+                    "chemin",
+                    "duree_s",
+                    "lignes_entree",
+                    "lignes_sortie",
+                    "memoire_pic_mo",
+                ]
+            ].rename(
+                columns={
+                    "chemin": "Étape",
+                    "duree_s": "Durée (s)",
+                    "lignes_entree": "Lignes en entrée",
+                    "lignes_sortie": "Lignes en sortie",
+                    "memoire_pic_mo": "Pic mémoire (Mo)",
+                }
+            ),
+            hide_index=True,
+        )
+        st.bar_chart(principales.groupby("etape", sort=False)["duree_s"].sum())
@@ -6,14 +6,18 @@ import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
 
-from src.indicateurs_troncons import compute_indicateurs_troncons
-from src.cartographie import creer_carte_troncons
-from src.create_troncons_uniques import creer_troncons_uniques
+from src.utils import decrire_mode
+from views.cache import (
+    carte_troncons_en_cache,
+    indicateurs_troncons_en_cache,
+    obtenir_troncons_uniques,
+    profil_troncons_en_cache,
+)
 
 
-def charger_ou_calculer_troncons(feed, route_type, nom_mode):
+def charger_ou_calculer_troncons(feed, empreinte):
     """
-    Calcule automatiquement les tronçons depuis le GTFS uploadé.
+    Calcule automatiquement les tronçons de tous les modes depuis le GTFS uploadé.
 
     Cette fonction calcule toujours les tronçons à partir du feed GTFS fourni,
     garantissant la compatibilité avec n'importe quel réseau de transport.
@@ -22,26 +26,25 @@ def charger_ou_calculer_troncons(feed, route_type, nom_mode):
     -----------
     feed : gtfs_kit Feed object
         Feed GTFS chargé
-    route_type : int
-        Type de route GTFS (0=tram, 3=bus, etc.)
-    nom_mode : str
-        Nom du mode pour les messages ("Bus" ou "Tram")
+    empreinte : str
+        Empreinte du fichier GTFS : les tronçons sont calculés une seule fois
+        par fichier (voir views.cache)
 
     Returns:
     --------
-    pandas.DataFrame : Tronçons avec colonnes nécessaires pour l'analyse
+    pandas.DataFrame : Tronçons de tous les modes (colonne route_type)
     """
-    st.info(f"🔄 Calcul automatique des tronçons {nom_mode} depuis le GTFS...")
+    st.info("🔄 Calcul automatique des tronçons depuis le GTFS...")
 
     try:
-        # Calculer les tronçons uniques
-        troncons_gdf = creer_troncons_uniques(feed, route_type)
+        # Calculer les tronçons uniques de tous les modes en une passe
+        troncons_gdf = obtenir_troncons_uniques(empreinte, feed)
 
-        st.success(f"✅ {len(troncons_gdf)} tronçons {nom_mode} calculés automatiquement")
+        st.success(f"✅ {len(troncons_gdf)} tronçons calculés automatiquement")
         return troncons_gdf
 
     except Exception as e:
-        st.error(f"❌ Erreur lors du calcul automatique des tronçons {nom_mode}: {e}")
+        st.error(f"❌ Erreur lors du calcul automatique des tronçons : {e}")
         return None
 
 
@@ -52,8 +55,8 @@ def troncons_page():
     st.warning(
         """
     ⚠️ **Limitation importante :** Cette analyse des tronçons est actuellement une preuve de concept
-    développée spécifiquement pour le réseau de Montpellier. Bien que l'application détecte automatiquement
-    les modes de transport présents dans votre GTFS, les calculs d'indicateurs pourraient nécessiter
+    développée spécifiquement pour le réseau de Montpellier. Les tronçons sont calculés pour tous les
+    modes de transport présents dans votre GTFS, mais les indicateurs pourraient nécessiter
     des adaptations pour d'autres réseaux urbains.
     """
     )
@@ -67,136 +70,124 @@ def troncons_page():
     ):
 
         # Calculer les indicateurs automatiquement si pas déjà fait
-        if (
-            st.session_state.indicateurs_bus is None
-            or st.session_state.indicateurs_tram is None
-        ):
+        if st.session_state.indicateurs_troncons is None:
 
             with st.spinner("Chargement/Calcul des tronçons de référence..."):
-                # Calculer automatiquement les tronçons pour bus et tram
-                # df_troncons_uniques_bus = creer_troncons_uniques(st.session_state.feed, route_type=3)
-                # df_troncons_uniques_tram = creer_troncons_uniques(st.session_state.feed, route_type=0)
-                troncons_bus = charger_ou_calculer_troncons(
-                    st.session_state.feed, route_type=3, nom_mode="Bus"
-                )
-                troncons_tram = charger_ou_calculer_troncons(
-                    st.session_state.feed, route_type=0, nom_mode="Tram"
+                troncons = charger_ou_calculer_troncons(
+                    st.session_state.feed, st.session_state.empreinte_feed
                 )
 
-                if troncons_bus is None or troncons_tram is None:
+                if troncons is None:
                     st.error("Impossible de calculer les tronçons de référence.")
                     return
 
             with st.spinner("Calcul des indicateurs de tronçons..."):
                 try:
-
-                    indicateurs_bus, indicateurs_tram = compute_indicateurs_troncons(
+                    indicateurs = indicateurs_troncons_en_cache(
+                        st.session_state.empreinte_feed,
+                        st.session_state.date_str,
                         st.session_state.feed,
-                        st.session_state.active_service_ids,
-                        troncons_bus,
-                        troncons_tram,
                     )
-                    st.session_state.indicateurs_bus = indicateurs_bus
-                    st.session_state.indicateurs_tram = indicateurs_tram
+                    if indicateurs is None:
+                        st.warning("Aucun passage sur les tronçons à cette date.")
+                        return
+                    st.session_state.indicateurs_troncons = indicateurs
                 except Exception as e:
                     st.error(f"Erreur lors du calcul des tronçons : {e}")
                     return
 
-        if (
-            st.session_state.indicateurs_bus is not None
-            and st.session_state.indicateurs_tram is not None
-        ):
+        if st.session_state.indicateurs_troncons is not None:
 
-            indicateurs_bus = st.session_state.indicateurs_bus
-            indicateurs_tram = st.session_state.indicateurs_tram
+            indicateurs = st.session_state.indicateurs_troncons
+            indicateurs_par_mode = {
+                route_type: df_mode
+                for route_type, df_mode in indicateurs.groupby("route_type")
+            }
 
             st.success("✅ Analyse des tronçons terminée !")
 
-            # Statistiques globales
+            # Statistiques globales : tronçons actifs et passages par mode
             st.header("📊 Statistiques Globales")
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric(
-                    "Tronçons Bus actifs",
-                    len(indicateurs_bus[indicateurs_bus["nombre_passages"] > 0]),
-                )
-            with col2:
-                st.metric(
-                    "Tronçons Tram actifs",
-                    len(indicateurs_tram[indicateurs_tram["nombre_passages"] > 0]),
-                )
-            with col3:
-                total_bus = int(indicateurs_bus["nombre_passages"].sum())
-                st.metric("Total passages Bus", total_bus)
-            with col4:
-                total_tram = int(indicateurs_tram["nombre_passages"].sum())
-                st.metric("Total passages Tram", total_tram)
-
-            # Top tronçons
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.header("🚌 Top 10 Tronçons Bus")
-                bus_actifs = indicateurs_bus[
-                    indicateurs_bus["nombre_passages"] > 0
-                ].copy()
-                if not bus_actifs.empty:
-                    bus_actifs = bus_actifs.sort_values(
-                        "nombre_passages", ascending=False
+            colonnes = st.columns(max(1, 2 * len(indicateurs_par_mode)))
+            for i, (route_type, df_mode) in enumerate(indicateurs_par_mode.items()):
+                mode = decrire_mode(route_type)
+                with colonnes[2 * i]:
+                    st.metric(
+                        f"Tronçons {mode['nom']} actifs",
+                        len(df_mode[df_mode["nombre_passages"] > 0]),
+                    )
+                with colonnes[2 * i + 1]:
+                    st.metric(
+                        f"Total passages {mode['nom']}",
+                        int(df_mode["nombre_passages"].sum()),
+                    )
+
+            # Top tronçons, par mode
+            cols_to_show = [
+                "stop_depart_name",
+                "stop_arrivee_name",
+                "nombre_passages",
+                "vitesse_moyenne_kmh",
+            ]
+            colonnes = st.columns(max(1, min(len(indicateurs_par_mode), 3)))
+            for i, (route_type, df_mode) in enumerate(indicateurs_par_mode.items()):
+                mode = decrire_mode(route_type)
+                with colonnes[i % len(colonnes)]:
+                    st.header(f"{mode['emoji']} Top 10 Tronçons {mode['nom']}")
+                    actifs = df_mode[df_mode["nombre_passages"] > 0].copy()
+                    if not actifs.empty:
+                        actifs = actifs.sort_values("nombre_passages", ascending=False)
+                        st.dataframe(actifs[cols_to_show].head(10))
+                    else:
+                        st.info(f"Aucun tronçon {mode['nom'].lower()} actif.")
+
+            # Profil horaire, par mode
+            st.header("📈 Profil horaire des passages")
+            if st.session_state.profil_horaire_troncons is None:
+                with st.spinner("Calcul des passages par heure..."):
+                    st.session_state.profil_horaire_troncons = (
+                        profil_troncons_en_cache(
+                            st.session_state.empreinte_feed,
+                            st.session_state.date_str,
+                            st.session_state.feed,
+                        )
                     )
-                    cols_to_show = [
-                        "stop_depart_name",
-                        "stop_arrivee_name",
-                        "nombre_passages",
-                        "vitesse_moyenne_kmh",
-                    ]
-                    st.dataframe(bus_actifs[cols_to_show].head(10))
-                else:
-                    st.info("Aucun tronçon bus actif.")
-
-            with col2:
-                st.header("🚊 Top 10 Tronçons Tram")
-                tram_actifs = indicateurs_tram[
-                    indicateurs_tram["nombre_passages"] > 0
-                ].copy()
-                if not tram_actifs.empty:
-                    tram_actifs = tram_actifs.sort_values(
-                        "nombre_passages", ascending=False
+            profil = st.session_state.profil_horaire_troncons
+            if profil is not None:
+                st.line_chart(
+                    profil.pivot_table(
+                        index="tranche",
+                        columns="mode",
+                        values="nombre_passages",
+                        aggfunc="sum",
+                        sort=False,
                     )
-                    cols_to_show = [
-                        "stop_depart_name",
-                        "stop_arrivee_name",
-                        "nombre_passages",
-                        "vitesse_moyenne_kmh",
-                    ]
-                    st.dataframe(tram_actifs[cols_to_show].head(10))
-                else:
-                    st.info("Aucun tronçon tram actif.")
+                )
 
             # Carte interactive
             st.header("🗺️ Carte Interactive des Tronçons")
-            m = creer_carte_troncons(indicateurs_bus, indicateurs_tram)
-            components.html(m._repr_html_(), height=600, width=1000)
+            carte_html = carte_troncons_en_cache(
+                st.session_state.empreinte_feed, st.session_state.date_str, indicateurs
+            )
+            components.html(carte_html, height=600, width=1000)
 
             # Télécharger les résultats
             st.header("💾 Téléchargement")
-            col1, col2 = st.columns(2)
-            with col1:
-                csv_bus = indicateurs_bus.to_csv(index=False).encode("utf-8")
-                st.download_button(
-                    label="📥 Télécharger Bus CSV",
-                    data=csv_bus,
-                    file_name=f"indicateurs_troncons_bus_{st.session_state.date_str}.csv",
-                    mime="text/csv",
-                )
-            with col2:
-                csv_tram = indicateurs_tram.to_csv(index=False).encode("utf-8")
-                st.download_button(
-                    label="📥 Télécharger Tram CSV",
-                    data=csv_tram,
-                    file_name=f"indicateurs_troncons_tram_{st.session_state.date_str}.csv",
-                    mime="text/csv",
-                )
+            colonnes = st.columns(max(1, len(indicateurs_par_mode)))
+            for i, (route_type, df_mode) in enumerate(indicateurs_par_mode.items()):
+                mode = decrire_mode(route_type)
+                with colonnes[i]:
+                    csv_mode = (
+                        df_mode.drop(columns=["route_type", "mode"])
+                        .to_csv(index=False)
+                        .encode("utf-8")
+                    )
+                    st.download_button(
+                        label=f"📥 Télécharger {mode['nom']} CSV",
+                        data=csv_mode,
+                        file_name=f"indicateurs_troncons_{mode['code']}_{st.session_state.date_str}.csv",
+                        mime="text/csv",
+                    )
         else:
             st.info("🔄 Calcul des indicateurs en cours...")
     else: